@@ -1,34 +1,86 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash, send_file
+from flask import (Blueprint, Flask, Response, abort, current_app, g, jsonify, render_template, request, redirect,
+                   url_for, session, flash, send_file, send_from_directory, stream_with_context)
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy.orm.attributes import flag_modified
+from sqlalchemy.orm.exc import StaleDataError
 import os
+import sys
+import click
+import uuid
+from collections.abc import Mapping
+from functools import wraps
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from multiprocessing import get_context
+from werkzeug.local import LocalProxy
 from werkzeug.utils import secure_filename
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill
-import tempfile
-from datetime import datetime
+from datetime import datetime, timedelta
+from urllib.parse import quote
 
-app = Flask(__name__, template_folder='html_files')
+import scoring
+import rescoring
+import exports
+import ranking
+import importer
+import uploads
+import previews
+import database
+import sessions
+import cohort_stats
+import instrumentation
+import page_cache
+import export_jobs
+import settings
 
-# 配置数据库
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///users.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.secret_key = 'your-secret-key'  
-
-# 配置上传文件
-UPLOAD_FOLDER = 'static/uploads'
+# 上传文件类型
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'pdf', 'txt', 'doc', 'docx'}
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+# 预览图按内容摘要命名、内容不会变化，浏览器可以缓存一年
+PREVIEW_MAX_AGE = 365 * 24 * 3600
+
+# 教师面板分页与排序
+DASHBOARD_PAGE_SIZE = 50
+DASHBOARD_MAX_PAGE_SIZE = 200
+DASHBOARD_PAGE_SIZES = (20, 50, 100, 200)
+DASHBOARD_SORT_FIELDS = ('final_score', 'academic_score', 'academic_talent_score', 'comprehensive_score')
+# 教师面板表格显示的列
+DASHBOARD_COLUMNS = (
+    'id', 'full_name', 'student_id', 'major',
+    'final_score', 'academic_score', 'academic_talent_score', 'comprehensive_score'
+)
+
+# 批量导入时每批写入的学生数
+IMPORT_BATCH_SIZE = 500
+
+# 导出时每批从数据库读取的行数
+EXPORT_BATCH_SIZE = 1000
+
+# 导出任务超过这么长时间没有进展（例如进程被重启）即视为失败
+EXPORT_JOB_TIMEOUT = timedelta(minutes=10)
+# 排队中的任务要等前面的导出完成，只有排队超过这么长时间（所在进程多半已重启）才视为失败
+EXPORT_QUEUE_TIMEOUT = timedelta(hours=1)
+# 导出任务记录的保留时间
+EXPORT_JOB_RETENTION = timedelta(days=7)
+
+# 其他进程更新排名后，进程内排名索引最多每隔这么长时间重新加载一次，期间排名用 COUNT 查询计算
+RANK_INDEX_RELOAD_INTERVAL = timedelta(minutes=1)
 
-# 创建上传目录（如果不存在）
-os.makedirs(os.path.join(app.root_path, UPLOAD_FOLDER), exist_ok=True)
+# 数据库和迁移实例，由 create_app() 绑定到应用
+db = SQLAlchemy()
+migrate = Migrate()
 
-# 创建数据库实例
-db = SQLAlchemy(app)
+# 页面、接口和命令行命令都注册在这个蓝图上，create_app() 创建应用时注册蓝图
+bp = Blueprint('main', __name__, cli_group=None)
 
-# 创建迁移实例
-migrate = Migrate(app, db)
+# 每个应用各自的渲染结果缓存、预览图生成队列、后台导出线程池以及上传清单、排名索引和年级统计的
+# 进程内缓存，由 create_app() 创建
+rendered_pages = LocalProxy(lambda: current_app.extensions['rendered_pages'])
+preview_worker = LocalProxy(lambda: current_app.extensions['preview_worker'])
+export_runner = LocalProxy(lambda: current_app.extensions['export_runner'])
+upload_manifest_cache = LocalProxy(lambda: current_app.extensions['upload_manifest_cache'])
+rank_index_cache = LocalProxy(lambda: current_app.extensions['rank_index_cache'])
+stats_cache = LocalProxy(lambda: current_app.extensions['stats_cache'])
 
 # 用户模型
 class User(db.Model):
@@ -59,6 +111,12 @@ class User(db.Model):
     social_work_score = db.Column(db.Float, default=0)
     volunteer_score = db.Column(db.Float, default=0)
     volunteer_hours = db.Column(db.Integer, default=0)
+    
+    # 乐观锁版本号：每次更新加一，UPDATE 时带上读取时的版本号，
+    # 期间已被其他请求修改时不更新任何行并抛出 StaleDataError
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    
+    __mapper_args__ = {'version_id_col': version}
 
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
@@ -66,18 +124,904 @@ class User(db.Model):
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
 
+# 按角色筛选、按成绩排名的复合索引（教师面板排序、翻页和导出使用）
+db.Index('ix_user_role_final_score', User.role, User.final_score.desc(), User.id)
+db.Index('ix_user_role_academic_score', User.role, User.academic_score.desc(), User.id)
+db.Index('ix_user_role_academic_talent_score', User.role, User.academic_talent_score.desc(), User.id)
+db.Index('ix_user_role_comprehensive_score', User.role, User.comprehensive_score.desc(), User.id)
+db.Index('ix_user_role_major', User.role, User.major)
+
+# 学生排名（按综合成绩），成绩或专业变化时增量更新
+class Ranking(db.Model):
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    major = db.Column(db.String(100), nullable=False, default='')  # 未填写专业为空字符串
+    final_score = db.Column(db.Float, nullable=False, default=0)
+    overall_rank = db.Column(db.Integer, nullable=False)  # 全体竞争排名（1224 式）
+    overall_dense_rank = db.Column(db.Integer, nullable=False)  # 全体密集排名（1223 式）
+    major_rank = db.Column(db.Integer, nullable=False)
+    major_dense_rank = db.Column(db.Integer, nullable=False)
+    
+    __table_args__ = (
+        db.Index('ix_ranking_final_score', 'final_score'),
+        db.Index('ix_ranking_major_final_score', 'major', 'final_score'),
+        # 分专业导出：按专业升序、综合成绩降序顺序扫描
+        db.Index('ix_ranking_major_score_desc', major, final_score.desc(), user_id),
+    )
+
+# 排名数据的修订号：每次修改排名表时加一，用于判断进程内的排名索引是否过期
+class RankingRevision(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    revision = db.Column(db.Integer, nullable=False, default=0)
+
+# 学生的一次成绩提交（原始输入），用于规则变更后的增量重算和审计
+class Submission(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    academic_score = db.Column(db.Float, default=0)  # 原始学业成绩（百分制，未加权）
+    volunteer_hours = db.Column(db.Integer, default=0)
+    content_hash = db.Column(db.String(64), nullable=False)  # 规范化后提交内容的 SHA-256
+    rule_version = db.Column(db.String(64))  # 最近一次计算成绩所用的规则版本
+    idempotency_key = db.Column(db.String(64))  # 表单或 Idempotency-Key 请求头提供的幂等键
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    
+    __table_args__ = (
+        db.Index('uq_submission_user_idempotency_key', 'user_id', 'idempotency_key', unique=True),
+    )
+    
+    items = db.relationship('SubmissionItem', backref='submission', lazy=True,
+                            order_by='SubmissionItem.position', cascade='all, delete-orphan')
+    
+    def as_submission(self):
+        """转换为 scoring.score() 使用的提交字典"""
+        submission = {'academic_score': self.academic_score or 0, 'volunteer_hours': self.volunteer_hours or 0}
+        for item in self.items:
+            submission.setdefault(item.field, []).append(item.option)
+        return submission
+
+# 提交中勾选的每一个选项
+class SubmissionItem(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    submission_id = db.Column(db.Integer, db.ForeignKey('submission.id'), nullable=False, index=True)
+    field = db.Column(db.String(50), nullable=False)  # 表单字段，如 academic_paper
+    option = db.Column(db.String(50), nullable=False)  # 选项值，如 ccf_a_first
+    position = db.Column(db.Integer, default=0)  # 提交时的顺序
+
+# 上传清单：每个证明材料文件一行，保存文件时写入，页面显示文件列表时不再扫描目录
+class Upload(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    filename = db.Column(db.String(255), nullable=False)
+    path = db.Column(db.String(500), nullable=False)  # 相对于上传目录（UPLOAD_FOLDER）的路径
+    size = db.Column(db.Integer, nullable=False)  # 字节数
+    mtime = db.Column(db.Float, nullable=False)  # 文件修改时间（Unix 时间戳）
+    sha256 = db.Column(db.String(64), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'filename', name='uq_upload_user_filename'),
+    )
+
+# 后台导出任务，生成的文件见 export_jobs.artifact_path()
+class ExportJob(db.Model):
+    id = db.Column(db.String(32), primary_key=True)  # 随机生成的任务 ID
+    kind = db.Column(db.String(20), nullable=False)  # 导出种类，如 ranking
+    revision = db.Column(db.Integer, nullable=False)  # 导出数据对应的排名修订号
+    status = db.Column(db.String(20), nullable=False, default=export_jobs.QUEUED)
+    rows_done = db.Column(db.Integer, nullable=False, default=0)
+    rows_total = db.Column(db.Integer)
+    error = db.Column(db.String(500))
+    created_by = db.Column(db.Integer, db.ForeignKey('user.id'))
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    updated_at = db.Column(db.DateTime, default=datetime.now)
+    
+    __table_args__ = (
+        db.Index('ix_export_job_kind_revision', 'kind', 'revision'),
+    )
+
+# 服务端会话：Cookie 中只保存会话 ID，id 为会话 ID 的 SHA-256
+class ServerSessionRecord(db.Model):
+    __tablename__ = 'server_session'
+    
+    id = db.Column(db.String(64), primary_key=True)
+    data = db.Column(db.Text, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+@db.event.listens_for(User, 'after_update')
+def record_user_update(mapper, connection, target):
+    # 先记下来，提交后再使缓存失效：提交前失效的话，其他请求可能又把旧数据缓存起来
+    db.object_session(target).info.setdefault('updated_users', set()).add(target.id)
+
+@db.event.listens_for(db.session, 'after_commit')
+def invalidate_updated_users(session):
+    for user_id in session.info.pop('updated_users', ()):
+        rendered_pages.invalidate(user_id)
+
+@db.event.listens_for(db.session, 'after_rollback')
+def discard_updated_users(session):
+    session.info.pop('updated_users', None)
+
 # 不再使用 db.create_all()，改用 Flask-Migrate 管理数据库结构
 # 使用命令：flask db init, flask db migrate, flask db upgrade
 
+# 计算成绩后写入会话的细分项
+SESSION_SCORE_FIELDS = (
+    'paper_score', 'patent_score', 'competition_national_score', 'competition_provincial_score',
+    'csp_score', 'innovation_project_score', 'honor_score', 'social_work_score', 'volunteer_score'
+)
+
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-@app.route('/')
+def upload_root():
+    return os.path.join(current_app.root_path, current_app.config['UPLOAD_FOLDER'])
+
+def user_upload_folder(username):
+    return os.path.join(upload_root(), username)
+
+def save_proof_files(user, files):
+    """保存上传的证明材料并写入清单，返回 (保存的文件路径列表, 错误信息列表)
+    
+    文件内容分块写入内容寻址存储后硬链接到用户目录；与已上传文件同名但内容不同时
+    自动改名，内容相同则不重复保存。超过单个文件大小或用户配额的文件被拒绝。
+    """
+    user_folder = user_upload_folder(user.username)
+    blob_folder = os.path.join(current_app.root_path, current_app.config['UPLOAD_BLOB_FOLDER'])
+    file_limit = current_app.config['MAX_UPLOAD_FILE_SIZE']
+    quota = current_app.config['USER_UPLOAD_QUOTA']
+    
+    existing = {upload.filename: upload for upload in Upload.query.filter_by(user_id=user.id)}
+    used = sum(upload.size for upload in existing.values())
+    saved = []
+    errors = []
+    for file in files:
+        if not (file and file.filename and allowed_file(file.filename)):
+            continue
+        filename = secure_filename(file.filename)
+        remaining = quota - used
+        try:
+            sha256, size, blob = uploads.store_blob(file.stream, blob_folder, os.path.splitext(filename)[1].lower(),
+                                                    min(file_limit, remaining))
+        except uploads.UploadTooLarge:
+            if remaining < file_limit:
+                errors.append(f'{filename} 未保存：超过个人上传空间上限（{quota // (1024 * 1024)} MB）')
+            else:
+                errors.append(f'{filename} 未保存：单个文件不能超过 {file_limit // (1024 * 1024)} MB')
+            continue
+        
+        same_name = existing.get(filename)
+        if same_name is not None and same_name.sha256 == sha256:
+            continue
+        
+        os.makedirs(user_folder, exist_ok=True)
+        filename = uploads.unique_filename(filename, set(existing) | set(os.listdir(user_folder)))
+        target = os.path.join(user_folder, filename)
+        uploads.link_blob(blob, target)
+        
+        upload = Upload(user_id=user.id,
+                        filename=filename,
+                        path='/'.join((user.username, filename)),
+                        size=size,
+                        mtime=os.stat(target).st_mtime,
+                        sha256=sha256)
+        db.session.add(upload)
+        existing[filename] = upload
+        used += size
+        saved.append(upload.path)
+        preview_worker.submit(blob, sha256, os.path.splitext(filename)[1])
+    return saved, errors
+
+def load_upload_manifest(user_id):
+    rows = db.session.execute(
+        db.select(Upload.filename, Upload.path, Upload.sha256)
+        .where(Upload.user_id == user_id)
+        .order_by(Upload.filename)
+    )
+    return [
+        {'filename': filename, 'path': path,
+         'preview': previews.preview_name(sha256, os.path.splitext(filename)[1])}
+        for filename, path, sha256 in rows
+    ]
+
+def uploaded_files_of(user):
+    """用户上传的证明材料：文件名、相对于 static 目录的路径、预览图名（不支持预览时为 None）"""
+    with instrumentation.span('listing'):
+        return upload_manifest_cache.get(user.id, user_upload_folder(user.username))
+
+def keyset_order(sort_column, descending):
+    """学生排名的排序：(成绩, id)，降序时 id 升序、升序时 id 降序，与排名索引的扫描方向一致"""
+    if descending:
+        return sort_column.desc(), User.id.asc()
+    return sort_column.asc(), User.id.desc()
+
+def keyset_after(sort_column, descending, value, row_id):
+    """按 keyset_order 排序时位于 (value, row_id) 之后的行，写成索引可用的范围条件"""
+    value = value or 0
+    if descending:
+        return db.and_(sort_column <= value, db.or_(sort_column < value, User.id > row_id))
+    return db.and_(sort_column >= value, db.or_(sort_column > value, User.id < row_id))
+
+def student_query(columns, sort_column, descending=True):
+    """按成绩排序的学生查询，教师面板和导出共用"""
+    return (
+        db.select(*columns)
+        .where(User.role == 'student')
+        .order_by(*keyset_order(sort_column, descending))
+    )
+
+def content_disposition(filename):
+    # 中文文件名按 RFC 5987 编码，同时提供 ASCII 回退文件名
+    return f"attachment; filename=export{os.path.splitext(filename)[1]}; filename*=UTF-8''{quote(filename)}"
+
+def latest_submission(user_id):
+    return Submission.query.filter_by(user_id=user_id).order_by(Submission.id.desc()).first()
+
+def save_submission(user, submission, rules, idempotency_key=None):
+    """保存一次提交；与最近一次提交内容相同时直接复用，不重复写入选项"""
+    content_hash = scoring.submission_hash(submission, rules)
+    latest = latest_submission(user.id)
+    if latest and latest.content_hash == content_hash:
+        latest.rule_version = rules.revision
+        if idempotency_key:
+            latest.idempotency_key = idempotency_key
+        return latest
+    
+    record = Submission(user_id=user.id,
+                        academic_score=submission['academic_score'],
+                        volunteer_hours=submission['volunteer_hours'],
+                        content_hash=content_hash,
+                        rule_version=rules.revision,
+                        idempotency_key=idempotency_key)
+    position = 0
+    for field in rules.fields:
+        for option in submission.get(field) or ():
+            record.items.append(SubmissionItem(field=field, option=option, position=position))
+            position += 1
+    db.session.add(record)
+    return record
+
+def rescore_students(rules=None, force=False):
+    """按当前规则批量重算学生成绩，返回 (重算人数, 跳过人数)
+    
+    只重算最近一次提交所用规则版本与当前规则不一致的学生；force=True 时全部重算。
+    """
+    rules = rules or scoring.current_rules()
+    # 每个学生最近一次提交
+    latest_ids = (
+        db.select(db.func.max(Submission.id))
+        .join(User, User.id == Submission.user_id)
+        .where(User.role == 'student')
+        .group_by(Submission.user_id)
+    )
+    total = db.session.scalar(db.select(db.func.count()).select_from(latest_ids.subquery()))
+    
+    stale_ids = db.select(Submission.id).where(Submission.id.in_(latest_ids))
+    if not force:
+        stale_ids = stale_ids.where(db.or_(Submission.rule_version.is_(None),
+                                           Submission.rule_version != rules.revision))
+    
+    rows = db.session.execute(
+        db.select(Submission.id, Submission.user_id, Submission.academic_score, Submission.volunteer_hours,
+                  User.version)
+        .join(User, User.id == Submission.user_id)
+        .where(Submission.id.in_(stale_ids))
+    ).all()
+    if not rows:
+        return 0, total
+    
+    submissions = {
+        row.id: {'academic_score': row.academic_score, 'volunteer_hours': row.volunteer_hours}
+        for row in rows
+    }
+    item_rows = db.session.execute(
+        db.select(SubmissionItem.submission_id, SubmissionItem.field, SubmissionItem.option)
+        .where(SubmissionItem.submission_id.in_(stale_ids))
+        .order_by(SubmissionItem.submission_id, SubmissionItem.position)
+    )
+    for item in item_rows:
+        submissions[item.submission_id].setdefault(item.field, []).append(item.option)
+    
+    columns = rescoring.score_cohort(list(submissions.values()), rules)
+    # 按主键一次性批量 UPDATE；带上读取时的版本号，期间学生重新提交过时抛出 StaleDataError
+    mappings = rescoring.to_mappings([row.user_id for row in rows], columns)
+    for mapping, row in zip(mappings, rows):
+        mapping['version'] = row.version
+    db.session.execute(db.update(User), mappings)
+    db.session.execute(db.update(Submission), [{'id': row.id, 'rule_version': rules.revision} for row in rows])
+    db.session.commit()
+    rebuild_rankings()
+    return len(rows), total - len(rows)
+
+def load_rank_index(revision):
+    rows = db.session.execute(db.select(Ranking.user_id, Ranking.final_score, Ranking.major))
+    return ranking.CohortRanking(rows, revision)
+
+def ranking_revision():
+    return db.session.scalar(db.select(RankingRevision.revision).where(RankingRevision.id == 1)) or 0
+
+def current_rank_index(revision=None):
+    """与数据库排名表（修订号 revision，默认为当前修订号）一致的进程内排名索引，没有时返回 None
+    
+    索引只是优化：其他进程更新排名后本进程的索引即过期，过期后最多每隔 RANK_INDEX_RELOAD_INTERVAL
+    重新加载一次，其余时间返回 None，调用方改用 COUNT 查询。
+    """
+    revision = ranking_revision() if revision is None else revision
+    cache = rank_index_cache
+    if cache.index is not None and cache.index.revision == revision:
+        return cache.index
+    now = datetime.now()
+    if cache.loaded_at is not None and now - cache.loaded_at < RANK_INDEX_RELOAD_INTERVAL:
+        return None
+    cache.index = load_rank_index(revision)
+    cache.loaded_at = now
+    return cache.index
+
+def bump_ranking_revision():
+    """排名修订号加一（同时取得写锁，保证排名更新串行执行），返回加一前的修订号"""
+    updated = db.session.execute(
+        db.update(RankingRevision).where(RankingRevision.id == 1)
+        .values(revision=RankingRevision.revision + 1)
+    ).rowcount
+    if not updated:
+        db.session.add(RankingRevision(id=1, revision=1))
+        db.session.flush()
+    return db.session.scalar(db.select(RankingRevision.revision).where(RankingRevision.id == 1)) - 1
+
+def ranking_scope(major=None):
+    """排名范围的过滤条件：全体学生，或某个专业的学生"""
+    return () if major is None else (Ranking.major == major,)
+
+def score_taken(user_id, score, major=None):
+    """排名范围内除该学生外是否还有人是这个成绩"""
+    return db.session.scalar(
+        db.select(Ranking.user_id)
+        .where(Ranking.final_score == score, Ranking.user_id != user_id, *ranking_scope(major))
+        .limit(1)
+    ) is not None
+
+def shift_rankings(user_id, old, new, major=None):
+    """学生在排名范围（全体，或 major 专业）内的成绩由 old 变为 new 后，用一条 UPDATE 调整范围内其他学生的排名
+    
+    old 为 None 表示加入该范围，new 为 None 表示离开。成绩为 x 的学生：竞争排名在 x < new 时加一、
+    x < old 时减一；密集排名在 new 是范围内新出现的成绩时对 x < new 加一，old 不再有人时对 x < old 减一。
+    成绩变化时只有 old 与 new 之间的学生竞争排名变化，低于两者的学生只在密集排名变化时才更新。
+    """
+    rank_column, dense_column = ((Ranking.overall_rank, Ranking.overall_dense_rank) if major is None
+                                 else (Ranking.major_rank, Ranking.major_dense_rank))
+    # (成绩, 竞争排名变化, 密集排名变化)：成绩低于该值的学生按此调整
+    changes = []
+    if new is not None:
+        changes.append((new, 1, 0 if score_taken(user_id, new, major) else 1))
+    if old is not None:
+        changes.append((old, -1, 0 if score_taken(user_id, old, major) else -1))
+    
+    conditions = [Ranking.user_id != user_id, Ranking.final_score < max(score for score, _, _ in changes),
+                  *ranking_scope(major)]
+    # 低于两个成绩的学生竞争排名不变，密集排名的变化也相互抵消时不需要更新
+    if len(changes) == 2 and sum(dense for _, _, dense in changes) == 0:
+        conditions.append(Ranking.final_score >= min(old, new))
+    
+    db.session.execute(
+        db.update(Ranking).where(*conditions).values({
+            rank_column: rank_column + sum(db.case((Ranking.final_score < score, rank), else_=0)
+                                           for score, rank, _ in changes),
+            dense_column: dense_column + sum(db.case((Ranking.final_score < score, dense), else_=0)
+                                             for score, _, dense in changes),
+        }),
+        execution_options={'synchronize_session': False}
+    )
+
+def counted_ranks(user_id, score, major):
+    """用 COUNT 查询（走 ix_ranking_final_score / ix_ranking_major_final_score 索引）计算某个成绩的排名"""
+    ranks = {}
+    for prefix, scope in (('overall', None), ('major', major)):
+        higher, distinct_higher = db.session.execute(
+            db.select(db.func.count(), db.func.count(db.distinct(Ranking.final_score)))
+            .where(Ranking.final_score > score, Ranking.user_id != user_id, *ranking_scope(scope))
+        ).one()
+        ranks[f'{prefix}_rank'] = higher + 1
+        ranks[f'{prefix}_dense_rank'] = distinct_higher + 1
+    return ranks
+
+def update_ranking(user):
+    """学生成绩或专业变化后增量更新排名表，在调用方的事务中执行，由调用方提交"""
+    revision = bump_ranking_revision()
+    score, major = ranking.normalize(user.final_score, user.major)
+    row = db.session.get(Ranking, user.id)
+    previous = (row.final_score, row.major) if row is not None else None
+    
+    index = current_rank_index(revision)
+    if index is not None:
+        # 索引在事务提交前就已修改，提交前不对应任何已提交的修订号；
+        # 提交后才标为新的修订号，回滚时丢弃整个索引（见 confirm_rank_index / discard_rank_index）
+        index.revision = None
+        db.session.info['rank_index'] = (index, revision + 1)
+    if previous == (score, major):
+        return
+    
+    old_score, old_major = previous or (None, None)
+    shift_rankings(user.id, old_score, score)
+    if old_major == major:
+        shift_rankings(user.id, old_score, score, major)
+    else:
+        if previous:
+            shift_rankings(user.id, old_score, None, old_major)
+        shift_rankings(user.id, None, score, major)
+    
+    if index is not None:
+        if index.get(user.id):
+            index.remove(user.id)
+        index.add(user.id, score, major)
+        ranks = index.ranks(score, major)
+    else:
+        ranks = counted_ranks(user.id, score, major)
+    db.session.merge(Ranking(user_id=user.id, major=major, final_score=score, **ranks))
+
+@db.event.listens_for(db.session, 'after_commit')
+def confirm_rank_index(session):
+    # 事务期间持有排名修订号的写锁，提交成功后数据库中的修订号就是事务中加一后的值
+    index, revision = session.info.pop('rank_index', (None, None))
+    if index is not None and index is rank_index_cache.index:
+        index.revision = revision
+
+@db.event.listens_for(db.session, 'after_rollback')
+def discard_rank_index(session):
+    index, _ = session.info.pop('rank_index', (None, None))
+    if index is not None and index is rank_index_cache.index:
+        rank_index_cache.index = None
+
+def rebuild_rankings():
+    """根据 User 表重新计算全部排名（批量重算成绩之后使用）"""
+    score = db.func.coalesce(User.final_score, 0)
+    major = db.func.coalesce(User.major, '')
+    db.session.execute(db.delete(Ranking))
+    db.session.execute(db.insert(Ranking).from_select(
+        ['user_id', 'major', 'final_score', 'overall_rank', 'overall_dense_rank', 'major_rank', 'major_dense_rank'],
+        db.select(
+            User.id, major, score,
+            db.func.rank().over(order_by=score.desc()),
+            db.func.dense_rank().over(order_by=score.desc()),
+            db.func.rank().over(partition_by=major, order_by=score.desc()),
+            db.func.dense_rank().over(partition_by=major, order_by=score.desc()),
+        ).where(User.role == 'student')
+    ))
+    bump_ranking_revision()
+    db.session.commit()
+
+def student_ranking(user):
+    """学生的排名信息，尚未进入排名表时返回 None"""
+    row = db.session.get(Ranking, user.id)
+    if row is None:
+        return None
+    index = current_rank_index()
+    if index is not None:
+        overall_total, major_total = index.total(), index.total(row.major)
+    else:
+        overall_total, major_total = db.session.execute(
+            db.select(db.func.count(), db.func.count().filter(Ranking.major == row.major))
+        ).one()
+    return {
+        'overall_rank': row.overall_rank,
+        'overall_total': overall_total,
+        'major': row.major,
+        'major_rank': row.major_rank,
+        'major_total': major_total,
+    }
+
+def cached_page(page, student, render):
+    """渲染与某个学生有关的页面，结果按学生版本号缓存，并支持 ETag / 304
+    
+    页面中的排名随其他学生的成绩变化，文件列表随上传变化，所以缓存键中还包含
+    排名修订号和上传目录的修改时间；规则变更后的批量重算不经过 ORM 更新事件，
+    但会使排名修订号变化。
+    """
+    key = rendered_pages.key(page, student.id, g.user.id, ranking_revision(),
+                             uploads.directory_mtime(user_upload_folder(student.username)))
+    etag = rendered_pages.etag(key)
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        body = rendered_pages.get(key)
+        if body is None:
+            body = render().encode('utf-8')
+            rendered_pages.set(key, body)
+        response = Response(body, mimetype='text/html')
+    response.set_etag(etag)
+    # 浏览器每次都要带着 ETag 确认，页面内容不会过期显示
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+def cohort_statistics(field):
+    """全体学生某一成绩列的统计结果（按专业分组），只读取专业列和这一列
+    
+    结果按 (排名修订号, 统计结果) 缓存在 stats_cache 中：学生成绩或专业的每次变化都会使
+    排名修订号加一，修订号不同即说明统计结果已过期。
+    """
+    revision = ranking_revision()
+    cached = stats_cache.get(field)
+    if cached is not None and cached[0] == revision:
+        return cached[1]
+    
+    rows = db.session.execute(
+        db.select(db.func.coalesce(User.major, ''), db.func.coalesce(getattr(User, field), 0))
+        .where(User.role == 'student')
+    ).all()
+    result = cohort_stats.cohort_statistics([major for major, _ in rows], [value for _, value in rows])
+    stats_cache[field] = (revision, result)
+    return result
+
+def build_ranking_export(directory, progress=None):
+    """按综合成绩降序生成排名工作簿，返回临时文件路径"""
+    # 只查询导出需要的列，通过服务端游标分批读取
+    query = (
+        student_query([getattr(User, field) for field in exports.EXPORT_FIELDS], User.final_score)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+    return exports.build_ranking_workbook(db.session.execute(query), directory=directory, progress=progress)
+
+def major_export_query():
+    """分专业导出的查询：按 (专业, 综合成绩降序) 顺序扫描排名表，再按主键取出学生的导出列"""
+    return (
+        db.select(Ranking.major, Ranking.final_score, *[getattr(User, field) for field in exports.EXPORT_FIELDS])
+        .join(User, User.id == Ranking.user_id)
+        .order_by(Ranking.major, Ranking.final_score.desc(), Ranking.user_id)
+    )
+
+def build_major_export(directory, progress=None):
+    """生成每个专业一个工作表的排名工作簿（另有汇总表），返回临时文件路径"""
+    query = major_export_query().execution_options(yield_per=EXPORT_BATCH_SIZE)
+    return exports.build_major_workbook(db.session.execute(query), directory=directory, progress=progress)
+
+# 导出种类 -> (下载文件名, 生成函数)
+EXPORT_KINDS = {
+    'ranking': ('学生推免成绩排名', build_ranking_export),
+    'by_major': ('学生推免成绩分专业排名', build_major_export),
+}
+
+def build_export(kind, progress=None):
+    """生成当前数据的导出文件并保存到导出目录，返回 (排名修订号, 文件路径)
+    
+    排名修订号在学生成绩、专业或个人信息每次变化时加一，同一修订号下的文件已经存在时直接返回。
+    """
+    folder = current_app.config['EXPORT_FOLDER']
+    os.makedirs(folder, exist_ok=True)
+    revision = ranking_revision()
+    path = export_jobs.artifact_path(folder, kind, revision)
+    if os.path.exists(path):
+        return revision, path
+    
+    with instrumentation.span('workbook'):
+        tmp_path = EXPORT_KINDS[kind][1](folder, progress)
+    os.replace(tmp_path, path)
+    export_jobs.remove_stale_artifacts(folder, kind, revision)
+    return revision, path
+
+def export_file_response(kind, path, timestamp):
+    filename = f'{EXPORT_KINDS[kind][0]}_{timestamp.strftime("%Y%m%d_%H%M%S")}.xlsx'
+    response = send_file(path, mimetype=exports.XLSX_MIMETYPE, max_age=0)
+    response.headers['Content-Disposition'] = content_disposition(filename)
+    return response
+
+def update_export_job(job_id, **values):
+    """在独立的连接中更新任务状态：生成过程中任务线程的会话还在用游标读取数据，不能提交"""
+    with db.engine.begin() as conn:
+        conn.execute(db.update(ExportJob).where(ExportJob.id == job_id).values(updated_at=datetime.now(), **values))
+
+def run_export_job(app, job_id, kind):
+    """在后台线程中执行导出任务"""
+    with app.app_context():
+        # 排队期间已被判定为中断（或已被清理）的任务不再执行
+        with db.engine.begin() as conn:
+            started = conn.execute(
+                db.update(ExportJob)
+                .where(ExportJob.id == job_id, ExportJob.status == export_jobs.QUEUED)
+                .values(status=export_jobs.RUNNING, updated_at=datetime.now())
+            ).rowcount
+        if not started:
+            return
+        try:
+            total = db.session.scalar(db.select(db.func.count(User.id)).where(User.role == 'student'))
+            update_export_job(job_id, rows_total=total)
+            revision, _ = build_export(kind, progress=lambda done: update_export_job(job_id, rows_done=done))
+            # 开始生成前数据可能又有变化，以实际读取数据时的修订号为准
+            update_export_job(job_id, status=export_jobs.DONE, revision=revision, rows_done=ExportJob.rows_total)
+        except Exception as e:
+            update_export_job(job_id, status=export_jobs.FAILED, error=str(e)[:500])
+            raise
+
+def expire_stale_export(job):
+    """长时间没有进展的任务（例如所在进程已重启）标记为失败
+    
+    生成中的任务每处理一批数据就更新 updated_at，按 EXPORT_JOB_TIMEOUT 判断；排队中的任务
+    还没有开始，不能按进展判断，只有排队超过 EXPORT_QUEUE_TIMEOUT 才视为中断。
+    """
+    timeout = EXPORT_QUEUE_TIMEOUT if job.status == export_jobs.QUEUED else EXPORT_JOB_TIMEOUT
+    if job.status in export_jobs.ACTIVE_STATUSES and job.updated_at < datetime.now() - timeout:
+        job.status = export_jobs.FAILED
+        job.error = '导出任务中断'
+        db.session.commit()
+
+def start_export(kind, user):
+    """创建导出任务；数据没有变化时复用已生成的文件或正在进行的同类任务"""
+    # 先提交删除过期任务，之后复用已有任务直接返回时删除也已生效
+    db.session.execute(db.delete(ExportJob).where(ExportJob.created_at < datetime.now() - EXPORT_JOB_RETENTION))
+    db.session.commit()
+    revision = ranking_revision()
+    path = export_jobs.artifact_path(current_app.config['EXPORT_FOLDER'], kind, revision)
+    for job in ExportJob.query.filter_by(kind=kind, revision=revision).order_by(ExportJob.created_at.desc()):
+        expire_stale_export(job)
+        if job.status in export_jobs.ACTIVE_STATUSES or (job.status == export_jobs.DONE and os.path.exists(path)):
+            return job
+
+    job = ExportJob(id=uuid.uuid4().hex, kind=kind, revision=revision, created_by=user.id)
+    if os.path.exists(path):
+        job.status = export_jobs.DONE
+        job.rows_total = job.rows_done = db.session.scalar(
+            db.select(db.func.count(User.id)).where(User.role == 'student'))
+    db.session.add(job)
+    db.session.commit()
+    if job.status != export_jobs.DONE:
+        export_runner.submit(run_export_job, current_app._get_current_object(), job.id, kind)
+    return job
+
+def export_job_payload(job):
+    payload = {
+        'id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'revision': job.revision,
+        'rows_done': job.rows_done,
+        'rows_total': job.rows_total,
+        'error': job.error,
+        'status_url': url_for('main.export_status', job_id=job.id),
+    }
+    if job.status == export_jobs.DONE:
+        payload['download_url'] = url_for('main.download_export', job_id=job.id)
+    return payload
+
+@bp.cli.command('rebuild-rankings')
+def rebuild_rankings_command():
+    """重新计算全部学生排名"""
+    rebuild_rankings()
+    click.echo(f'已重新计算 {Ranking.query.count()} 名学生的排名')
+
+def import_students(records, default_password=None):
+    """批量导入学生名单，返回 (新增人数, 已存在而跳过的人数, 错误信息列表)
+    
+    records 为 importer.read_roster() 产出的 (行号, 字段字典)。
+    """
+    rules = scoring.current_rules()
+    created = 0
+    skipped = 0
+    errors = []
+    seen = set()
+    
+    # 计算密码哈希的进程池用 spawn 方式启动子进程：在多线程的 Web 进程中 fork 可能复制其他线程
+    # 持有的锁以及数据库连接
+    with ProcessPoolExecutor(mp_context=get_context('spawn')) as pool:
+        for batch in importer.batched(records, IMPORT_BATCH_SIZE):
+            valid = []
+            for line, record in batch:
+                username = record.get('username')
+                password = record.get('password') or default_password
+                if not username:
+                    errors.append(f'第 {line} 行：缺少用户名')
+                    continue
+                if not password:
+                    errors.append(f'第 {line} 行：缺少密码')
+                    continue
+                if username in seen:
+                    errors.append(f'第 {line} 行：用户名 {username} 在名单中重复')
+                    continue
+                try:
+                    academic_score = importer.parse_academic_score(record.get('academic_score'))
+                except ValueError:
+                    errors.append(f'第 {line} 行：学业成绩应为 0-100 之间的数字')
+                    continue
+                seen.add(username)
+                valid.append((record, password, academic_score))
+            
+            # 一次查询找出本批中已经存在的用户名
+            existing = set(db.session.scalars(
+                db.select(User.username).where(User.username.in_([record['username'] for record, _, _ in valid]))
+            ))
+            skipped += sum(1 for record, _, _ in valid if record['username'] in existing)
+            valid = [entry for entry in valid if entry[0]['username'] not in existing]
+            if not valid:
+                continue
+            
+            password_hashes = importer.hash_passwords([password for _, password, _ in valid], pool)
+            users = []
+            for (record, _, academic_score), password_hash in zip(valid, password_hashes):
+                mapping = {
+                    'username': record['username'],
+                    'password_hash': password_hash,
+                    'role': 'student',
+                    'full_name': record.get('full_name'),
+                    'student_id': record.get('student_id'),
+                    'major': record.get('major'),
+                }
+                if academic_score is not None:
+                    mapping.update(scoring.score({'academic_score': academic_score}, rules))
+                users.append(mapping)
+            db.session.bulk_insert_mappings(User, users)
+            
+            # 导入了学业成绩的学生同时保存原始提交，规则变更后可以重算
+            academic_scores = {record['username']: score for record, _, score in valid if score is not None}
+            if academic_scores:
+                user_ids = dict(db.session.execute(
+                    db.select(User.username, User.id).where(User.username.in_(list(academic_scores)))
+                ).all())
+                now = datetime.now()
+                db.session.bulk_insert_mappings(Submission, [
+                    {
+                        'user_id': user_ids[username],
+                        'academic_score': score,
+                        'volunteer_hours': 0,
+                        'content_hash': scoring.submission_hash({'academic_score': score}, rules),
+                        'rule_version': rules.revision,
+                        'created_at': now,
+                    }
+                    for username, score in academic_scores.items()
+                ])
+            
+            db.session.commit()
+            created += len(users)
+    
+    if created:
+        rebuild_rankings()
+    return created, skipped, errors
+
+@bp.cli.command('import-students')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--default-password', default=None, help='名单中没有密码列时使用的初始密码')
+def import_students_command(path, default_password):
+    """从 Excel（.xlsx）或 CSV 名单批量导入学生"""
+    with open(path, 'rb') as f:
+        try:
+            created, skipped, errors = import_students(importer.read_roster(f, path), default_password)
+        except importer.RosterError as e:
+            raise click.ClickException(str(e))
+    for error in errors:
+        click.echo(error)
+    click.echo(f'已导入 {created} 名学生，跳过 {skipped} 个已存在的用户名，{len(errors)} 行有错误')
+
+@bp.cli.command('generate-previews')
+def generate_previews_command():
+    """为缺少预览图的已上传证明材料生成预览图"""
+    count = 0
+    for upload in Upload.query.order_by(Upload.id):
+        name = previews.preview_name(upload.sha256, os.path.splitext(upload.filename)[1])
+        if name is None or os.path.exists(preview_worker.path(name)):
+            continue
+        source = os.path.join(upload_root(), *upload.path.split('/'))
+        try:
+            previews.generate_preview(source, preview_worker.path(name))
+        except Exception as e:
+            click.echo(f'{upload.path}: {e}')
+            continue
+        count += 1
+    click.echo(f'已生成 {count} 张预览图')
+
+@bp.cli.command('sweep-sessions')
+def sweep_sessions_command():
+    """删除已过期的服务端会话"""
+    if not isinstance(current_app.session_interface, sessions.ServerSessionInterface):
+        raise click.ClickException('当前使用 Cookie 会话，没有需要清理的服务端会话')
+    removed = current_app.session_interface.store.sweep(datetime.now())
+    click.echo(f'已删除 {removed} 个过期会话')
+
+@bp.cli.command('rescore')
+@click.option('--rules', 'rules_path', default=None, help='计分规则文件路径，默认使用 scoring_rules.json')
+@click.option('--force', is_flag=True, help='忽略规则版本，重算全部学生')
+def rescore_command(rules_path, force):
+    """计分规则变更后批量重算全体学生成绩"""
+    rules = scoring.load_rules(rules_path)
+    count, skipped = rescore_students(rules, force=force)
+    click.echo(f'已按规则版本 {rules.version} 重新计算 {count} 名学生的成绩，{skipped} 名学生无需重算')
+
+def explain_query(query):
+    """返回查询计划的文本行（SQLite 使用 EXPLAIN QUERY PLAN，其他数据库使用 EXPLAIN）"""
+    dialect = db.engine.dialect
+    sql = str(query.compile(dialect=dialect, compile_kwargs={'literal_binds': True}))
+    if dialect.name == 'sqlite':
+        return [row[-1] for row in db.session.execute(db.text(f'EXPLAIN QUERY PLAN {sql}'))]
+    return [row[0] for row in db.session.execute(db.text(f'EXPLAIN {sql}'))]
+
+def query_plan_problems(plan):
+    """找出查询计划中的全表扫描和额外排序"""
+    problems = []
+    for line in plan:
+        # PostgreSQL 的子节点以 "->" 开头
+        node = line.strip().lstrip('->').strip()
+        # SQLite 为 count(DISTINCT) 去重建立的临时 B 树不是排序，按索引顺序读取时也会出现
+        if ('USE TEMP B-TREE' in line and 'DISTINCT' not in line) or node.startswith(('Sort', 'Incremental Sort')):
+            problems.append('额外排序')
+        if (line.startswith('SCAN') and 'INDEX' not in line) or 'Seq Scan' in line:
+            problems.append('全表扫描')
+    return problems
+
+@bp.cli.command('check-query-plans')
+def check_query_plans_command():
+    """检查教师面板和导出的查询是否使用了排名索引"""
+    dashboard_columns = [getattr(User, column) for column in DASHBOARD_COLUMNS]
+    queries = []
+    for sort_by in DASHBOARD_SORT_FIELDS:
+        sort_column = getattr(User, sort_by)
+        for descending in (True, False):
+            name = f'教师面板 {sort_by} {"desc" if descending else "asc"}'
+            page = student_query(dashboard_columns, sort_column, descending).limit(DASHBOARD_PAGE_SIZE)
+            queries.append((f'{name} 首页', page))
+            queries.append((f'{name} 翻页', page.where(keyset_after(sort_column, descending, 0, 0))))
+            queries.append((f'{name} 排名计数', db.select(db.func.count(User.id)).where(
+                User.role == 'student', keyset_after(sort_column, not descending, 0, 0))))
+    queries.append(('Excel 导出', student_query([getattr(User, field) for field in exports.EXPORT_FIELDS],
+                                               User.final_score)))
+    queries.append(('分专业导出', major_export_query()))
+    queries.append(('按专业统计', db.select(User.major, db.func.count(User.id))
+                    .where(User.role == 'student').group_by(User.major)))
+    # 增量更新排名时按成绩计数和调整排名（见 counted_ranks / shift_rankings）
+    queries.append(('全体排名计数', db.select(db.func.count(), db.func.count(db.distinct(Ranking.final_score)))
+                    .where(Ranking.final_score > 0, Ranking.user_id != 0)))
+    queries.append(('专业排名计数', db.select(db.func.count(), db.func.count(db.distinct(Ranking.final_score)))
+                    .where(Ranking.final_score > 0, Ranking.user_id != 0, Ranking.major == '')))
+    queries.append(('同分查询', db.select(Ranking.user_id)
+                    .where(Ranking.final_score == 0, Ranking.user_id != 0, Ranking.major == '').limit(1)))
+    
+    if db.engine.dialect.name != 'sqlite':
+        # 测试数据库中数据很少时 PostgreSQL 会直接选择全表扫描和排序；
+        # 在本事务中禁用它们，仍然出现时说明确实没有可用的索引
+        db.session.execute(db.text('SET LOCAL enable_seqscan = off'))
+        db.session.execute(db.text('SET LOCAL enable_sort = off'))
+    
+    failed = 0
+    for name, query in queries:
+        plan = explain_query(query)
+        problems = query_plan_problems(plan)
+        failed += bool(problems)
+        click.echo(f'[{"有问题：" + "、".join(sorted(set(problems))) if problems else "OK"}] {name}')
+        for line in plan:
+            click.echo(f'    {line}')
+    
+    if failed:
+        click.echo(f'{failed} 个查询未使用索引，请确认已执行 flask db upgrade')
+        sys.exit(1)
+
+def load_current_user():
+    """当前登录用户：会话中保存用户 ID，每个请求按主键查询一次，结果保存在 g.user 中"""
+    if 'user' not in g:
+        user = None
+        user_id = session.get('user_id')
+        if user_id is not None:
+            user = db.session.get(User, user_id)
+        elif 'username' in session:
+            # 旧版本登录时会话中只保存了用户名
+            user = User.query.filter_by(username=session['username']).first()
+            if user is not None:
+                session['user_id'] = user.id
+        g.user = user
+    return g.user
+
+def login_required(role=None, api=False):
+    """视图装饰器：要求已登录，指定 role 时还要求是该角色；api=True 时返回 JSON 格式的 401/403"""
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            user = load_current_user()
+            if user is None:
+                return (jsonify(error='未登录'), 401) if api else redirect(url_for('main.login'))
+            if role is not None and user.role != role:
+                return (jsonify(error='权限不足'), 403) if api else redirect(url_for('main.login'))
+            return view(*args, **kwargs)
+        return wrapped
+    return decorator
+
+@bp.route('/')
 def index():
-    return redirect(url_for('login'))
+    return redirect(url_for('main.login'))
 
-@app.route('/login', methods=['GET', 'POST'])
+@bp.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         username = request.form.get('username')
@@ -86,19 +1030,19 @@ def login():
         user = User.query.filter_by(username=username).first()
         
         if user and user.check_password(password):
-            session['username'] = username
-            session['role'] = user.role
+            sessions.regenerate(session)
+            session['user_id'] = user.id
             
             if user.role == 'teacher':
-                return redirect(url_for('teacher_dashboard'))
+                return redirect(url_for('main.teacher_dashboard'))
             else:
-                return redirect(url_for('transition_page'))
+                return redirect(url_for('main.transition_page'))
         else:
             return '用户名或密码错误'
     
     return render_template('login.html')
 
-@app.route('/register', methods=['GET', 'POST'])
+@bp.route('/register', methods=['GET', 'POST'])
 def register():
     role = request.args.get('role', 'student')
     
@@ -123,547 +1067,655 @@ def register():
         user.set_password(password)
         
         db.session.add(user)
+        if role == 'student':
+            db.session.flush()
+            update_ranking(user)
         db.session.commit()
         
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
     
     return render_template('register.html', role=role)
 
-@app.route('/transition')
+@bp.route('/transition')
+@login_required()
 def transition_page():
-    if 'username' not in session:
-        return redirect(url_for('login'))
+    user = g.user
     
     # 检查用户角色，教师应该重定向到教师面板
-    if session.get('role') == 'teacher':
-        return redirect(url_for('teacher_dashboard'))
+    if user.role == 'teacher':
+        return redirect(url_for('main.teacher_dashboard'))
     
-    username = session['username']
-    return render_template('transition.html', username=username)
+    return render_template('transition.html', username=user.username)
 
-@app.route('/profile', methods=['GET', 'POST'])
+@bp.route('/profile', methods=['GET', 'POST'])
+@login_required()
 def profile_page():
-    if 'username' not in session:
-        return redirect(url_for('login'))
-    
-    username = session['username']
-    user = User.query.filter_by(username=username).first()
-    
-    return render_template('profile.html', username=username, profile=user)
+    user = g.user
+    return render_template('profile.html', username=user.username, profile=user)
 
-@app.route('/save_profile', methods=['POST'])
+@bp.route('/save_profile', methods=['POST'])
+@login_required()
 def save_profile():
-    if 'username' not in session:
-        return redirect(url_for('login'))
+    user = g.user
+    user.full_name = request.form.get('full_name')
+    user.student_id = request.form.get('student_id')
+    user.major = request.form.get('major')
+    if user.role == 'student':
+        update_ranking(user)
     
-    username = session['username']
-    user = User.query.filter_by(username=username).first()
+    db.session.commit()
+    flash('个人信息保存成功！', 'success')
     
-    if user:
-        user.full_name = request.form.get('full_name')
-        user.student_id = request.form.get('student_id')
-        user.major = request.form.get('major')
-        
-        db.session.commit()
-        flash('个人信息保存成功！', 'success')
-    
-    return redirect(url_for('profile_page'))
+    return redirect(url_for('main.profile_page'))
+
+# 成绩提交的幂等键：页面每次渲染生成一个，随表单提交；双击或浏览器重试时提交的是同一个键
+IDEMPOTENCY_KEY_MAX_LENGTH = 64
 
-@app.route('/student')
+def request_idempotency_key():
+    """Idempotency-Key 请求头或表单字段 idempotency_key；没有或超过长度限制时为 None"""
+    key = request.headers.get('Idempotency-Key') or request.form.get('idempotency_key')
+    if key and len(key) <= IDEMPOTENCY_KEY_MAX_LENGTH:
+        return key
+    return None
+
+def submitted_with_key(user_id, idempotency_key):
+    """该学生是否已用这个幂等键成功提交过成绩"""
+    return db.session.scalar(
+        db.select(Submission.id)
+        .where(Submission.user_id == user_id, Submission.idempotency_key == idempotency_key)
+    ) is not None
+
+def score_page(username, scores):
+    return render_template('stu_page.html',
+                          username=username,
+                          final_score=scores['final_score'],
+                          academic_weighted=scores['academic_score'],
+                          academic_talent_weighted=scores['academic_talent_score'],
+                          comprehensive_weighted=scores['comprehensive_score'],
+                          idempotency_key=uuid.uuid4().hex)
+
+def saved_score_page(user):
+    """重复提交时返回已保存的成绩，不重新计分、不重复保存文件"""
+    return score_page(user.username, {field: getattr(user, field) for field in scoring.SCORE_FIELDS})
+
+@bp.route('/student')
+@login_required()
 def student_page():
-    if 'username' not in session:
-        return redirect(url_for('login'))
-    
-    username = session['username']
-    return render_template('stu_page.html', username=username)
+    return render_template('stu_page.html', username=g.user.username, idempotency_key=uuid.uuid4().hex)
 
-@app.route('/calculate_score', methods=['POST'])
+@bp.route('/calculate_score', methods=['POST'])
+@login_required()
 def calculate_score():
-    if 'username' not in session:
-        return redirect(url_for('login'))
+    user = g.user
+    username = user.username
     
-    username = session['username']
+    idempotency_key = request_idempotency_key()
+    if idempotency_key and submitted_with_key(user.id, idempotency_key):
+        return saved_score_page(user)
     
     try:
         # 获取学业成绩，添加错误处理
         academic_score_str = request.form.get('academic_score', '0')
         if not academic_score_str or not academic_score_str.replace('.', '').isdigit():
             flash('请输入有效的学业成绩', 'error')
-            return redirect(url_for('student_page'))
+            return redirect(url_for('main.student_page'))
         
         academic_score = float(academic_score_str)
         if academic_score < 0 or academic_score > 100:
             flash('学业成绩应在0-100之间', 'error')
-            return redirect(url_for('student_page'))
+            return redirect(url_for('main.student_page'))
     except ValueError:
         flash('学业成绩格式错误', 'error')
-        return redirect(url_for('student_page'))
+        return redirect(url_for('main.student_page'))
     
-    # 处理文件上传
+    # 志愿服务时长
+    volunteer_hours = int(request.form.get('volunteer_hours', 0))
+    
+    # 按规则表计算各项成绩
+    rules = scoring.current_rules()
+    submission = {
+        'academic_score': academic_score,
+        'volunteer_hours': volunteer_hours,
+        **scoring.selections_from_form(request.form, rules),
+    }
+    with instrumentation.span('scoring'):
+        breakdown = scoring.score(submission, rules)
+    
+    # 成绩、提交记录和排名在同一个事务中保存。User 带乐观锁版本号，
+    # 同一学生的另一次提交已先保存时，这里的 UPDATE 不会更新任何行并抛出 StaleDataError
+    try:
+        for field in scoring.SCORE_FIELDS:
+            setattr(user, field, breakdown[field])
+        # 成绩没有变化时 ORM 不会发出 UPDATE，仍标记为已修改，保证每次提交都检查并增加版本号
+        flag_modified(user, 'final_score')
+        save_submission(user, submission, rules, idempotency_key)
+        if user.role == 'student':
+            update_ranking(user)
+        db.session.commit()
+    except StaleDataError:
+        db.session.rollback()
+        # 同一个幂等键的并发重复提交：先保存的那次已经完成，直接返回它的结果
+        if idempotency_key and submitted_with_key(user.id, idempotency_key):
+            return saved_score_page(user)
+        flash('成绩已被同时进行的另一次提交更新，请确认后重新提交', 'error')
+        return redirect(url_for('main.student_page'))
+    
+    # 细分项成绩在成绩保存成功后才写入会话，被拒绝的提交不会让信息页显示未保存的成绩
+    for field in SESSION_SCORE_FIELDS:
+        session[field] = breakdown[field]
+    
+    # 成绩保存成功后再保存上传的文件，被拒绝的并发提交不会写入任何文件
     uploaded_files = []
     if 'proof_files' in request.files:
-        files = request.files.getlist('proof_files')
-        for file in files:
-            if file and file.filename and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                # 使用用户名作为子文件夹，防止文件名冲突
-                user_folder = os.path.join(app.config['UPLOAD_FOLDER'], username)
-                os.makedirs(os.path.join(app.root_path, user_folder), exist_ok=True)
-                file_path = os.path.join(user_folder, filename)
-                file.save(os.path.join(app.root_path, file_path))
-                uploaded_files.append(file_path)
-    
-    # 计算学术专长成绩
-    academic_talent_score = 0
-    
-    # 学术论文加分
-    paper_score = 0
-    for paper in request.form.getlist('academic_paper'):
-        if paper == 'nature_science_first':
-            paper_score += 12
-        elif paper == 'ccf_a_first':
-            paper_score += 1.5
-        elif paper == 'ccf_a_second':
-            paper_score += 0.75
-        elif paper == 'ccf_a_third':
-            paper_score += 0.45
-        elif paper == 'ccf_a_fourth':
-            paper_score += 0.3
-        elif paper == 'ccf_c_first':
-            paper_score += 0.25
-        elif paper == 'ccf_c_second':
-            paper_score += 0.125
-        elif paper == 'ccf_c_third':
-            paper_score += 0.075
-    academic_talent_score += paper_score
-    session['paper_score'] = paper_score
-    
-    # 发明专利加分
-    patent_score = 0
-    for patent in request.form.getlist('patent'):
-        if patent == 'patent_first_2':
-            patent_score += 1.8
-        elif patent == 'patent_first_4':
-            patent_score += 1.5
-        elif patent == 'patent_third':
-            patent_score += 0.45
-        elif patent == 'patent_fourth':
-            patent_score += 0.3
-    academic_talent_score += patent_score
-    session['patent_score'] = patent_score
-    
-    # 国家级竞赛加分
-    competition_national_score = 0
-    for competition in request.form.getlist('competition_national'):
-        if competition == 'a_plus_first_team':
-            competition_national_score += 4
-        elif competition == 'a_first_team':
-            competition_national_score += 3.375
-        elif competition == 'a_minus_first_team':
-            competition_national_score += 2.6666
-        elif competition == 'a_second_team':
-            competition_national_score += 2.25
-        elif competition == 'a_minus_second_team':
-            competition_national_score += 1.5
-        elif competition == 'a_third_team':
-            competition_national_score += 1.35
-        elif competition == 'a_minus_third_team':
-            competition_national_score += 0.9
-        elif competition == 'a_second_individual':
-            competition_national_score += 2.25
-        elif competition == 'a_third_individual':
-            competition_national_score += 1.35
-    academic_talent_score += competition_national_score
-    session['competition_national_score'] = competition_national_score
-    
-    # 省级竞赛加分
-    competition_provincial_score = 0
-    for competition in request.form.getlist('competition_provincial'):
-        if competition == 'a_first_team':
-            competition_provincial_score += 1.2
-        elif competition == 'a_minus_first_team':
-            competition_provincial_score += 0.8
-        elif competition == 'a_second_team':
-            competition_provincial_score += 0.6
-        elif competition == 'a_minus_second_team':
-            competition_provincial_score += 0.4
-        elif competition == 'a_third_team':
-            competition_provincial_score += 0.27
-        elif competition == 'a_first_individual':
-            competition_provincial_score += 1.2
-        elif competition == 'a_second_individual':
-            competition_provincial_score += 0.6
-    academic_talent_score += competition_provincial_score
-    session['competition_provincial_score'] = competition_provincial_score
-    
-    # CCF CSP认证加分
-    csp_score = 0
-    for csp in request.form.getlist('ccf_csp'):
-        if csp == 'csp_400':
-            csp_score += 4
-        elif csp == 'csp_320_399':
-            csp_score += 3
-        elif csp == 'csp_280_319':
-            csp_score += 2
-    academic_talent_score += csp_score
-    session['csp_score'] = csp_score
-    
-    # 创新创业训练项目加分
-    innovation_project_score = 0
-    for project in request.form.getlist('innovation_project'):
-        if project == 'national_leader':
-            innovation_project_score += 1
-        elif project == 'national_member':
-            innovation_project_score += 0.3
-        elif project == 'provincial_leader':
-            innovation_project_score += 0.5
-        elif project == 'provincial_member':
-            innovation_project_score += 0.2
-        elif project == 'school_leader':
-            innovation_project_score += 0.1
-        elif project == 'school_member':
-            innovation_project_score += 0.05
-    academic_talent_score += innovation_project_score
-    session['innovation_project_score'] = innovation_project_score
-    
-    # 限制学术专长成绩最高为12分
-    academic_talent_score = min(academic_talent_score, 12)
-    
-    # 计算综合表现加分
-    comprehensive_score = 0
-    
-    # 荣誉称号加分
-    honor_score = 0
-    for honor in request.form.getlist('honor'):
-        if honor == 'good_student':
-            honor_score = max(honor_score, 0.2)  # 同年度不累计
-        elif honor == 'excellent_student':
-            honor_score = max(honor_score, 0.2)  # 同年度不累计
-        elif honor == 'excellent_cadre':
-            honor_score = max(honor_score, 0.2)  # 同年度不累计
-        elif honor == 'excellent_league_member':
-            honor_score = max(honor_score, 0.2)  # 同年度不累计
-        elif honor == 'red_flag_branch':
-            honor_score += 0.1  # 集体荣誉可以加分
-    
-    comprehensive_score += honor_score
-    session['honor_score'] = honor_score
-    
-    # 社会工作加分
-    social_work_score = 0
-    for work in request.form.getlist('social_work'):
-        if work == 'class_monitor':
-            social_work_score += 1
-        elif work == 'deputy_monitor':
-            social_work_score += 0.5
-        elif work == 'study_committee':
-            social_work_score += 0.485
-        elif work == 'other_committee':
-            social_work_score += 0.475
-        elif work == 'student_union_chair':
-            social_work_score += 1.5
-        elif work == 'student_union_director':
-            social_work_score += 1.0
-        elif work == 'student_union_deputy':
-            social_work_score += 0.7125
-        elif work == 'student_union_member':
-            social_work_score += 0.5
-        elif work == 'club_president':
-            social_work_score += 0.75
-        elif work == 'club_vice_president':
-            social_work_score += 0.5
-        elif work == 'club_member':
-            social_work_score += 0.5
-    
-    # 社会工作加分累计不超过2分
-    social_work_score = min(social_work_score, 2)
-    comprehensive_score += social_work_score
-    session['social_work_score'] = social_work_score
-    
-    # 志愿服务加分
-    volunteer_hours = int(request.form.get('volunteer_hours', 0))
-    volunteer_score = 0
-    
-    if volunteer_hours >= 200:
-        volunteer_score = 1
-        # 每增加2小时加0.05分，最高不超过1分
-        additional_hours = volunteer_hours - 200
-        additional_score = min((additional_hours // 2) * 0.05, 1)
-        volunteer_score += additional_score
-    
-    comprehensive_score += volunteer_score
-    session['volunteer_score'] = volunteer_score
-    
-    # 限制综合表现加分最高为8分
-    comprehensive_score = min(comprehensive_score, 8)
-    
-    # 计算最终成绩
-    academic_weighted = academic_score * 0.8
-    academic_talent_weighted = academic_talent_score  # 学术专长成绩，已限制最高为12分
-    comprehensive_weighted = comprehensive_score  # 综合表现加分，已限制最高为8分
-    
-    final_score = academic_weighted + academic_talent_weighted + comprehensive_weighted
-    
-    # 保存成绩到用户模型
-    user = User.query.filter_by(username=username).first()
-    if user:
-        user.academic_score = round(academic_weighted, 3)
-        user.academic_talent_score = round(academic_talent_weighted, 3)
-        user.comprehensive_score = round(comprehensive_weighted, 3)
-        user.final_score = round(final_score, 3)
-        
-        # 保存学术专长细分项成绩
-        user.paper_score = round(paper_score, 3)
-        user.patent_score = round(patent_score, 3)
-        user.competition_national_score = round(competition_national_score, 3)
-        user.competition_provincial_score = round(competition_provincial_score, 3)
-        user.csp_score = round(csp_score, 3)
-        user.innovation_project_score = round(innovation_project_score, 3)
-        
-        # 保存综合表现细分项成绩
-        user.honor_score = round(honor_score, 3)
-        user.social_work_score = round(social_work_score, 3)
-        user.volunteer_score = round(volunteer_score, 3)
-        user.volunteer_hours = volunteer_hours
-        
+        with instrumentation.span('upload'):
+            uploaded_files, upload_errors = save_proof_files(user, request.files.getlist('proof_files'))
+        for error in upload_errors:
+            flash(error, 'error')
         db.session.commit()
+    if uploaded_files:
+        uploads.touch_directory(user_upload_folder(username))
     
     # 保存上传的文件路径到会话中，便于在信息页面显示
     session['uploaded_files'] = uploaded_files
     
-    return render_template('stu_page.html', 
-                          username=username,
-                          final_score=round(final_score, 3),
-                          academic_weighted=round(academic_weighted, 3),
-                          academic_talent_weighted=round(academic_talent_weighted, 3),
-                          comprehensive_weighted=round(comprehensive_weighted, 3))
+    return score_page(username, breakdown)
+
+@bp.route('/uploads/files/<path:path>')
+@login_required()
+def uploaded_file(path):
+    """证明材料文件，从 UPLOAD_FOLDER 读取（上传目录可以不在 static 目录下）"""
+    # 上传目录下以 . 开头的是内容存储和预览图目录，不直接提供下载
+    if path.startswith('.'):
+        abort(404)
+    return send_from_directory(upload_root(), path)
+
+@bp.route('/uploads/preview/<path:name>')
+@login_required()
+def upload_preview(name):
+    # 尚未生成（或无法生成）时返回 404，页面显示为普通文件图标
+    response = send_from_directory(preview_worker.preview_root, name, max_age=PREVIEW_MAX_AGE)
+    response.cache_control.immutable = True
+    response.cache_control.public = False
+    response.cache_control.private = True
+    return response
 
-@app.route('/student_info')
+@bp.app_errorhandler(StaleDataError)
+def concurrent_update(error):
+    # 乐观锁冲突：记录在读取之后已被其他请求修改
+    db.session.rollback()
+    flash('数据已被同时进行的另一次操作修改，请刷新后重试', 'error')
+    return redirect(request.referrer or url_for('main.index'))
+
+@bp.app_errorhandler(413)
+def request_entity_too_large(error):
+    limit = current_app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)
+    flash(f'上传内容过大，单次提交不能超过 {limit} MB', 'error')
+    return redirect(request.referrer or url_for('main.index'))
+
+@bp.route('/student_info')
+@login_required()
 def student_info():
-    if 'username' not in session:
-        return redirect(url_for('login'))
-    
-    username = session['username']
-    user = User.query.filter_by(username=username).first()
+    user = g.user
+    username = user.username
     
-    if not user:
-        return redirect(url_for('login'))
-    
-    # 获取上传的文件列表
-    uploaded_files = []
-    user_folder = os.path.join(app.config['UPLOAD_FOLDER'], username)
-    user_folder_path = os.path.join(app.root_path, user_folder)
-    
-    if os.path.exists(user_folder_path):
-        for file in os.listdir(user_folder_path):
-            if os.path.isfile(os.path.join(user_folder_path, file)) and allowed_file(file):
-                # 构建相对于static目录的路径
-                relative_path = os.path.join('uploads', username, file)
-                uploaded_files.append(relative_path)
-    
-    # 学术专长成绩详情（从数据库获取，而不是session）
-    academic_talent_details = [
-        {"name": "学术论文", "score": round(user.paper_score or 0, 3)},
-        {"name": "发明专利", "score": round(user.patent_score or 0, 3)},
-        {"name": "国家级竞赛", "score": round(user.competition_national_score or 0, 3)},
-        {"name": "省级竞赛", "score": round(user.competition_provincial_score or 0, 3)},
-        {"name": "CCF CSP认证", "score": round(user.csp_score or 0, 3)},
-        {"name": "创新创业训练项目", "score": round(user.innovation_project_score or 0, 3)}
-    ]
-    
-    # 综合表现加分详情（从数据库获取，而不是session）
-    comprehensive_details = [
-        {"name": "荣誉称号", "score": round(user.honor_score or 0, 3)},
-        {"name": "社会工作", "score": round(user.social_work_score or 0, 3)},
-        {"name": "志愿服务", "score": round(user.volunteer_score or 0, 3)}
-    ]
-    
-    # 确保值不为None
-    final_score = user.final_score if user.final_score is not None else 0
-    academic_weighted = user.academic_score if user.academic_score is not None else 0
-    academic_talent_weighted = user.academic_talent_score if user.academic_talent_score is not None else 0
-    comprehensive_weighted = user.comprehensive_score if user.comprehensive_score is not None else 0
-    
-    return render_template('stu_info.html',
-                          username=username,
-                          user=user,
-                          final_score=final_score,
-                          academic_weighted=academic_weighted,
-                          academic_talent_weighted=academic_talent_weighted,
-                          comprehensive_weighted=comprehensive_weighted,
-                          academic_talent_details=academic_talent_details,
-                          comprehensive_details=comprehensive_details,
-                          uploaded_files=uploaded_files)
-
-@app.route('/teacher/dashboard')
+    def render():
+        # 获取上传的文件列表
+        uploaded_files = uploaded_files_of(user)
+        
+        # 学术专长成绩详情（从数据库获取，而不是session）
+        academic_talent_details = [
+            {"name": "学术论文", "score": round(user.paper_score or 0, 3)},
+            {"name": "发明专利", "score": round(user.patent_score or 0, 3)},
+            {"name": "国家级竞赛", "score": round(user.competition_national_score or 0, 3)},
+            {"name": "省级竞赛", "score": round(user.competition_provincial_score or 0, 3)},
+            {"name": "CCF CSP认证", "score": round(user.csp_score or 0, 3)},
+            {"name": "创新创业训练项目", "score": round(user.innovation_project_score or 0, 3)}
+        ]
+        
+        # 综合表现加分详情（从数据库获取，而不是session）
+        comprehensive_details = [
+            {"name": "荣誉称号", "score": round(user.honor_score or 0, 3)},
+            {"name": "社会工作", "score": round(user.social_work_score or 0, 3)},
+            {"name": "志愿服务", "score": round(user.volunteer_score or 0, 3)}
+        ]
+        
+        # 确保值不为None
+        final_score = user.final_score if user.final_score is not None else 0
+        academic_weighted = user.academic_score if user.academic_score is not None else 0
+        academic_talent_weighted = user.academic_talent_score if user.academic_talent_score is not None else 0
+        comprehensive_weighted = user.comprehensive_score if user.comprehensive_score is not None else 0
+        
+        return render_template('stu_info.html',
+                              username=username,
+                              user=user,
+                              rank_info=student_ranking(user),
+                              final_score=final_score,
+                              academic_weighted=academic_weighted,
+                              academic_talent_weighted=academic_talent_weighted,
+                              comprehensive_weighted=comprehensive_weighted,
+                              academic_talent_details=academic_talent_details,
+                              comprehensive_details=comprehensive_details,
+                              uploaded_files=uploaded_files)
+    
+    return cached_page('student_info', user, render)
+
+@bp.route('/teacher/dashboard')
+@login_required('teacher')
 def teacher_dashboard():
-    if 'username' not in session or session.get('role') != 'teacher':
-        return redirect(url_for('login'))
-    
-    username = session['username']
+    username = g.user.username
     
     # 获取排序参数
     sort_by = request.args.get('sort_by', 'final_score')
     order = request.args.get('order', 'desc')
     
     # 验证排序字段是否有效
-    valid_sort_fields = ['final_score', 'academic_score', 'academic_talent_score', 'comprehensive_score']
-    if sort_by not in valid_sort_fields:
+    if sort_by not in DASHBOARD_SORT_FIELDS:
         sort_by = 'final_score'
-    
-    # 构建排序表达式
-    sort_expr = getattr(User, sort_by)
-    if order == 'desc':
-        sort_expr = sort_expr.desc()
+    if order not in ('asc', 'desc'):
+        order = 'desc'
+    
+    # 分页参数：after / before 为上一页最后一行 / 下一页第一行的学生 id
+    page_size = request.args.get('page_size', DASHBOARD_PAGE_SIZE, type=int)
+    page_size = max(1, min(page_size, DASHBOARD_MAX_PAGE_SIZE))
+    after = request.args.get('after', type=int)
+    before = request.args.get('before', type=int)
+    
+    sort_column = getattr(User, sort_by)
+    descending = order == 'desc'
+    
+    # 只查询表格中显示的列
+    columns = [getattr(User, column) for column in DASHBOARD_COLUMNS]
+    
+    cursor = None
+    if after or before:
+        cursor = db.session.execute(
+            db.select(User.id, sort_column).where(User.id == (after or before), User.role == 'student')
+        ).first()
+    
+    if cursor and before:
+        # 向前翻页：反向取一页再倒序
+        query = (student_query(columns, sort_column, not descending)
+                 .where(keyset_after(sort_column, not descending, cursor[1], cursor.id))
+                 .limit(page_size))
+        students = db.session.execute(query).all()[::-1]
     else:
-        sort_expr = sort_expr.asc()
-    
-    # 获取学生列表（只查询学生角色的用户）
-    students = User.query.filter_by(role='student').order_by(sort_expr).all()
+        query = student_query(columns, sort_column, descending).limit(page_size)
+        if cursor:
+            query = query.where(keyset_after(sort_column, descending, cursor[1], cursor.id))
+        students = db.session.execute(query).all()
+    
+    total = db.session.scalar(db.select(db.func.count(User.id)).where(User.role == 'student'))
+    
+    # 本页第一名之前的学生数，用于计算跨页的排名
+    offset = 0
+    if students:
+        first = students[0]
+        offset = db.session.scalar(
+            db.select(db.func.count(User.id))
+            .where(User.role == 'student',
+                   keyset_after(sort_column, not descending, getattr(first, sort_by), first.id))
+        )
     
     return render_template('teacher_dashboard.html', 
                           username=username, 
                           students=students, 
                           sort_by=sort_by, 
-                          order=order)
+                          order=order,
+                          page_size=page_size,
+                          page_sizes=DASHBOARD_PAGE_SIZES,
+                          rank_start=offset + 1,
+                          total=total,
+                          has_prev=offset > 0,
+                          has_next=offset + len(students) < total)
 
-@app.route('/teacher/student/<int:student_id>')
+@bp.route('/teacher/student/<int:student_id>')
+@login_required('teacher')
 def student_detail(student_id):
-    if 'username' not in session or session.get('role') != 'teacher':
-        return redirect(url_for('login'))
-    
-    username = session['username']
+    username = g.user.username
     
     # 获取学生信息
     student = User.query.get_or_404(student_id)
     
     # 确保查看的是学生用户
     if student.role != 'student':
-        return redirect(url_for('teacher_dashboard'))
+        return redirect(url_for('main.teacher_dashboard'))
     
-    # 获取学生上传的文件列表
-    uploaded_files = []
-    user_folder = os.path.join(app.config['UPLOAD_FOLDER'], student.username)
-    user_folder_path = os.path.join(app.root_path, user_folder)
-    
-    if os.path.exists(user_folder_path):
-        for file in os.listdir(user_folder_path):
-            if os.path.isfile(os.path.join(user_folder_path, file)) and allowed_file(file):
-                # 构建相对于static目录的路径
-                relative_path = os.path.join('uploads', student.username, file)
-                uploaded_files.append(relative_path)
-    
-    # 学术专长成绩详情
-    academic_talent_details = [
-        {"name": "学术论文", "score": student.paper_score or 0},
-        {"name": "发明专利", "score": student.patent_score or 0},
-        {"name": "国家级竞赛", "score": student.competition_national_score or 0},
-        {"name": "省级竞赛", "score": student.competition_provincial_score or 0},
-        {"name": "CCF CSP认证", "score": student.csp_score or 0},
-        {"name": "创新创业训练项目", "score": student.innovation_project_score or 0}
-    ]
-    
-    # 综合表现加分详情
-    comprehensive_details = [
-        {"name": "荣誉称号", "score": student.honor_score or 0},
-        {"name": "社会工作", "score": student.social_work_score or 0},
-        {"name": "志愿服务", "score": student.volunteer_score or 0}
-    ]
-    
-    return render_template('student_detail.html',
-                          username=username,
-                          student=student,
-                          final_score=student.final_score,
-                          academic_weighted=student.academic_score,
-                          academic_talent_weighted=student.academic_talent_score,
-                          comprehensive_weighted=student.comprehensive_score,
-                          academic_talent_details=academic_talent_details,
-                          comprehensive_details=comprehensive_details,
-                          uploaded_files=uploaded_files)
-
-@app.route('/teacher/export_excel')
-def export_excel():
-    if 'username' not in session or session.get('role') != 'teacher':
-        return redirect(url_for('login'))
-    
-    # 获取所有学生数据，按综合成绩降序排列
-    students = User.query.filter_by(role='student').order_by(User.final_score.desc()).all()
-    
-    # 创建工作簿
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "学生推免成绩排名"
-    
-    # 设置标题样式
-    title_font = Font(bold=True, size=12)
-    header_font = Font(bold=True, size=10)
-    center_alignment = Alignment(horizontal='center', vertical='center')
-    header_fill = PatternFill(start_color='CCCCCC', end_color='CCCCCC', fill_type='solid')
-    
-    # 设置表头
-    headers = [
-        '排名', '姓名', '学号', '专业', '用户名',
-        '综合成绩', '学业成绩', '学术专长成绩', '综合表现成绩',
-        '学术论文', '发明专利', '国家级竞赛', '省级竞赛', 'CCF CSP认证', '创新创业训练项目',
-        '荣誉称号', '社会工作', '志愿服务', '志愿服务时长(小时)'
-    ]
-    
-    # 写入表头
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col, value=header)
-        cell.font = header_font
-        cell.alignment = center_alignment
-        cell.fill = header_fill
-    
-    # 写入学生数据
-    for row, student in enumerate(students, 2):
-        rank = row - 1
-        data = [
-            rank,
-            student.full_name or '未填写',
-            student.student_id or '未填写',
-            student.major or '未填写',
-            student.username,
-            student.final_score or 0,
-            student.academic_score or 0,
-            student.academic_talent_score or 0,
-            student.comprehensive_score or 0,
-            student.paper_score or 0,
-            student.patent_score or 0,
-            student.competition_national_score or 0,
-            student.competition_provincial_score or 0,
-            student.csp_score or 0,
-            student.innovation_project_score or 0,
-            student.honor_score or 0,
-            student.social_work_score or 0,
-            student.volunteer_score or 0,
-            student.volunteer_hours or 0
+    def render():
+        # 获取学生上传的文件列表
+        uploaded_files = uploaded_files_of(student)
+        
+        # 学术专长成绩详情
+        academic_talent_details = [
+            {"name": "学术论文", "score": student.paper_score or 0},
+            {"name": "发明专利", "score": student.patent_score or 0},
+            {"name": "国家级竞赛", "score": student.competition_national_score or 0},
+            {"name": "省级竞赛", "score": student.competition_provincial_score or 0},
+            {"name": "CCF CSP认证", "score": student.csp_score or 0},
+            {"name": "创新创业训练项目", "score": student.innovation_project_score or 0}
+        ]
+        
+        # 综合表现加分详情
+        comprehensive_details = [
+            {"name": "荣誉称号", "score": student.honor_score or 0},
+            {"name": "社会工作", "score": student.social_work_score or 0},
+            {"name": "志愿服务", "score": student.volunteer_score or 0}
         ]
         
-        for col, value in enumerate(data, 1):
-            cell = ws.cell(row=row, column=col, value=value)
-            cell.alignment = center_alignment
+        return render_template('student_detail.html',
+                              username=username,
+                              student=student,
+                              rank_info=student_ranking(student),
+                              final_score=student.final_score,
+                              academic_weighted=student.academic_score,
+                              academic_talent_weighted=student.academic_talent_score,
+                              comprehensive_weighted=student.comprehensive_score,
+                              academic_talent_details=academic_talent_details,
+                              comprehensive_details=comprehensive_details,
+                              uploaded_files=uploaded_files)
+    
+    return cached_page('student_detail', student, render)
+
+@bp.route('/teacher/stats')
+@login_required('teacher')
+def teacher_stats():
+    field = request.args.get('field', 'final_score')
+    if field not in cohort_stats.STAT_FIELDS:
+        field = 'final_score'
+    
+    stats = cohort_statistics(field)
+    # 直方图按最高的一组计算柱子高度
+    peak = max(stats['overall']['histogram'] or [0]) or 1
+    labels = {column: header for header, column, _ in exports.EXPORT_COLUMNS}
+    return render_template('teacher_stats.html',
+                          username=g.user.username,
+                          field=field,
+                          fields=[(column, labels[column]) for column in cohort_stats.STAT_FIELDS],
+                          field_label=labels[field],
+                          percentiles=cohort_stats.PERCENTILES,
+                          stats=stats,
+                          peak=peak)
+
+@bp.route('/teacher/export_excel')
+@login_required('teacher')
+def export_excel():
+    # 同步导出：数据没有变化时直接发送已生成的文件，否则在请求中生成（大量学生时建议使用后台导出）
+    kind = request.args.get('kind', 'ranking')
+    if kind not in EXPORT_KINDS:
+        return f'不支持的导出种类：{kind}', 400
+    _, path = build_export(kind)
+    return export_file_response(kind, path, datetime.now())
+
+@bp.route('/teacher/exports', methods=['POST'])
+@login_required('teacher', api=True)
+def create_export():
+    """创建后台导出任务，之后轮询 status_url 查看进度"""
+    kind = request.form.get('kind') or (request.get_json(silent=True) or {}).get('kind') or 'ranking'
+    if kind not in EXPORT_KINDS:
+        return jsonify(error=f'不支持的导出种类：{kind}'), 400
+    job = start_export(kind, g.user)
+    response = jsonify(export_job_payload(job))
+    response.status_code = 200 if job.status == export_jobs.DONE else 202
+    response.headers['Location'] = url_for('main.export_status', job_id=job.id)
+    return response
+
+@bp.route('/teacher/exports/<job_id>')
+@login_required('teacher', api=True)
+def export_status(job_id):
+    job = db.session.get(ExportJob, job_id)
+    if job is None:
+        return jsonify(error='导出任务不存在'), 404
+    expire_stale_export(job)
+    return jsonify(export_job_payload(job))
+
+@bp.route('/teacher/exports/<job_id>/download')
+@login_required('teacher')
+def download_export(job_id):
+    job = db.get_or_404(ExportJob, job_id)
+    path = export_jobs.artifact_path(current_app.config['EXPORT_FOLDER'], job.kind, job.revision)
+    if job.status != export_jobs.DONE or not os.path.exists(path):
+        flash('导出文件尚未生成或已被更新的导出替换，请重新导出', 'error')
+        return redirect(url_for('main.teacher_dashboard'))
+    return export_file_response(job.kind, path, job.updated_at)
+
+@bp.route('/teacher/export')
+@login_required('teacher')
+def export_data():
+    # 导出格式与列，例如 ?format=csv&columns=student_id,full_name,final_score
+    export_format = request.args.get('format', 'csv')
+    if export_format not in exports.DATA_FORMATS:
+        return f'不支持的导出格式：{export_format}', 400
+    
+    fields = [field.strip() for field in request.args.get('columns', '').split(',') if field.strip()]
+    fields = fields or list(exports.EXPORT_FIELDS)
+    unknown = [field for field in fields if field not in exports.EXPORT_FIELDS]
+    if unknown:
+        return f'不支持的导出列：{", ".join(unknown)}', 400
+    
+    if export_format == 'parquet' and not exports.parquet_available():
+        return '服务器未安装 pyarrow，无法导出 Parquet 格式', 400
+    
+    # 在 SQL 层只选择需要的列，不构造 ORM 对象
+    query = (
+        student_query([getattr(User, field) for field in fields], User.final_score)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+    rows = db.session.execute(query)
     
-    # 调整列宽
-    for col in range(1, len(headers) + 1):
-        ws.column_dimensions[ws.cell(row=1, column=col).column_letter].width = 12
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    filename = f'学生推免成绩_{timestamp}.{export_format}'
+    mimetype = exports.DATA_FORMATS[export_format]
+    
+    if export_format == 'parquet':
+        path = exports.build_parquet(fields, {field: getattr(User, field).type.python_type for field in fields}, rows)
+        response = Response(exports.FileStream(path), mimetype=mimetype)
+        response.headers['Content-Length'] = str(os.path.getsize(path))
+    elif export_format == 'csv':
+        response = Response(stream_with_context(exports.csv_chunks(fields, rows)), mimetype=mimetype)
+    else:
+        response = Response(stream_with_context(exports.jsonl_chunks(fields, rows)), mimetype=mimetype)
     
-    # 创建临时文件
-    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx')
-    wb.save(temp_file.name)
-    temp_file.close()
+    response.headers['Content-Disposition'] = content_disposition(filename)
+    return response
+
+@bp.route('/teacher/import', methods=['POST'])
+@login_required('teacher')
+def teacher_import():
+    roster = request.files.get('roster')
+    if not roster or not roster.filename:
+        flash('请选择名单文件', 'error')
+        return redirect(url_for('main.teacher_dashboard'))
+    
+    # 每行都要计算一次密码哈希，名单过大时请求会超过服务器的超时时间，只在网页中导入较小的名单
+    limit = current_app.config['WEB_IMPORT_MAX_ROWS']
+    try:
+        records = list(islice(importer.read_roster(roster.stream, roster.filename), limit + 1))
+        if len(records) > limit:
+            flash(f'网页中每次最多导入 {limit} 行，更大的名单请分批导入，'
+                  f'或在服务器上使用命令行 flask import-students 导入', 'error')
+            return redirect(url_for('main.teacher_dashboard'))
+        created, skipped, errors = import_students(records, request.form.get('default_password') or None)
+    except importer.RosterError as e:
+        flash(str(e), 'error')
+        return redirect(url_for('main.teacher_dashboard'))
+    
+    flash(f'已导入 {created} 名学生，跳过 {skipped} 个已存在的用户名', 'success')
+    # 错误较多时只显示前几条
+    for error in errors[:5]:
+        flash(error, 'error')
+    if len(errors) > 5:
+        flash(f'另有 {len(errors) - 5} 行错误未显示', 'error')
+    
+    return redirect(url_for('main.teacher_dashboard'))
+
+@bp.route('/teacher/rescore', methods=['POST'])
+@login_required('teacher')
+def teacher_rescore():
+    # 重新读取规则文件；其他进程在下次计分时发现规则文件变化，也会改用新规则
+    rules = scoring.reload_rules()
+    count, skipped = rescore_students(rules, force=request.form.get('force') == '1')
+    flash(f'已按规则版本 {rules.version} 重新计算 {count} 名学生的成绩，{skipped} 名学生无需重算', 'success')
+    
+    return redirect(url_for('main.teacher_dashboard'))
+
+@bp.route('/api/v1/score', methods=['POST'])
+@login_required(api=True)
+def api_score():
+    """计分预览：返回成绩明细，不保存任何数据"""
+    rules = scoring.current_rules()
+    try:
+        submission = scoring.parse_submission(request.get_json(silent=True), rules)
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
     
-    # 生成文件名
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    filename = f'学生推免成绩排名_{timestamp}.xlsx'
+    return jsonify(rule_version=rules.version, breakdown=scoring.score(submission, rules))
+
+@bp.route('/api/v1/score/whatif', methods=['POST'])
+@login_required(api=True)
+def api_score_whatif():
+    """what-if 计算：在基准提交上增删选项，返回新的成绩明细，不保存任何数据
+    
+    基准可以是完整的提交（base）或之前返回的 base_hash，省略时使用当前用户最近一次保存的提交。
+    基准的细分项中间结果按提交摘要缓存，每次只重算改动涉及的细分项。
+    """
+    rules = scoring.current_rules()
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify(error='提交内容应为 JSON 对象'), 400
     
-    return send_file(temp_file.name, as_attachment=True, download_name=filename, mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+    try:
+        delta = scoring.parse_delta(data, rules)
+        if 'base' in data:
+            base_hash, partial = rules.cached_partial(scoring.parse_submission(data['base'], rules))
+        elif 'base_hash' in data:
+            base_hash = str(data['base_hash'])
+            partial = rules.lookup_partial(base_hash)
+            if partial is None:
+                return jsonify(error='基准提交已过期，请重新提交 base'), 404
+        else:
+            latest = latest_submission(g.user.id)
+            partial = rules.lookup_partial(latest.content_hash) if latest else None
+            if partial is None:
+                base_hash, partial = rules.cached_partial(latest.as_submission() if latest else {})
+            else:
+                base_hash = latest.content_hash
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    
+    before = rules.finish(partial)
+    after = rules.finish(rules.apply(partial, delta['add'], delta['remove'],
+                                     volunteer_hours=delta.get('volunteer_hours'),
+                                     academic_score=delta.get('academic_score')))
+    changes = {field: round(after[field] - before[field], scoring.ROUND_DIGITS)
+               for field in scoring.SCORE_FIELDS if after[field] != before[field]}
+    return jsonify(rule_version=rules.version, base_hash=base_hash, breakdown=after, changes=changes)
+
+@bp.route('/api/v1/stats')
+@login_required('teacher', api=True)
+def api_stats():
+    """年级成绩统计：?field=final_score，返回全体及各专业的统计量和直方图"""
+    field = request.args.get('field', 'final_score')
+    if field not in cohort_stats.STAT_FIELDS:
+        return jsonify(error=f'不支持统计的字段：{field}'), 400
+    return jsonify(field=field, **cohort_statistics(field))
+
+@bp.route('/api/v1/score/batch', methods=['POST'])
+@login_required('teacher', api=True)
+def api_score_batch():
+    """批量计分：{"submissions": [...]}，逐条返回成绩明细或错误信息"""
+    data = request.get_json(silent=True)
+    submissions = data.get('submissions') if isinstance(data, dict) else None
+    if not isinstance(submissions, list):
+        return jsonify(error='请求体应为 {"submissions": [...]}'), 400
+    limit = current_app.config['SCORE_BATCH_LIMIT']
+    if len(submissions) > limit:
+        return jsonify(error=f'单次最多提交 {limit} 条'), 400
+    
+    rules = scoring.current_rules()
+    results = []
+    valid = []
+    for item in submissions:
+        result = {'id': item.get('id')} if isinstance(item, dict) else {'id': None}
+        try:
+            valid.append((result, scoring.parse_submission(item, rules)))
+        except ValueError as e:
+            result['error'] = str(e)
+        results.append(result)
+    
+    # 合法的提交一次性批量计算
+    if valid:
+        columns = rescoring.score_cohort([submission for _, submission in valid], rules)
+        for (result, _), breakdown in zip(valid, rescoring.to_breakdowns(columns)):
+            result['breakdown'] = breakdown
+    
+    return jsonify(rule_version=rules.version, results=results)
 
-@app.route('/logout')
+@bp.route('/logout')
 def logout():
-    session.pop('username', None)
-    session.pop('role', None)
-    return redirect(url_for('login'))
+    session.clear()
+    return redirect(url_for('main.login'))
+
+def create_app(config=None):
+    """应用工厂
+    
+    config 为配置名（development / production，见 settings.py）、配置类，或在默认配置上覆盖的配置字典；
+    省略时按环境变量 APP_ENV 选择，都没有时为 development。环境变量中的 SECRET_KEY、DATABASE_URL 等
+    覆盖配置类中的值，配置字典中的值优先级最高。
+    """
+    overrides = {}
+    if isinstance(config, Mapping):
+        overrides, config = dict(config), None
+    
+    app = Flask(__name__, template_folder='html_files')
+    app.config.from_object(config if isinstance(config, type) else settings.config_class(config))
+    app.config.update(settings.from_environ())
+    app.config.update(overrides)
+    settings.finalize(app.config, app.instance_path)
+    
+    # 创建上传目录（如果不存在）
+    os.makedirs(os.path.join(app.root_path, app.config['UPLOAD_FOLDER']), exist_ok=True)
+    
+    db.init_app(app)
+    migrate.init_app(app, db)
+    with app.app_context():
+        database.configure_engine(db.engine)
+        instrumentation.init_app(app, db.engine)
+    
+    # 静态文件和 /metrics 不使用会话，不必为它们读取会话
+    sessionless_paths = (app.static_url_path + '/', '/metrics')
+    if app.config['SESSION_BACKEND'] == 'database':
+        app.session_interface = sessions.ServerSessionInterface(
+            sessions.SqlSessionStore(lambda: db.engine, ServerSessionRecord.__table__),
+            skip_paths=sessionless_paths)
+    elif app.config['SESSION_BACKEND'] == 'filesystem':
+        app.session_interface = sessions.ServerSessionInterface(
+            sessions.FileSessionStore(app.config['SESSION_FILE_DIR']), skip_paths=sessionless_paths)
+    
+    # 学生页面的渲染结果缓存，学生记录更新并提交后失效
+    app.extensions['rendered_pages'] = page_cache.PageCache(
+        page_cache.create_backend(app.config['PAGE_CACHE_URL'], app.config['PAGE_CACHE_SIZE']))
+    # 后台生成证明材料预览图
+    app.extensions['preview_worker'] = previews.PreviewWorker(
+        os.path.join(app.root_path, app.config['UPLOAD_PREVIEW_FOLDER']), logger=app.logger)
+    # 后台导出任务线程池
+    app.extensions['export_runner'] = export_jobs.JobRunner(logger=app.logger)
+    # 上传清单缓存（按用户目录的修改时间失效）、排名索引（按排名修订号重新加载）、
+    # 年级统计缓存：成绩列 -> (排名修订号, 统计结果)
+    app.extensions['upload_manifest_cache'] = uploads.ManifestCache(load_upload_manifest)
+    app.extensions['rank_index_cache'] = ranking.IndexCache()
+    app.extensions['stats_cache'] = {}
+    
+    app.register_blueprint(bp)
+    return app
+
+def dispose_engine_after_fork(app):
+    """多进程服务器在主进程中创建应用（preload）后 fork 出工作进程时，在工作进程中调用
+    
+    丢弃从主进程继承的连接池（不关闭其中的连接，以免影响主进程），工作进程按需重新连接，
+    不会与其他进程共用同一个数据库连接。
+    """
+    with app.app_context():
+        db.engine.dispose(close=False)
 
 if __name__ == '__main__':
-    app.run(debug=True, port=5001, host='0.0.0.0')
\ No newline at end of file
+    # 开发服务器，调试模式由配置决定；生产环境使用 serve.py
+    create_app().run(port=5001, host='0.0.0.0')
\ No newline at end of file
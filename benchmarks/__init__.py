@@ -0,0 +1,7 @@
+"""性能基准测试
+
+用法见 README.md 的“性能基准测试”一节：
+
+    python -m benchmarks.run --sizes 1000,10000,100000
+    python -m benchmarks.compare 旧结果.json 新结果.json
+"""
@@ -0,0 +1,66 @@
+"""合成学生数据
+
+按固定随机种子生成 N 名学生：专业、学业成绩、志愿服务时长以及各类加分选项的
+勾选情况都大致符合真实分布（多数学生没有或只有少量加分项），成绩由计分规则计算。
+同一种子每次生成的数据完全相同，不同提交之间的基准测试结果可以直接比较。
+"""
+import random
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import scoring
+
+MAJORS = ('计算机科学与技术', '软件工程', '人工智能', '网络空间安全', '信息安全', '数据科学与大数据技术')
+# 各专业人数比例
+MAJOR_WEIGHTS = (30, 25, 15, 12, 10, 8)
+
+# 每一类加分项勾选 0、1、2、3 个选项的概率
+SELECTION_COUNT_WEIGHTS = (60, 25, 10, 5)
+
+# 每名学生上传的证明材料数量范围
+PROOF_FILES_PER_STUDENT = (0, 4)
+
+DEFAULT_SEED = 20240901
+
+
+def options_by_field(rules: scoring.RuleSet) -> Dict[str, List[str]]:
+    """各表单字段可选的选项值"""
+    fields = {}
+    for field, option in rules.items:
+        fields.setdefault(field, []).append(option)
+    return fields
+
+
+def random_submission(rng: random.Random, fields: Dict[str, List[str]]) -> Dict:
+    """一次随机的成绩提交，格式与成绩计算表单相同"""
+    submission = {
+        'academic_score': round(min(100.0, max(60.0, rng.gauss(82, 6))), 2),
+        'volunteer_hours': 0 if rng.random() < 0.3 else rng.randint(0, 400),
+    }
+    for field, options in fields.items():
+        count = rng.choices(range(len(SELECTION_COUNT_WEIGHTS)), SELECTION_COUNT_WEIGHTS)[0]
+        submission[field] = rng.sample(options, min(count, len(options)))
+    return submission
+
+
+def generate_students(n: int, seed: int = DEFAULT_SEED,
+                      rules: Optional[scoring.RuleSet] = None) -> Iterator[Tuple[Dict, Dict, int]]:
+    """逐个产出 (学生字段, 提交内容, 证明材料数量)；学生字段包含按规则计算的各项成绩"""
+    rules = rules or scoring.DEFAULT_RULES
+    rng = random.Random(seed)
+    fields = options_by_field(rules)
+    for i in range(n):
+        submission = random_submission(rng, fields)
+        student = {
+            'username': f'bench{i:06d}',
+            'full_name': f'学生{i:06d}',
+            'student_id': f'2021{i:06d}',
+            'major': rng.choices(MAJORS, MAJOR_WEIGHTS)[0],
+            **scoring.score(submission, rules),
+        }
+        yield student, submission, rng.randint(*PROOF_FILES_PER_STUDENT)
+
+
+def proof_file_content(student_index: int, file_index: int, size: int = 2048) -> bytes:
+    """证明材料内容：同一学生的不同文件内容不同，便于按摘要去重时不被合并"""
+    header = f'%PDF-1.4 bench {student_index} {file_index}\n'.encode('ascii')
+    return header + b'0' * max(0, size - len(header))
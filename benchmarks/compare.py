@@ -0,0 +1,67 @@
+"""比较两次基准测试结果
+
+    python -m benchmarks.compare benchmarks/results/旧提交.json benchmarks/results/新提交.json
+
+逐项列出两次结果中的耗时（*_ms、*_seconds）、吞吐量（*_per_second）和内存指标，
+变化超过阈值（默认 10%）的项目标记为变快 / 变慢。
+"""
+import argparse
+import json
+
+# 越大越好的指标（吞吐量）；其余耗时、内存指标都是越小越好
+HIGHER_IS_BETTER = ('_per_second',)
+METRIC_SUFFIXES = ('_ms', '_seconds', '_per_second', '_mb')
+
+DEFAULT_THRESHOLD = 0.1
+
+
+def flatten(results, prefix=''):
+    """把嵌套的结果展开为 {'10000.teacher_dashboard.final_score_desc.first_page.median_ms': 值}"""
+    metrics = {}
+    for key, value in results.items():
+        name = f'{prefix}.{key}' if prefix else key
+        if isinstance(value, dict):
+            metrics.update(flatten(value, name))
+        elif isinstance(value, (int, float)) and key.endswith(METRIC_SUFFIXES):
+            metrics[name] = value
+    return metrics
+
+
+def load(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='比较两次基准测试结果')
+    parser.add_argument('base', help='作为基准的结果文件')
+    parser.add_argument('new', help='要比较的结果文件')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='标记变化的相对阈值，默认 0.1（10%%）')
+    parser.add_argument('--all', action='store_true', help='同时列出变化不超过阈值的项目')
+    args = parser.parse_args(argv)
+
+    base, new = load(args.base), load(args.new)
+    print(f'基准 {base["commit"]}  ->  新 {new["commit"]}')
+    base_metrics = flatten(base['sizes'])
+    new_metrics = flatten(new['sizes'])
+
+    for name in sorted(base_metrics.keys() & new_metrics.keys()):
+        old, current = base_metrics[name], new_metrics[name]
+        if not old:
+            continue
+        change = (current - old) / old
+        if name.endswith(HIGHER_IS_BETTER):
+            change = -change
+        if abs(change) <= args.threshold and not args.all:
+            continue
+        mark = '变慢' if change > args.threshold else '变快' if change < -args.threshold else ''
+        print(f'{name}: {old} -> {current} ({change:+.1%}) {mark}'.rstrip())
+
+    missing = sorted(base_metrics.keys() ^ new_metrics.keys())
+    if missing:
+        print(f'只在其中一份结果中出现的项目：{len(missing)} 个')
+
+
+if __name__ == '__main__':
+    main()
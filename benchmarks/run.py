@@ -0,0 +1,393 @@
+"""性能基准测试
+
+每个规模（学生人数）在独立的子进程中运行：子进程创建临时目录，用 Alembic 迁移
+建立临时 SQLite 数据库，写入合成学生数据后通过 Flask 测试客户端测量：
+
+- calculate_score：成绩提交接口的吞吐量，以及 scoring.score() 本身的吞吐量
+- teacher_dashboard：按各排序字段、升降序的首页和中间页延迟
+- student_detail：上传了大量证明材料的学生详情页延迟（缓存命中与未命中）
+- export_excel：导出耗时、直接发送已生成文件的耗时与 Python 内存分配峰值（tracemalloc）
+
+结果写入 JSON 文件（默认 benchmarks/results/<提交号>.json），可以用
+python -m benchmarks.compare 比较两次提交的结果。
+"""
+import argparse
+import hashlib
+import io
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+from werkzeug.datastructures import MultiDict
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_FOLDER = os.path.join(REPO_ROOT, 'benchmarks', 'results')
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+# 每个页面请求重复的次数
+DEFAULT_REPEAT = 20
+# 成绩提交接口的请求次数
+DEFAULT_SCORE_REQUESTS = 200
+# 详情页测试学生上传的证明材料数量
+DEFAULT_DETAIL_UPLOADS = 300
+# 导出重复的次数（每次导出较慢，不使用 DEFAULT_REPEAT）
+DEFAULT_EXPORT_REPEAT = 3
+# 单独测量 scoring.score() 时计算的提交数
+SCORE_SAMPLES = 10000
+
+# 写入合成数据时每批的学生数
+SEED_BATCH_SIZE = 5000
+
+BENCH_PASSWORD = 'bench'
+TEACHER_USERNAME = 'bench_teacher'
+
+
+def timing_summary(samples):
+    """耗时（秒）列表的统计量，单位为毫秒"""
+    ms = sorted(sample * 1000 for sample in samples)
+    return {
+        'runs': len(ms),
+        'mean_ms': round(statistics.mean(ms), 3),
+        'median_ms': round(statistics.median(ms), 3),
+        'p95_ms': round(ms[math.ceil(len(ms) * 0.95) - 1], 3),
+        'min_ms': round(ms[0], 3),
+    }
+
+
+def timed_get(client, url):
+    """请求页面并读完响应内容，返回 (耗时, 响应字节数)"""
+    start = time.perf_counter()
+    response = client.get(url)
+    size = 0
+    for chunk in response.response:
+        size += len(chunk)
+    response.close()
+    elapsed = time.perf_counter() - start
+    if response.status_code != 200:
+        raise RuntimeError(f'{url} 返回 {response.status_code}')
+    return elapsed, size
+
+
+def login(client, username):
+    response = client.post('/login', data={'username': username, 'password': BENCH_PASSWORD})
+    if response.status_code != 302:
+        raise RuntimeError(f'{username} 登录失败')
+
+
+def seed_database(app_module, app, n, seed, detail_uploads):
+    """写入 n 名合成学生及其提交、上传清单和一名教师，返回详情页测试学生的 id"""
+    from werkzeug.security import generate_password_hash
+
+    from benchmarks import cohort
+
+    db = app_module.db
+    User, Submission, SubmissionItem, Upload = (app_module.User, app_module.Submission,
+                                                app_module.SubmissionItem, app_module.Upload)
+    rules = app_module.scoring.DEFAULT_RULES
+    # 所有合成用户共用一个密码哈希，否则生成数据的时间都花在哈希计算上
+    password_hash = generate_password_hash(BENCH_PASSWORD)
+    now = datetime.now()
+
+    users, submissions, items, upload_rows = [], [], [], []
+
+    def flush():
+        db.session.bulk_insert_mappings(User, users)
+        db.session.bulk_insert_mappings(Submission, submissions)
+        db.session.bulk_insert_mappings(SubmissionItem, items)
+        db.session.bulk_insert_mappings(Upload, upload_rows)
+        db.session.commit()
+        for rows in (users, submissions, items, upload_rows):
+            rows.clear()
+
+    for i, (student, submission, proof_count) in enumerate(cohort.generate_students(n, seed, rules)):
+        # 显式指定主键，提交和选项可以直接引用，不需要回查自增 id
+        user_id = i + 1
+        users.append({'id': user_id, 'password_hash': password_hash, 'role': 'student', **student})
+        submissions.append({
+            'id': user_id,
+            'user_id': user_id,
+            'academic_score': submission['academic_score'],
+            'volunteer_hours': submission['volunteer_hours'],
+            'content_hash': app_module.scoring.submission_hash(submission, rules),
+            'rule_version': rules.revision,
+            'created_at': now,
+        })
+        position = 0
+        for field in rules.fields:
+            for option in submission.get(field) or ():
+                items.append({'submission_id': user_id, 'field': field, 'option': option, 'position': position})
+                position += 1
+        # 普通学生的上传清单只写入数据库；详情页测试学生的文件另外真实写入磁盘
+        if user_id != 1:
+            for j in range(proof_count):
+                filename = f'proof_{j}.pdf'
+                upload_rows.append({
+                    'user_id': user_id,
+                    'filename': filename,
+                    'path': f'{student["username"]}/{filename}',
+                    'size': 2048,
+                    'mtime': now.timestamp(),
+                    'sha256': hashlib.sha256(cohort.proof_file_content(user_id, j)).hexdigest(),
+                    'created_at': now,
+                })
+        if len(users) >= SEED_BATCH_SIZE:
+            flush()
+
+    users.append({'id': n + 1, 'username': TEACHER_USERNAME, 'password_hash': password_hash, 'role': 'teacher'})
+    flush()
+    app_module.rebuild_rankings()
+
+    # 详情页测试学生：大量证明材料，按正常上传流程写入 blob 并硬链接到用户目录
+    detail_student = db.session.get(User, 1)
+    user_folder = app_module.user_upload_folder(detail_student.username)
+    blob_folder = os.path.join(app.root_path, app.config['UPLOAD_BLOB_FOLDER'])
+    os.makedirs(user_folder, exist_ok=True)
+    for j in range(detail_uploads):
+        filename = f'proof_{j}.pdf'
+        content = cohort.proof_file_content(1, j)
+        sha256, size, blob = app_module.uploads.store_blob(io.BytesIO(content), blob_folder, '.pdf', len(content))
+        target = os.path.join(user_folder, filename)
+        app_module.uploads.link_blob(blob, target)
+        db.session.add(Upload(user_id=1, filename=filename, path=f'{detail_student.username}/{filename}',
+                              size=size, mtime=os.stat(target).st_mtime, sha256=sha256))
+    db.session.commit()
+    return detail_student.id
+
+
+def bench_calculate_score(app_module, client, seed, requests):
+    from benchmarks import cohort
+
+    rules = app_module.scoring.DEFAULT_RULES
+    rng = random.Random(seed)
+    fields = cohort.options_by_field(rules)
+
+    submissions = [cohort.random_submission(rng, fields) for _ in range(SCORE_SAMPLES)]
+    start = time.perf_counter()
+    for submission in submissions:
+        app_module.scoring.score(submission, rules)
+    score_seconds = time.perf_counter() - start
+
+    samples = []
+    for submission in submissions[:requests]:
+        form = MultiDict()
+        for field, value in submission.items():
+            if isinstance(value, list):
+                for option in value:
+                    form.add(field, option)
+            else:
+                form.add(field, str(value))
+        start = time.perf_counter()
+        response = client.post('/calculate_score', data=form)
+        response.get_data()
+        samples.append(time.perf_counter() - start)
+        if response.status_code != 200:
+            raise RuntimeError(f'/calculate_score 返回 {response.status_code}')
+
+    return {
+        'requests_per_second': round(len(samples) / sum(samples), 2),
+        'latency': timing_summary(samples),
+        'score_calls_per_second': round(len(submissions) / score_seconds, 1),
+    }
+
+
+def bench_dashboard(app_module, app, client, n, repeat):
+    db, User = app_module.db, app_module.User
+    results = {}
+    for sort_by in app_module.DASHBOARD_SORT_FIELDS:
+        sort_column = getattr(User, sort_by)
+        for order in ('desc', 'asc'):
+            url = f'/teacher/dashboard?sort_by={sort_by}&order={order}'
+            # 中间页：从排名居中的学生之后开始
+            with app.app_context():
+                middle = db.session.scalar(
+                    app_module.student_query([User.id], sort_column, order == 'desc').offset(n // 2).limit(1)
+                )
+            results[f'{sort_by}_{order}'] = {
+                'first_page': timing_summary([timed_get(client, url)[0] for _ in range(repeat)]),
+                'middle_page': timing_summary([timed_get(client, f'{url}&after={middle}')[0] for _ in range(repeat)]),
+            }
+    return results
+
+
+def bench_student_detail(app_module, app, client, student_id, repeat):
+    url = f'/teacher/student/{student_id}'
+    warm = [timed_get(client, url)[0] for _ in range(repeat)]
+    cold = []
+    for _ in range(repeat):
+        # 同时清掉上传清单缓存和页面缓存，测量完整渲染一次的耗时
+        app.extensions['upload_manifest_cache'].invalidate(student_id)
+        app.extensions['rendered_pages'].invalidate(student_id)
+        cold.append(timed_get(client, url)[0])
+    return {'warm': timing_summary(warm), 'cold': timing_summary(cold)}
+
+
+def bench_export_excel(app, client, repeat):
+    export_folder = app.config['EXPORT_FOLDER']
+    samples = []
+    size = 0
+    for _ in range(repeat):
+        # 删除已生成的文件，测量完整生成一次的耗时
+        shutil.rmtree(export_folder, ignore_errors=True)
+        elapsed, size = timed_get(client, '/teacher/export_excel')
+        samples.append(elapsed)
+    # 数据没有变化时直接发送已生成的文件
+    cached = [timed_get(client, '/teacher/export_excel')[0] for _ in range(repeat)]
+
+    # tracemalloc 会明显拖慢执行，内存峰值单独测量一次
+    shutil.rmtree(export_folder, ignore_errors=True)
+    tracemalloc.start()
+    try:
+        timed_get(client, '/teacher/export_excel')
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'seconds': [round(sample, 3) for sample in samples],
+        'median_seconds': round(statistics.median(samples), 3),
+        'cached': timing_summary(cached),
+        'peak_python_memory_mb': round(peak / (1024 * 1024), 2),
+        'file_bytes': size,
+    }
+
+
+def run_size(n, seed, repeat, score_requests, detail_uploads, export_repeat):
+    """在当前进程中测量一个规模；排名索引等缓存是进程内的，每个规模在单独的子进程中调用"""
+    workdir = tempfile.mkdtemp(prefix='bench-')
+    try:
+        sys.path.insert(0, REPO_ROOT)
+        import app as app_module
+        from flask_migrate import upgrade
+
+        app = app_module.create_app({
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(workdir, 'bench.db'),
+            'UPLOAD_FOLDER': os.path.join(workdir, 'uploads'),
+            'UPLOAD_BLOB_FOLDER': os.path.join(workdir, 'uploads', '.blobs'),
+            'UPLOAD_PREVIEW_FOLDER': os.path.join(workdir, 'uploads', '.previews'),
+            'EXPORT_FOLDER': os.path.join(workdir, 'exports'),
+        })
+
+        with app.app_context():
+            upgrade(directory=os.path.join(REPO_ROOT, 'migrations'))
+            start = time.perf_counter()
+            detail_student = seed_database(app_module, app, n, seed, detail_uploads)
+            seed_seconds = time.perf_counter() - start
+
+        teacher = app.test_client()
+        login(teacher, TEACHER_USERNAME)
+        student = app.test_client()
+        login(student, 'bench000001')
+
+        # 请求不能在外层应用上下文中发出，否则各请求会共用同一个 g 和数据库会话
+        results = {
+            'students': n,
+            'seed_seconds': round(seed_seconds, 2),
+            'calculate_score': bench_calculate_score(app_module, student, seed + 1, score_requests),
+            'teacher_dashboard': bench_dashboard(app_module, app, teacher, n, repeat),
+            'student_detail': {
+                'uploads': detail_uploads,
+                **bench_student_detail(app_module, app, teacher, detail_student, repeat),
+            },
+            'export_excel': bench_export_excel(app, teacher, export_repeat),
+        }
+        app.extensions['preview_worker'].shutdown()
+        return results
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=REPO_ROOT,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown', False
+    return commit, bool(dirty)
+
+
+def parse_sizes(value):
+    try:
+        sizes = [int(size) for size in value.split(',') if size.strip()]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'学生人数应为逗号分隔的整数：{value}')
+    if not sizes or min(sizes) < 2:
+        raise argparse.ArgumentTypeError('学生人数至少为 2')
+    return sizes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='成绩计算、教师面板、学生详情和 Excel 导出的性能基准测试')
+    parser.add_argument('--sizes', type=parse_sizes, default=list(DEFAULT_SIZES),
+                        help='逗号分隔的学生人数，默认 1000,10000,100000')
+    parser.add_argument('--seed', type=int, default=None, help='合成数据的随机种子')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help='每个页面请求的重复次数')
+    parser.add_argument('--score-requests', type=int, default=DEFAULT_SCORE_REQUESTS,
+                        help='成绩提交接口的请求次数')
+    parser.add_argument('--detail-uploads', type=int, default=DEFAULT_DETAIL_UPLOADS,
+                        help='详情页测试学生的证明材料数量')
+    parser.add_argument('--export-repeat', type=int, default=DEFAULT_EXPORT_REPEAT, help='Excel 导出的重复次数')
+    parser.add_argument('--output', default=None, help='结果文件路径，默认 benchmarks/results/<提交号>.json')
+    # 以下参数由父进程传给子进程，每个规模单独一个进程
+    parser.add_argument('--child-size', type=int, default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--child-output', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    from benchmarks import cohort
+    seed = cohort.DEFAULT_SEED if args.seed is None else args.seed
+
+    if args.child_size is not None:
+        results = run_size(args.child_size, seed, args.repeat, args.score_requests, args.detail_uploads,
+                           args.export_repeat)
+        with open(args.child_output, 'w', encoding='utf-8') as f:
+            json.dump(results, f)
+        return
+
+    commit, dirty = git_commit()
+    report = {
+        'commit': commit,
+        'dirty': dirty,
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'seed': seed,
+        'repeat': args.repeat,
+        'sizes': {},
+    }
+    for n in args.sizes:
+        print(f'正在测量 {n} 名学生……', file=sys.stderr)
+        fd, child_output = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        try:
+            subprocess.run([sys.executable, '-m', 'benchmarks.run',
+                            '--child-size', str(n), '--child-output', child_output,
+                            '--seed', str(seed), '--repeat', str(args.repeat),
+                            '--score-requests', str(args.score_requests),
+                            '--detail-uploads', str(args.detail_uploads),
+                            '--export-repeat', str(args.export_repeat)],
+                           cwd=REPO_ROOT, check=True)
+            with open(child_output, encoding='utf-8') as f:
+                report['sizes'][str(n)] = json.load(f)
+        finally:
+            os.remove(child_output)
+
+    output = args.output or os.path.join(RESULTS_FOLDER, f'{commit}{"-dirty" if dirty else ""}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f'结果已写入 {output}', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""年级成绩统计
+
+按专业统计人数、平均分、中位数、分位数和分数分布直方图。每次只读取一个成绩列
+（以及专业列），用 NumPy 计算，不需要把整张学生表渲染出来。
+"""
+from typing import Dict, Sequence
+
+import numpy as np
+
+# 可以统计的成绩列
+STAT_FIELDS = (
+    'final_score', 'academic_score', 'academic_talent_score', 'comprehensive_score',
+    'paper_score', 'patent_score', 'competition_national_score', 'competition_provincial_score',
+    'csp_score', 'innovation_project_score', 'honor_score', 'social_work_score', 'volunteer_score',
+)
+
+PERCENTILES = (10, 25, 50, 75, 90)
+
+# 直方图分组数；同一列所有专业使用相同的分组，便于比较
+HISTOGRAM_BINS = 20
+
+ROUND_DIGITS = 3
+
+
+def _round(value) -> float:
+    return round(float(value), ROUND_DIGITS)
+
+
+def summarize(values: np.ndarray, bin_edges: np.ndarray) -> Dict:
+    """一组成绩的统计量；没有数据时各统计量为 None"""
+    counts, _ = np.histogram(values, bins=bin_edges)
+    summary = {'count': int(values.size), 'histogram': counts.tolist()}
+    if not values.size:
+        summary.update(mean=None, std=None, min=None, max=None, median=None,
+                       percentiles={str(p): None for p in PERCENTILES})
+        return summary
+
+    percentiles = np.percentile(values, PERCENTILES)
+    summary.update(
+        mean=_round(values.mean()),
+        std=_round(values.std()),
+        min=_round(values.min()),
+        max=_round(values.max()),
+        median=_round(np.median(values)),
+        percentiles={str(p): _round(v) for p, v in zip(PERCENTILES, percentiles)},
+    )
+    return summary
+
+
+def histogram_edges(values: np.ndarray, bins: int = HISTOGRAM_BINS) -> np.ndarray:
+    if not values.size:
+        return np.linspace(0, 1, bins + 1)
+    low, high = float(values.min()), float(values.max())
+    if low == high:
+        high = low + 1
+    return np.linspace(low, high, bins + 1)
+
+
+def cohort_statistics(majors: Sequence[str], values: Sequence[float], bins: int = HISTOGRAM_BINS) -> Dict:
+    """全体及各专业的统计结果；majors 与 values 一一对应，调用方已把空值替换为 0 分和空字符串"""
+    scores = np.asarray(values, dtype=float)
+    major_names = np.asarray(majors, dtype=object)
+    edges = histogram_edges(scores, bins)
+
+    by_major = {}
+    if scores.size:
+        # 按专业排序后切片，每个专业只需一次连续切片
+        order = np.argsort(major_names, kind='stable')
+        sorted_majors = major_names[order]
+        sorted_scores = scores[order]
+        names, starts = np.unique(sorted_majors, return_index=True)
+        ends = list(starts[1:]) + [len(sorted_majors)]
+        for name, start, end in zip(names, starts, ends):
+            by_major[name] = summarize(sorted_scores[start:end], edges)
+
+    return {
+        'bin_edges': [_round(edge) for edge in edges],
+        'overall': summarize(scores, edges),
+        'majors': by_major,
+    }
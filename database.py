@@ -0,0 +1,88 @@
+"""数据库连接配置
+
+连接地址从环境变量 DATABASE_URL 读取，默认使用实例目录下的 SQLite 数据库 users.db。
+
+SQLite 每个连接建立时设置 WAL 日志模式等参数：读不阻塞写、写不阻塞读，
+多个进程同时提交成绩时由 busy_timeout 排队等待，而不是立即报 "database is locked"。
+PostgreSQL 等服务器数据库使用连接池，并在取出连接时检查连接是否仍然有效。
+"""
+import os
+from typing import Dict, Mapping, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+
+DEFAULT_DATABASE_URI = 'sqlite:///users.db'
+
+# SQLite 连接参数，可以用环境变量覆盖
+SQLITE_BUSY_TIMEOUT_MS = 5000
+SQLITE_MMAP_SIZE = 256 * 1024 * 1024
+
+# 连接池默认大小（SQLite 文件数据库与服务器数据库相同）
+DEFAULT_POOL_SIZE = 5
+DEFAULT_MAX_OVERFLOW = 10
+# 服务器数据库的连接回收时间（秒），避免使用被服务端关闭的空闲连接
+DEFAULT_POOL_RECYCLE = 1800
+
+
+def _int_env(environ: Mapping[str, str], name: str, default: int) -> int:
+    value = environ.get(name)
+    return int(value) if value else default
+
+
+def database_uri(environ: Optional[Mapping[str, str]] = None) -> str:
+    environ = os.environ if environ is None else environ
+    uri = environ.get('DATABASE_URL') or DEFAULT_DATABASE_URI
+    # 部分托管平台提供的是 SQLAlchemy 不再支持的 postgres:// 写法
+    if uri.startswith('postgres://'):
+        uri = 'postgresql://' + uri[len('postgres://'):]
+    return uri
+
+
+def is_sqlite_memory(uri: str) -> bool:
+    url = make_url(uri)
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+
+def engine_options(uri: str, environ: Optional[Mapping[str, str]] = None) -> Dict:
+    """SQLALCHEMY_ENGINE_OPTIONS：连接池大小等参数"""
+    environ = os.environ if environ is None else environ
+    if is_sqlite_memory(uri):
+        # 内存数据库由 Flask-SQLAlchemy 使用单连接池，不能设置连接池大小
+        return {}
+
+    options = {
+        'pool_size': _int_env(environ, 'DB_POOL_SIZE', DEFAULT_POOL_SIZE),
+        'max_overflow': _int_env(environ, 'DB_MAX_OVERFLOW', DEFAULT_MAX_OVERFLOW),
+    }
+    if make_url(uri).get_backend_name() != 'sqlite':
+        options['pool_pre_ping'] = True
+        options['pool_recycle'] = _int_env(environ, 'DB_POOL_RECYCLE', DEFAULT_POOL_RECYCLE)
+    return options
+
+
+def sqlite_pragmas(environ: Optional[Mapping[str, str]] = None) -> Dict[str, object]:
+    environ = os.environ if environ is None else environ
+    return {
+        'journal_mode': 'WAL',
+        # WAL 模式下 NORMAL 已能保证数据库不损坏，只在断电时可能丢失最后几次提交
+        'synchronous': 'NORMAL',
+        'busy_timeout': _int_env(environ, 'SQLITE_BUSY_TIMEOUT_MS', SQLITE_BUSY_TIMEOUT_MS),
+        'mmap_size': _int_env(environ, 'SQLITE_MMAP_SIZE', SQLITE_MMAP_SIZE),
+    }
+
+
+def configure_engine(engine: Engine, environ: Optional[Mapping[str, str]] = None):
+    """为 SQLite 引擎注册连接参数；其他数据库不需要额外设置"""
+    if engine.dialect.name != 'sqlite':
+        return
+    pragmas = sqlite_pragmas(environ)
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f'PRAGMA {name} = {value}')
+        finally:
+            cursor.close()
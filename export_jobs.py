@@ -0,0 +1,79 @@
+"""后台导出任务
+
+导出在后台线程池中进行，请求只负责创建任务并立即返回，页面轮询任务进度，
+完成后下载生成的文件。任务状态保存在数据库（ExportJob 表）中，多进程部署时
+任何一个进程都能查询进度；生成的文件按数据版本（排名修订号）命名保存在导出目录，
+数据没有变化时再次导出直接使用已有的文件。
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+# 后台导出的线程数；导出主要消耗 CPU，多开线程并不能更快
+EXPORT_WORKERS = 1
+
+# 任务状态
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+ACTIVE_STATUSES = (QUEUED, RUNNING)
+
+
+def artifact_path(root: str, kind: str, revision: int, extension: str = '.xlsx') -> str:
+    """某种导出在某个数据版本下的文件路径"""
+    return os.path.join(root, f'{kind}-{revision}{extension}')
+
+
+def artifact_revision(name: str, kind: str, extension: str = '.xlsx') -> Optional[int]:
+    """从 artifact_path() 生成的文件名中取出数据版本；不是该种导出的文件返回 None"""
+    prefix = f'{kind}-'
+    if not (name.startswith(prefix) and name.endswith(extension)):
+        return None
+    revision = name[len(prefix):len(name) - len(extension)]
+    return int(revision) if revision.isdigit() else None
+
+
+def remove_stale_artifacts(root: str, kind: str, revision: int, extension: str = '.xlsx'):
+    """删除同一种导出中数据版本低于 revision 的文件
+
+    多个进程可能同时在生成不同版本的文件，版本更高的文件（以及其他种类、临时文件）都保留。
+    """
+    for entry in os.scandir(root):
+        entry_revision = artifact_revision(entry.name, kind, extension)
+        if entry_revision is not None and entry_revision < revision:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+
+class JobRunner:
+    """后台任务线程池；线程池在第一次提交任务时才创建"""
+
+    def __init__(self, max_workers: int = EXPORT_WORKERS, logger=None):
+        self.max_workers = max_workers
+        self.logger = logger
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='export')
+            return self._executor.submit(self._run, fn, *args)
+
+    def _run(self, fn, *args):
+        try:
+            return fn(*args)
+        except Exception:
+            if self.logger is not None:
+                self.logger.exception('后台导出任务失败')
+            raise
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
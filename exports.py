@@ -0,0 +1,358 @@
+"""成绩导出
+
+Excel 使用 openpyxl 的只写（write_only）模式逐行写出，样式使用共享的命名样式，
+内存占用与学生人数无关；生成的临时文件以分块方式流式返回，发送完毕后删除。
+CSV / JSON Lines 直接由生成器逐批产出，Parquet 需要安装 pyarrow。
+"""
+import csv
+import io
+import json
+import os
+import re
+import tempfile
+from itertools import islice
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Font, NamedStyle, PatternFill
+from openpyxl.utils import get_column_letter
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet 导出为可选功能
+    pa = None
+    pq = None
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# 流式返回文件时每次读取的字节数
+CHUNK_SIZE = 64 * 1024
+
+# 面向程序读取的导出格式及其 MIME 类型
+DATA_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+# 流式导出时每批输出的行数
+ROW_BATCH_SIZE = 500
+
+# 生成工作簿时每写入多少行报告一次进度
+PROGRESS_INTERVAL = 1000
+
+# 导出列：(表头, User 字段名, 空值时的默认值)
+EXPORT_COLUMNS = (
+    ('姓名', 'full_name', '未填写'),
+    ('学号', 'student_id', '未填写'),
+    ('专业', 'major', '未填写'),
+    ('用户名', 'username', ''),
+    ('综合成绩', 'final_score', 0),
+    ('学业成绩', 'academic_score', 0),
+    ('学术专长成绩', 'academic_talent_score', 0),
+    ('综合表现成绩', 'comprehensive_score', 0),
+    ('学术论文', 'paper_score', 0),
+    ('发明专利', 'patent_score', 0),
+    ('国家级竞赛', 'competition_national_score', 0),
+    ('省级竞赛', 'competition_provincial_score', 0),
+    ('CCF CSP认证', 'csp_score', 0),
+    ('创新创业训练项目', 'innovation_project_score', 0),
+    ('荣誉称号', 'honor_score', 0),
+    ('社会工作', 'social_work_score', 0),
+    ('志愿服务', 'volunteer_score', 0),
+    ('志愿服务时长(小时)', 'volunteer_hours', 0),
+)
+
+EXPORT_FIELDS = tuple(field for _, field, _ in EXPORT_COLUMNS)
+
+# 数值列（在 EXPORT_COLUMNS 中的下标），分专业导出时计算合计和平均
+NUMERIC_COLUMNS = tuple(i for i, (_, _, default) in enumerate(EXPORT_COLUMNS) if default == 0)
+
+# 分专业工作簿的汇总表名；未填写专业的学生放在单独的工作表中
+SUMMARY_SHEET_TITLE = '汇总'
+EMPTY_MAJOR_TITLE = '未填写专业'
+
+# Excel 工作表名最长 31 个字符，不能包含以下字符
+SHEET_TITLE_MAX_LENGTH = 31
+INVALID_SHEET_TITLE_CHARS = re.compile(r'[\\/*?:\[\]]')
+
+
+def _named_styles():
+    header = NamedStyle(name='export_header')
+    header.font = Font(bold=True, size=10)
+    header.alignment = Alignment(horizontal='center', vertical='center')
+    header.fill = PatternFill(start_color='CCCCCC', end_color='CCCCCC', fill_type='solid')
+
+    body = NamedStyle(name='export_body')
+    body.alignment = Alignment(horizontal='center', vertical='center')
+    return header, body
+
+
+def _styled_row(ws, values, style):
+    row = []
+    for value in values:
+        cell = WriteOnlyCell(ws, value=value)
+        cell.style = style
+        row.append(cell)
+    return row
+
+
+def export_values(row):
+    """按 EXPORT_COLUMNS 把空值替换为默认值"""
+    return [default if value is None or value == '' else value for (_, _, default), value in zip(EXPORT_COLUMNS, row)]
+
+
+def ranked_rows(rows):
+    """为按综合成绩降序排列的学生行加上排名，并把空值替换为默认值"""
+    for rank, row in enumerate(rows, 1):
+        yield [rank] + export_values(row)
+
+
+def _styled_workbook():
+    wb = Workbook(write_only=True)
+    header_style, body_style = _named_styles()
+    wb.add_named_style(header_style)
+    wb.add_named_style(body_style)
+    return wb, header_style.name, body_style.name
+
+
+def _create_sheet(wb, title, headers, header_style):
+    ws = wb.create_sheet(title)
+    # 只写模式下列宽必须在写入数据前设置
+    for col in range(1, len(headers) + 1):
+        ws.column_dimensions[get_column_letter(col)].width = 12
+    ws.append(_styled_row(ws, headers, header_style))
+    return ws
+
+
+def write_ranking_workbook(rows, path, title='学生推免成绩排名'):
+    """把 ranked_rows() 产生的行写入只写工作簿并保存到 path"""
+    wb, header_style, body_style = _styled_workbook()
+    ws = _create_sheet(wb, title, ['排名'] + [header for header, _, _ in EXPORT_COLUMNS], header_style)
+    for values in rows:
+        ws.append(_styled_row(ws, values, body_style))
+    wb.save(path)
+
+
+def sheet_title(name, taken):
+    """合法且不重复的工作表名（Excel 比较工作表名时不区分大小写）"""
+    base = INVALID_SHEET_TITLE_CHARS.sub('_', name or EMPTY_MAJOR_TITLE)[:SHEET_TITLE_MAX_LENGTH]
+    title = base
+    i = 1
+    while title.lower() in taken:
+        suffix = f'({i})'
+        title = base[:SHEET_TITLE_MAX_LENGTH - len(suffix)] + suffix
+        i += 1
+    taken.add(title.lower())
+    return title
+
+
+class _MajorSheet:
+    """分专业工作簿中一个专业的工作表，以及写入过程中累计的排名和合计"""
+
+    def __init__(self, ws, major):
+        self.ws = ws
+        self.major = major
+        self.count = 0
+        self.rank = 0
+        self.previous_score = None
+        self.max_score = None
+        self.min_score = None
+        self.totals = [0] * len(NUMERIC_COLUMNS)
+
+    def add(self, score, values):
+        """加入下一名学生（成绩不高于之前的学生），返回专业内排名（1224 式）"""
+        self.count += 1
+        if score != self.previous_score:
+            self.rank = self.count
+            self.previous_score = score
+        if self.max_score is None:
+            self.max_score = score
+        self.min_score = score
+        for i, column in enumerate(NUMERIC_COLUMNS):
+            self.totals[i] += values[column]
+        return self.rank
+
+    def averages(self):
+        return [round(total / self.count, 3) if self.count else 0 for total in self.totals]
+
+
+def _subtotal_row(label, numbers):
+    """合计 / 平均行：数值列填入 numbers，其余列留空"""
+    values = [label] + [''] * len(EXPORT_COLUMNS)
+    for column, number in zip(NUMERIC_COLUMNS, numbers):
+        values[column + 1] = round(number, 3)
+    return values
+
+
+def write_major_workbook(rows, path):
+    """按专业分工作表写入只写工作簿并保存到 path，第一个工作表为各专业汇总
+
+    rows 为 (专业, 综合成绩, *EXPORT_FIELDS)，必须按专业升序、综合成绩降序排列：
+    只需顺序扫描一遍，每行直接写入当前专业的工作表，同时累计专业内排名和各项合计，
+    不需要按专业分别查询或在内存中重新排序。专业和综合成绩应已把空值规范化。
+    """
+    wb, header_style, body_style = _styled_workbook()
+    taken = set()
+    summary = _create_sheet(wb, sheet_title(SUMMARY_SHEET_TITLE, taken),
+                            ['专业', '人数', '最高综合成绩', '最低综合成绩']
+                            + [f'平均{EXPORT_COLUMNS[column][0]}' for column in NUMERIC_COLUMNS],
+                            header_style)
+    headers = ['专业排名'] + [header for header, _, _ in EXPORT_COLUMNS]
+
+    sheets = []
+    current = None
+    for major, score, *row in rows:
+        if current is None or major != current.major:
+            if current is not None:
+                _finish_major_sheet(current, body_style)
+            current = _MajorSheet(_create_sheet(wb, sheet_title(major, taken), headers, header_style), major)
+            sheets.append(current)
+        values = export_values(row)
+        rank = current.add(score, values)
+        current.ws.append(_styled_row(current.ws, [rank] + values, body_style))
+    if current is not None:
+        _finish_major_sheet(current, body_style)
+
+    count = 0
+    totals = [0] * len(NUMERIC_COLUMNS)
+    for sheet in sheets:
+        summary.append(_styled_row(summary, [sheet.major or EMPTY_MAJOR_TITLE, sheet.count,
+                                             sheet.max_score, sheet.min_score] + sheet.averages(), body_style))
+        count += sheet.count
+        totals = [total + subtotal for total, subtotal in zip(totals, sheet.totals)]
+    if sheets:
+        summary.append(_styled_row(summary, ['全体', count,
+                                             max(sheet.max_score for sheet in sheets),
+                                             min(sheet.min_score for sheet in sheets)]
+                                   + [round(total / count, 3) for total in totals], header_style))
+    wb.save(path)
+
+
+def _finish_major_sheet(sheet, style):
+    sheet.ws.append(_styled_row(sheet.ws, _subtotal_row('合计', sheet.totals), style))
+    sheet.ws.append(_styled_row(sheet.ws, _subtotal_row('平均', sheet.averages()), style))
+
+
+def with_progress(rows, progress, interval=PROGRESS_INTERVAL):
+    """原样产出各行，每 interval 行以及结束时调用 progress(已产出的行数)"""
+    count = 0
+    for row in rows:
+        yield row
+        count += 1
+        if count % interval == 0:
+            progress(count)
+    progress(count)
+
+
+def _build_workbook(write, rows, directory=None, progress=None):
+    """调用 write(rows, path) 生成工作簿临时文件，返回文件路径；出错时删除临时文件
+
+    directory 为临时文件所在目录（需要改名保存时应与目标在同一文件系统上），
+    progress 为进度回调，参数为已写入的学生数。
+    """
+    fd, path = tempfile.mkstemp(suffix='.xlsx', dir=directory)
+    os.close(fd)
+    if progress is not None:
+        rows = with_progress(rows, progress)
+    try:
+        write(rows, path)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
+
+
+def build_ranking_workbook(rows, title='学生推免成绩排名', directory=None, progress=None):
+    """生成排名工作簿临时文件，返回文件路径"""
+    return _build_workbook(lambda rows, path: write_ranking_workbook(ranked_rows(rows), path, title),
+                           rows, directory, progress)
+
+
+def build_major_workbook(rows, directory=None, progress=None):
+    """生成分专业工作簿临时文件，返回文件路径；rows 的要求见 write_major_workbook()"""
+    return _build_workbook(write_major_workbook, rows, directory, progress)
+
+
+class FileStream:
+    """分块读取文件的响应体，响应结束时删除文件
+
+    WSGI 服务器在响应结束后总会调用 close()，包括 HEAD 请求（不读取响应体）和客户端提前断开的
+    情况；生成器在开始迭代之前被关闭时不会执行 finally，所以这里不用生成器。
+    """
+
+    def __init__(self, path, chunk_size=CHUNK_SIZE, remove=True):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.remove = remove
+        self._file = None
+
+    def __iter__(self):
+        self._file = open(self.path, 'rb')
+        while True:
+            chunk = self._file.read(self.chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self.remove:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+
+def _batches(rows, size=ROW_BATCH_SIZE):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def csv_chunks(fields, rows):
+    """逐批产出 CSV 文本，第一行为字段名"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    yield buffer.getvalue()
+    for batch in _batches(rows):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(batch)
+        yield buffer.getvalue()
+
+
+def jsonl_chunks(fields, rows):
+    """逐批产出 JSON Lines，每行一个学生"""
+    for batch in _batches(rows):
+        yield ''.join(json.dumps(dict(zip(fields, row)), ensure_ascii=False) + '\n' for row in batch)
+
+
+def parquet_available():
+    return pa is not None
+
+
+def build_parquet(fields, python_types, rows):
+    """按批写入 Parquet 临时文件，返回文件路径；python_types 为各列的 Python 类型"""
+    arrow_types = {str: pa.string(), int: pa.int64(), float: pa.float64()}
+    schema = pa.schema([(field, arrow_types.get(python_types[field], pa.string())) for field in fields])
+
+    fd, path = tempfile.mkstemp(suffix='.parquet')
+    os.close(fd)
+    try:
+        with pq.ParquetWriter(path, schema) as writer:
+            for batch in _batches(rows):
+                columns = [[row[i] for row in batch] for i in range(len(fields))]
+                writer.write_table(pa.Table.from_arrays(
+                    [pa.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema))
+    except Exception:
+        os.remove(path)
+        raise
+    return path
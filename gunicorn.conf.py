@@ -0,0 +1,38 @@
+"""gunicorn 生产环境配置
+
+    APP_ENV=production SECRET_KEY=... DATABASE_URL=... gunicorn -c gunicorn.conf.py serve:app
+
+进程数、线程数可以用环境变量 WEB_CONCURRENCY、GUNICORN_THREADS 覆盖。
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get('BIND') or f'0.0.0.0:{os.environ.get("PORT", "5001")}'
+
+# 计分、生成工作簿等主要消耗 CPU，受 GIL 限制，每个 CPU 核一个工作进程；
+# 进程内再用少量线程处理等待数据库、文件读写和客户端上传的请求
+workers = int(os.environ.get('WEB_CONCURRENCY') or multiprocessing.cpu_count())
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS') or 4)
+
+# 在主进程中创建应用后再 fork：工作进程共享已加载的代码和计分规则，启动更快，
+# 配置有误（例如缺少 SECRET_KEY）时主进程直接启动失败
+preload_app = True
+
+# 同步导出大量学生时请求较慢，大量学生时应使用后台导出
+timeout = 120
+graceful_timeout = 30
+keepalive = 5
+
+# 定期重启工作进程，避免进程内缓存和内存碎片无限增长
+max_requests = 2000
+max_requests_jitter = 200
+
+accesslog = '-'
+errorlog = '-'
+
+
+def post_fork(server, worker):
+    # 主进程创建应用时可能已经建立了数据库连接，工作进程不能沿用
+    from app import dispose_engine_after_fork
+    dispose_engine_after_fork(server.app.wsgi())
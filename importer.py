@@ -0,0 +1,106 @@
+"""学生名单批量导入
+
+从 Excel（openpyxl 只读模式）或 CSV 中逐行流式读取学生名单，
+密码哈希在进程池中并行计算。写入数据库由调用方（app.py）完成。
+"""
+import csv
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from openpyxl import load_workbook
+from werkzeug.security import generate_password_hash
+
+# 表头别名 -> 字段名，中英文表头都可以识别
+HEADER_ALIASES = {
+    'username': 'username', '用户名': 'username',
+    'password': 'password', '密码': 'password',
+    'full_name': 'full_name', '姓名': 'full_name',
+    'student_id': 'student_id', '学号': 'student_id',
+    'major': 'major', '专业': 'major',
+    'academic_score': 'academic_score', '学业成绩': 'academic_score',
+}
+
+# 少于这个数量的密码直接在当前进程中计算哈希，不值得启动进程池
+PROCESS_POOL_THRESHOLD = 32
+
+
+class RosterError(ValueError):
+    """名单文件格式错误"""
+
+
+def _text(value) -> Optional[str]:
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        # Excel 中的学号等数字列会被读成浮点数
+        value = int(value)
+    value = str(value).strip()
+    return value or None
+
+
+def _iter_xlsx(stream) -> Iterator[tuple]:
+    wb = load_workbook(stream, read_only=True, data_only=True)
+    try:
+        yield from wb.active.iter_rows(values_only=True)
+    finally:
+        wb.close()
+
+
+def _iter_csv(stream) -> Iterator[tuple]:
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    try:
+        yield from csv.reader(text)
+    finally:
+        text.detach()
+
+
+def read_roster(stream, filename: str) -> Iterator[Tuple[int, Dict[str, Optional[str]]]]:
+    """逐行读取名单，产出 (行号, 字段字典)；第一行为表头"""
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == '.xlsx':
+        rows = _iter_xlsx(stream)
+    elif extension == '.csv':
+        rows = _iter_csv(stream)
+    else:
+        raise RosterError('只支持 .xlsx 和 .csv 格式的名单文件')
+
+    header = next(rows, None)
+    if header is None:
+        raise RosterError('名单文件为空')
+    fields = [HEADER_ALIASES.get(_text(name) or '') for name in header]
+    if 'username' not in fields:
+        raise RosterError('名单缺少用户名（username）列')
+
+    for line, values in enumerate(rows, 2):
+        record = {field: _text(value) for field, value in zip(fields, values) if field}
+        if any(record.values()):
+            yield line, record
+
+
+def batched(records: Iterable, size: int) -> Iterator[list]:
+    records = iter(records)
+    while True:
+        batch = list(islice(records, size))
+        if not batch:
+            return
+        yield batch
+
+
+def parse_academic_score(value: Optional[str]) -> Optional[float]:
+    if value is None:
+        return None
+    score = float(value)
+    if not 0 <= score <= 100:
+        raise ValueError(value)
+    return score
+
+
+def hash_passwords(passwords: List[str], pool: Optional[ProcessPoolExecutor] = None) -> List[str]:
+    """计算密码哈希；数量较多且提供了进程池时并行计算"""
+    if pool is None or len(passwords) < PROCESS_POOL_THRESHOLD:
+        return [generate_password_hash(password) for password in passwords]
+    chunksize = max(1, len(passwords) // (4 * (os.cpu_count() or 1)))
+    return list(pool.map(generate_password_hash, passwords, chunksize=chunksize))
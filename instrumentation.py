@@ -0,0 +1,261 @@
+"""请求耗时统计与性能剖析（可选）
+
+开启后（INSTRUMENTATION=1）记录每个请求的总耗时、SQL 查询次数与耗时、模板渲染耗时，
+以及代码中用 span() 标出的热点（计分、保存上传文件、读取文件清单、生成工作簿等）：
+
+- 响应头 Server-Timing：浏览器开发者工具的“计时”面板中可以直接看到各部分耗时
+- /metrics：Prometheus 文本格式的累计指标（每个进程、每个应用各自统计）
+- 设置 PROFILE_THRESHOLD_MS 后，每个请求都在 cProfile 下运行，耗时超过阈值的请求
+  把剖析结果保存到 PROFILE_DIR，可以用 python -m pstats 或 snakeviz 查看
+
+未开启时 span() 只是一个空的上下文管理器，不注册任何钩子。
+"""
+import cProfile
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, Optional
+
+from flask import Response, before_render_template, current_app, g, request, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from werkzeug.local import LocalProxy
+
+# 请求耗时直方图的分桶上限（秒）
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class RequestTimings:
+    """一个请求内累计的耗时"""
+
+    __slots__ = ('start', 'sql_count', 'sql_seconds', 'spans', 'profile')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        # 名称 -> [次数, 秒数]，按第一次出现的顺序排列
+        self.spans: Dict[str, list] = {}
+        self.profile: Optional[cProfile.Profile] = None
+
+    def add_span(self, name: str, seconds: float):
+        entry = self.spans.setdefault(name, [0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+
+
+# 当前请求的耗时统计；不在请求中或未开启统计时为 None
+_current = ContextVar('request_timings', default=None)
+
+
+@contextmanager
+def span(name: str):
+    """标出一段需要单独统计耗时的代码；不在请求中或未开启统计时不做任何事"""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add_span(name, time.perf_counter() - start)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels) -> str:
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}'
+
+
+class Metrics:
+    """进程内的累计指标，以 Prometheus 文本格式输出"""
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self.requests: Dict[tuple, int] = {}  # (endpoint, method, status) -> 次数
+        self.durations: Dict[str, list] = {}  # endpoint -> [各分桶计数..., 总秒数, 次数]
+        self.sql: Dict[str, list] = {}  # endpoint -> [查询次数, 秒数]
+        self.spans: Dict[str, list] = {}  # span 名称 -> [次数, 秒数]
+
+    def observe(self, endpoint: str, method: str, status: int, seconds: float, timings: RequestTimings):
+        with self._lock:
+            key = (endpoint, method, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+
+            histogram = self.durations.setdefault(endpoint, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram[i] += 1
+            histogram[-2] += seconds
+            histogram[-1] += 1
+
+            sql = self.sql.setdefault(endpoint, [0, 0.0])
+            sql[0] += timings.sql_count
+            sql[1] += timings.sql_seconds
+
+            for name, (count, span_seconds) in timings.spans.items():
+                entry = self.spans.setdefault(name, [0, 0.0])
+                entry[0] += count
+                entry[1] += span_seconds
+
+    def render(self) -> str:
+        with self._lock:
+            lines = [
+                '# HELP app_requests_total 处理的请求数',
+                '# TYPE app_requests_total counter',
+            ]
+            for (endpoint, method, status), count in sorted(self.requests.items()):
+                lines.append(f'app_requests_total{_labels(endpoint=endpoint, method=method, status=status)} {count}')
+
+            lines += [
+                '# HELP app_request_duration_seconds 请求处理耗时（不含流式响应的发送时间）',
+                '# TYPE app_request_duration_seconds histogram',
+            ]
+            for endpoint, histogram in sorted(self.durations.items()):
+                for bound, count in zip(self.buckets, histogram):
+                    lines.append(f'app_request_duration_seconds_bucket{_labels(endpoint=endpoint, le=bound)} {count}')
+                lines.append(f'app_request_duration_seconds_bucket{_labels(endpoint=endpoint, le="+Inf")} '
+                             f'{histogram[-1]}')
+                lines.append(f'app_request_duration_seconds_sum{_labels(endpoint=endpoint)} {histogram[-2]:.6f}')
+                lines.append(f'app_request_duration_seconds_count{_labels(endpoint=endpoint)} {histogram[-1]}')
+
+            lines += [
+                '# HELP app_sql_queries_total 执行的 SQL 语句数',
+                '# TYPE app_sql_queries_total counter',
+            ]
+            for endpoint, (count, _) in sorted(self.sql.items()):
+                lines.append(f'app_sql_queries_total{_labels(endpoint=endpoint)} {count}')
+            lines += [
+                '# HELP app_sql_duration_seconds_total SQL 语句执行耗时',
+                '# TYPE app_sql_duration_seconds_total counter',
+            ]
+            for endpoint, (_, seconds) in sorted(self.sql.items()):
+                lines.append(f'app_sql_duration_seconds_total{_labels(endpoint=endpoint)} {seconds:.6f}')
+
+            lines += [
+                '# HELP app_span_duration_seconds 代码热点（计分、上传、文件清单、工作簿、模板渲染等）耗时',
+                '# TYPE app_span_duration_seconds summary',
+            ]
+            for name, (count, seconds) in sorted(self.spans.items()):
+                lines.append(f'app_span_duration_seconds_sum{_labels(span=name)} {seconds:.6f}')
+                lines.append(f'app_span_duration_seconds_count{_labels(span=name)} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+# 当前应用的累计指标，由 init_app() 创建
+metrics = LocalProxy(lambda: current_app.extensions['metrics'])
+
+
+def server_timing(timings: RequestTimings, total: float) -> str:
+    """Server-Timing 响应头，耗时单位为毫秒"""
+    entries = [f'total;dur={total * 1000:.1f}',
+               f'sql;dur={timings.sql_seconds * 1000:.1f};desc="{timings.sql_count} queries"']
+    for name, (count, seconds) in timings.spans.items():
+        entries.append(f'{name};dur={seconds * 1000:.1f}' + (f';desc="{count}x"' if count > 1 else ''))
+    return ', '.join(entries)
+
+
+def _profile_filename(endpoint: str, milliseconds: float) -> str:
+    endpoint = re.sub(r'[^A-Za-z0-9_.-]', '_', endpoint)
+    return f'{datetime.now():%Y%m%d-%H%M%S-%f}-{endpoint}-{milliseconds:.0f}ms.prof'
+
+
+def register_engine(engine: Engine):
+    """统计每个请求中 SQL 语句的次数和耗时"""
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if _current.get() is not None:
+            conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        timings = _current.get()
+        starts = conn.info.get('query_start')
+        if timings is None or not starts:
+            return
+        timings.sql_count += 1
+        timings.sql_seconds += time.perf_counter() - starts.pop()
+
+
+def init_app(app, engine: Engine):
+    """按配置注册请求钩子、SQL 事件和 /metrics；INSTRUMENTATION 未开启时什么也不做"""
+    if not app.config.get('INSTRUMENTATION'):
+        return
+
+    threshold = app.config.get('PROFILE_THRESHOLD_MS')
+    profile_dir = app.config.get('PROFILE_DIR')
+    app.extensions['metrics'] = Metrics()
+    register_engine(engine)
+
+    @app.before_request
+    def start_timing():
+        timings = RequestTimings()
+        g.request_timings_token = _current.set(timings)
+        if threshold:
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # Python 3.12 起同一时刻只能有一个剖析器，并发请求时跳过
+                return
+            timings.profile = profile
+
+    @app.after_request
+    def finish_timing(response):
+        timings = _current.get()
+        if timings is None:
+            return response
+        total = time.perf_counter() - timings.start
+        endpoint = request.endpoint or 'unknown'
+        metrics.observe(endpoint, request.method, response.status_code, total, timings)
+        response.headers['Server-Timing'] = server_timing(timings, total)
+
+        if timings.profile is not None:
+            timings.profile.disable()
+            if total * 1000 >= threshold:
+                os.makedirs(profile_dir, exist_ok=True)
+                path = os.path.join(profile_dir, _profile_filename(endpoint, total * 1000))
+                timings.profile.dump_stats(path)
+                app.logger.warning('慢请求 %s %s 耗时 %.0f ms，剖析结果：%s',
+                                   request.method, request.path, total * 1000, path)
+            timings.profile = None
+        return response
+
+    @app.teardown_request
+    def reset_timing(exc):
+        timings = _current.get()
+        if timings is not None and timings.profile is not None:
+            timings.profile.disable()
+        token = g.pop('request_timings_token', None)
+        if token is not None:
+            _current.reset(token)
+
+    def template_started(sender, template, context, **extra):
+        timings = _current.get()
+        if timings is not None:
+            g.render_start = time.perf_counter()
+
+    def template_finished(sender, template, context, **extra):
+        timings = _current.get()
+        start = g.pop('render_start', None)
+        if timings is not None and start is not None:
+            timings.add_span('render', time.perf_counter() - start)
+
+    # 接收函数是局部函数，必须保持强引用，否则会被垃圾回收而收不到信号
+    before_render_template.connect(template_started, app, weak=False)
+    template_rendered.connect(template_finished, app, weak=False)
+
+    @app.route('/metrics')
+    def prometheus_metrics():
+        return Response(metrics.render(), content_type=PROMETHEUS_CONTENT_TYPE)
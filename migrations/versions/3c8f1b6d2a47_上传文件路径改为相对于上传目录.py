@@ -0,0 +1,33 @@
+"""上传文件路径改为相对于上传目录
+
+Revision ID: 3c8f1b6d2a47
+Revises: 0b7e4c2d9f15
+Create Date: 2025-11-14 16:05:37.412806
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c8f1b6d2a47'
+down_revision = '0b7e4c2d9f15'
+branch_labels = None
+depends_on = None
+
+# 原来的路径相对于 static 目录，以默认上传目录 static/uploads 的 uploads/ 开头
+STATIC_PREFIX = 'uploads/'
+
+
+def upgrade():
+    upload = sa.table('upload', sa.column('path', sa.String))
+    op.execute(
+        upload.update()
+        .where(upload.c.path.startswith(STATIC_PREFIX, autoescape=True))
+        .values(path=sa.func.substr(upload.c.path, len(STATIC_PREFIX) + 1))
+    )
+
+
+def downgrade():
+    upload = sa.table('upload', sa.column('path', sa.String))
+    op.execute(upload.update().values(path=STATIC_PREFIX + upload.c.path))
@@ -0,0 +1,28 @@
+"""添加分专业导出索引
+
+Revision ID: 6a1d9e3b7c52
+Revises: f2a6c8d0b4e9
+Create Date: 2025-11-06 15:28:41.207356
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6a1d9e3b7c52'
+down_revision = 'f2a6c8d0b4e9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 分专业导出按 (专业升序, 综合成绩降序) 顺序扫描排名表，
+    # 已有的 (major, final_score) 索引方向不一致，仍需要对每个专业排序
+    with op.batch_alter_table('ranking', schema=None) as batch_op:
+        batch_op.create_index('ix_ranking_major_score_desc', ['major', sa.text('final_score DESC'), 'user_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('ranking', schema=None) as batch_op:
+        batch_op.drop_index('ix_ranking_major_score_desc')
@@ -0,0 +1,36 @@
+"""添加成绩排名复合索引
+
+Revision ID: c3f9a1e07b54
+Revises: 8e4b27c61d09
+Create Date: 2025-10-23 09:47:05.116732
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3f9a1e07b54'
+down_revision = '8e4b27c61d09'
+branch_labels = None
+depends_on = None
+
+SCORE_FIELDS = ('final_score', 'academic_score', 'academic_talent_score', 'comprehensive_score')
+
+
+def upgrade():
+    # 早期注册的用户成绩可能为空，统一按 0 分处理，排名查询才能使用索引范围扫描
+    for field in SCORE_FIELDS:
+        op.execute(f'UPDATE "user" SET {field} = 0 WHERE {field} IS NULL')
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        for field in SCORE_FIELDS:
+            batch_op.create_index(f'ix_user_role_{field}', ['role', sa.text(f'{field} DESC'), 'id'], unique=False)
+        batch_op.create_index('ix_user_role_major', ['role', 'major'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_index('ix_user_role_major')
+        for field in reversed(SCORE_FIELDS):
+            batch_op.drop_index(f'ix_user_role_{field}')
@@ -0,0 +1,110 @@
+"""渲染结果缓存
+
+学生信息页和教师查看的学生详情页只在成绩、个人信息或上传文件变化时才会变，
+评审期间教师反复打开同一批详情页，每次都重新查询、整理加分明细并渲染模板没有必要。
+
+缓存键包含页面名、学生 id、该学生的版本号以及调用方提供的其他部分（查看者、
+排名修订号、上传目录修改时间等）。学生记录更新并提交后版本号加一，旧的缓存键
+不再被使用，随 LRU 淘汰或过期。缓存键同时用来生成 ETag，浏览器带着
+If-None-Match 再次请求时可以直接返回 304。
+
+默认使用进程内的有界 LRU；设置 PAGE_CACHE_URL=redis://... 时改用 Redis，
+多个进程共用缓存和版本号（需要安装 redis）。
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+try:
+    import redis
+except ImportError:  # Redis 共享缓存为可选功能
+    redis = None
+
+# 进程内缓存最多保存的页面数
+DEFAULT_MAX_ENTRIES = 256
+# 共享缓存中页面的过期时间（秒）；版本号不过期
+DEFAULT_TTL = 24 * 3600
+
+
+class LRUBackend:
+    """进程内的有界 LRU 缓存"""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def version(self, name: str) -> int:
+        return self._versions.get(name, 0)
+
+    def bump(self, name: str):
+        with self._lock:
+            self._versions[name] = self._versions.get(name, 0) + 1
+
+
+class RedisBackend:
+    """多个进程共用的 Redis 缓存"""
+
+    def __init__(self, url: str, ttl: int = DEFAULT_TTL, prefix: str = 'page_cache:'):
+        if redis is None:
+            raise RuntimeError('使用 Redis 页面缓存需要安装 redis')
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(self.prefix + key)
+
+    def set(self, key: str, value: bytes):
+        self.client.set(self.prefix + key, value, ex=self.ttl)
+
+    def version(self, name: str) -> int:
+        return int(self.client.get(f'{self.prefix}version:{name}') or 0)
+
+    def bump(self, name: str):
+        self.client.incr(f'{self.prefix}version:{name}')
+
+
+def create_backend(url: Optional[str] = None, max_entries: int = DEFAULT_MAX_ENTRIES):
+    if url:
+        return RedisBackend(url)
+    return LRUBackend(max_entries)
+
+
+class PageCache:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def key(self, page: str, user_id: int, *parts) -> str:
+        version = self.backend.version(f'user:{user_id}')
+        return ':'.join(str(part) for part in (page, user_id, version) + parts)
+
+    @staticmethod
+    def etag(key: str) -> str:
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.backend.get(key)
+
+    def set(self, key: str, body: bytes):
+        self.backend.set(key, body)
+
+    def invalidate(self, user_id: int):
+        """学生记录变化后调用：该学生所有页面的缓存键随版本号一起变化"""
+        self.backend.bump(f'user:{user_id}')
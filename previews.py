@@ -0,0 +1,132 @@
+"""证明材料预览图
+
+上传的图片生成缩小的缩略图，PDF 渲染第一页为 PNG 预览图。生成工作在后台线程池中进行，
+不阻塞成绩提交请求；预览图按原文件的 SHA-256 命名，内容相同的文件共用一张预览图，
+因此可以长期缓存。
+
+需要安装 Pillow（图片）和 PyMuPDF（PDF），未安装时对应类型的文件不生成预览图。
+"""
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # 图片缩略图为可选功能
+    Image = None
+    ImageOps = None
+
+try:
+    import pymupdf as fitz
+except ImportError:
+    try:
+        import fitz  # 旧版 PyMuPDF 只提供 fitz 模块名
+    except ImportError:  # PDF 预览为可选功能
+        fitz = None
+
+# 预览图的最大宽高（像素）
+PREVIEW_SIZE = (320, 320)
+
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif'}
+PDF_EXTENSIONS = {'.pdf'}
+
+# 后台生成预览图的线程数
+PREVIEW_WORKERS = 2
+
+
+def preview_name(sha256: str, extension: str) -> Optional[str]:
+    """预览图文件名（相对于预览目录）；该类型不支持预览或缺少依赖时返回 None"""
+    extension = extension.lower()
+    if extension in IMAGE_EXTENSIONS and Image is not None:
+        return f'{sha256[:2]}/{sha256}.jpg'
+    if extension in PDF_EXTENSIONS and fitz is not None:
+        return f'{sha256[:2]}/{sha256}.png'
+    return None
+
+
+def _image_thumbnail(source: str, target: str):
+    with Image.open(source) as image:
+        # JPEG 在解码时直接按比例缩小，大尺寸扫描件不必完整解码
+        image.draft('RGB', PREVIEW_SIZE)
+        # 手机拍摄的照片按 EXIF 方向信息摆正
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail(PREVIEW_SIZE)
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        image.save(target, 'JPEG', quality=80, optimize=True)
+
+
+def _pdf_first_page(source: str, target: str):
+    with fitz.open(source) as document:
+        page = document[0]
+        zoom = min(PREVIEW_SIZE[0] / page.rect.width, PREVIEW_SIZE[1] / page.rect.height)
+        page.get_pixmap(matrix=fitz.Matrix(zoom, zoom)).save(target)
+
+
+def generate_preview(source: str, target: str):
+    """生成预览图；先写入临时文件再改名，读取方不会看到写了一半的文件"""
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    extension = os.path.splitext(target)[1]
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(target), suffix=extension)
+    os.close(fd)
+    try:
+        if extension == '.png':
+            _pdf_first_page(source, tmp_path)
+        else:
+            _image_thumbnail(source, tmp_path)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, target)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class PreviewWorker:
+    """后台预览图生成队列
+
+    线程池在第一次提交任务时才创建（多进程服务器 fork 之后各进程各自创建）；
+    同一张预览图同时只会有一个任务，已经存在的预览图不再重复生成。
+    """
+
+    def __init__(self, preview_root: str, max_workers: int = PREVIEW_WORKERS, logger=None):
+        self.preview_root = preview_root
+        self.max_workers = max_workers
+        self.logger = logger
+        self._executor = None
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.preview_root, *name.split('/'))
+
+    def submit(self, source: str, sha256: str, extension: str):
+        name = preview_name(sha256, extension)
+        if name is None or os.path.exists(self.path(name)):
+            return None
+        with self._lock:
+            if name in self._pending:
+                return None
+            self._pending.add(name)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix='preview')
+            return self._executor.submit(self._run, source, name)
+
+    def _run(self, source: str, name: str):
+        try:
+            generate_preview(source, self.path(name))
+        except Exception:
+            # 文件损坏或格式无法识别时只记录日志，页面显示为普通文件图标
+            if self.logger is not None:
+                self.logger.exception('生成预览图失败: %s', source)
+        finally:
+            with self._lock:
+                self._pending.discard(name)
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
@@ -0,0 +1,105 @@
+"""学生排名索引
+
+在进程内按综合成绩有序保存全体学生和各专业学生的成绩（顺序统计索引），
+任意成绩的竞争排名（1224 式）和密集排名（1223 式）都可以用二分查找在 O(log n) 内得到。
+"""
+import bisect
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+
+def normalize(score: Optional[float], major: Optional[str]) -> Tuple[float, str]:
+    """排名使用的成绩和专业：空成绩按 0 分，未填写专业为空字符串"""
+    return float(score or 0), major or ''
+
+
+class RankIndex:
+    """一组成绩的顺序统计索引"""
+
+    def __init__(self, scores: Iterable[float] = ()):
+        self._scores = sorted(scores)
+        self._counts = Counter(self._scores)
+        self._distinct = sorted(self._counts)
+
+    def __len__(self):
+        return len(self._scores)
+
+    def count(self, score: float) -> int:
+        return self._counts.get(score, 0)
+
+    def add(self, score: float):
+        bisect.insort(self._scores, score)
+        if not self._counts[score]:
+            bisect.insort(self._distinct, score)
+        self._counts[score] += 1
+
+    def remove(self, score: float):
+        del self._scores[bisect.bisect_left(self._scores, score)]
+        self._counts[score] -= 1
+        if not self._counts[score]:
+            del self._counts[score]
+            del self._distinct[bisect.bisect_left(self._distinct, score)]
+
+    def rank(self, score: float) -> int:
+        """竞争排名：成绩严格高于 score 的人数加一"""
+        return len(self._scores) - bisect.bisect_right(self._scores, score) + 1
+
+    def dense_rank(self, score: float) -> int:
+        """密集排名：严格高于 score 的不同成绩个数加一"""
+        return len(self._distinct) - bisect.bisect_right(self._distinct, score) + 1
+
+
+class CohortRanking:
+    """全体学生与各专业的排名索引
+
+    revision 记录索引对应的数据库排名修订号，用于判断索引是否已经过期。
+    """
+
+    def __init__(self, entries: Iterable[Tuple[int, float, str]] = (), revision: int = 0):
+        self.revision = revision
+        self.members: Dict[int, Tuple[float, str]] = {}
+        by_major = defaultdict(list)
+        for user_id, score, major in entries:
+            score, major = normalize(score, major)
+            self.members[user_id] = (score, major)
+            by_major[major].append(score)
+        self.overall = RankIndex(score for score, _ in self.members.values())
+        self.majors = defaultdict(RankIndex, {major: RankIndex(scores) for major, scores in by_major.items()})
+
+    def get(self, user_id: int) -> Optional[Tuple[float, str]]:
+        return self.members.get(user_id)
+
+    def add(self, user_id: int, score: float, major: str):
+        self.members[user_id] = (score, major)
+        self.overall.add(score)
+        self.majors[major].add(score)
+
+    def remove(self, user_id: int):
+        score, major = self.members.pop(user_id)
+        self.overall.remove(score)
+        self.majors[major].remove(score)
+        if not self.majors[major]:
+            del self.majors[major]
+
+    def total(self, major: Optional[str] = None) -> int:
+        if major is None:
+            return len(self.overall)
+        return len(self.majors.get(major, ()))
+
+    def ranks(self, score: float, major: str) -> Dict[str, int]:
+        major_index = self.majors.get(major, RankIndex())
+        return {
+            'overall_rank': self.overall.rank(score),
+            'overall_dense_rank': self.overall.dense_rank(score),
+            'major_rank': major_index.rank(score),
+            'major_dense_rank': major_index.dense_rank(score),
+        }
+
+
+class IndexCache:
+    """进程内的排名索引及其加载时间；修订号与数据库不一致时由调用方决定是否重新加载"""
+
+    def __init__(self):
+        self.index: Optional[CohortRanking] = None
+        self.loaded_at: Optional[datetime] = None
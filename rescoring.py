@@ -0,0 +1,102 @@
+"""全体学生批量重算
+
+计分规则变更后，把所有学生的原始选项组织成 (学生数 × 可选项数) 的计数矩阵，
+与权重向量相乘后再按细分项、类别上限截断，一次批量算出整个年级的成绩，
+结果与 scoring.score() 逐个计算完全一致。
+"""
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+import scoring
+
+
+def build_inputs(submissions: Sequence[dict], rules: scoring.RuleSet):
+    """把提交列表转换为选项计数矩阵、学业成绩向量和志愿时长向量"""
+    academic = np.zeros(len(submissions))
+    hours = np.zeros(len(submissions), dtype=np.int64)
+    rows = []
+    columns = []
+    item_index = rules.item_index
+
+    for row, submission in enumerate(submissions):
+        academic[row] = float(submission.get('academic_score') or 0)
+        hours[row] = int(submission.get('volunteer_hours') or 0)
+        for field in rules.fields:
+            for option in submission.get(field) or ():
+                i = item_index.get((field, option))
+                if i is not None:
+                    rows.append(row)
+                    columns.append(i)
+
+    counts = np.zeros((len(submissions), len(rules.items)))
+    np.add.at(counts, (np.array(rows, dtype=np.int64), np.array(columns, dtype=np.int64)), 1)
+    return counts, academic, hours
+
+
+def score_cohort(submissions: Sequence[dict], rules: Optional[scoring.RuleSet] = None) -> Dict[str, np.ndarray]:
+    """批量计算成绩，返回 字段名 -> 每个学生该字段成绩（未取整）的向量"""
+    rules = rules or scoring.DEFAULT_RULES
+    counts, academic, hours = build_inputs(submissions, rules)
+
+    weights = np.array(rules.weights)
+    exclusive = np.array(rules.item_exclusive, dtype=bool)
+    item_categories = np.array(rules.item_categories, dtype=np.int64)
+
+    # 可选项 -> 细分项 的权重矩阵，不累计的选项单独处理
+    category_weights = np.zeros((len(rules.items), len(rules.category_names)))
+    category_weights[np.arange(len(rules.items)), item_categories] = np.where(exclusive, 0, weights)
+    totals = counts @ category_weights
+
+    # 同类不累计的选项：每个细分项只取已选中选项的最高分
+    if exclusive.any():
+        selected_best = np.where((counts > 0) & exclusive, weights, 0)
+        for category_id in np.unique(item_categories[exclusive]):
+            columns = exclusive & (item_categories == category_id)
+            totals[:, category_id] += selected_best[:, columns].max(axis=1)
+
+    category_scores = np.minimum(totals, np.array(rules.category_caps))
+
+    group_membership = np.zeros((len(rules.category_names), len(rules.group_names)))
+    group_membership[np.arange(len(rules.category_names)), rules.category_groups] = 1
+    group_totals = category_scores @ group_membership
+
+    extra_steps = np.maximum(hours - rules.volunteer_min_hours, 0) // rules.volunteer_step_hours
+    volunteer = np.where(
+        hours >= rules.volunteer_min_hours,
+        rules.volunteer_base + np.minimum(extra_steps * rules.volunteer_step_score, rules.volunteer_max_extra),
+        0,
+    )
+    group_totals[:, rules.volunteer_group] += volunteer
+    group_scores = np.minimum(group_totals, np.array(rules.group_caps))
+
+    columns = {}
+    academic_weighted = academic * rules.academic_weight
+    final_score = academic_weighted.copy()
+    for group_id, name in enumerate(rules.group_names):
+        columns[f'{name}_score'] = group_scores[:, group_id]
+        final_score += group_scores[:, group_id]
+    for category_id, name in enumerate(rules.category_names):
+        columns[f'{name}_score'] = category_scores[:, category_id]
+
+    columns['academic_score'] = academic_weighted
+    columns['final_score'] = final_score
+    columns['volunteer_score'] = volunteer
+    columns['volunteer_hours'] = hours
+    return columns
+
+
+def to_breakdowns(columns: Dict[str, np.ndarray]) -> List[dict]:
+    """转换为逐个学生的成绩明细，格式和取整方式与 scoring.score() 相同"""
+    values = {field: columns[field].tolist() for field in scoring.SCORE_FIELDS}
+    breakdowns = []
+    for row in range(len(values['final_score'])):
+        breakdown = {field: round(values[field][row], scoring.ROUND_DIGITS) for field in scoring.SCORE_FIELDS}
+        breakdown['volunteer_hours'] = values['volunteer_hours'][row]
+        breakdowns.append(breakdown)
+    return breakdowns
+
+
+def to_mappings(ids: Sequence[int], columns: Dict[str, np.ndarray]) -> List[dict]:
+    """转换为按主键批量 UPDATE 所需的字典列表"""
+    return [dict(breakdown, id=user_id) for user_id, breakdown in zip(ids, to_breakdowns(columns))]
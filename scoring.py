@@ -0,0 +1,371 @@
+"""推免成绩计分引擎
+
+计分规则定义在 scoring_rules.json 中（与 baoyan_rules.md 一一对应，带版本号），
+启动时编译为字典/数组查找表。score() 是纯函数，不依赖 Flask 请求上下文，
+可以直接在脚本、命令行和基准测试中调用。
+"""
+import hashlib
+import json
+import math
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Mapping, Optional, Sequence, Tuple
+
+RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scoring_rules.json')
+
+# 成绩统一保留三位小数
+ROUND_DIGITS = 3
+
+# 成绩明细的字段顺序，与 User 模型上的成绩字段同名
+SCORE_FIELDS = (
+    'academic_score', 'academic_talent_score', 'comprehensive_score', 'final_score',
+    'paper_score', 'patent_score', 'competition_national_score', 'competition_provincial_score',
+    'csp_score', 'innovation_project_score',
+    'honor_score', 'social_work_score', 'volunteer_score', 'volunteer_hours',
+)
+
+# 每套规则缓存的中间结果个数（what-if 计算使用）
+PARTIAL_CACHE_SIZE = 4096
+
+
+class PartialScore:
+    """一次提交按细分项分解的中间结果
+
+    category_items[c] 是细分项 c 中选中的 {列号: 次数}，category_scores[c] 是该细分项
+    截断后的成绩。增删选项时只需重算受影响的细分项，再重新汇总类别上限。
+    实例创建后不再修改，可以在线程之间共享。
+    """
+    __slots__ = ('category_items', 'category_scores', 'academic_score', 'volunteer_hours')
+
+    def __init__(self, category_items: Sequence[Dict[int, int]], category_scores: Sequence[float],
+                 academic_score: float, volunteer_hours: int):
+        self.category_items = tuple(category_items)
+        self.category_scores = tuple(category_scores)
+        self.academic_score = academic_score
+        self.volunteer_hours = volunteer_hours
+
+
+class RuleSet:
+    """编译后的计分规则
+
+    每个可选项 (表单字段, 选项值) 被分配一个列号，权重、所属细分项以及是否
+    “同类不累计”都按列号存放在元组里，计分时只需一次字典查找。
+    """
+
+    def __init__(self, definition: Mapping):
+        self.version = definition['version']
+        # 规则版本号加规则内容摘要：即使修改权重时忘了改版本号也能识别出规则变化
+        digest = hashlib.sha256(json.dumps(definition, sort_keys=True).encode('utf-8')).hexdigest()
+        self.revision = f'{self.version}@{digest[:12]}'
+        self.academic_weight = float(definition['academic']['weight'])
+
+        groups = definition['groups']
+        self.group_names = tuple(groups)
+        self.group_caps = tuple(float(groups[name].get('cap', math.inf)) for name in self.group_names)
+        group_index = {name: i for i, name in enumerate(self.group_names)}
+
+        categories = definition['categories']
+        self.category_names = tuple(category['name'] for category in categories)
+        self.category_groups = tuple(group_index[category['group']] for category in categories)
+        self.category_caps = tuple(float(category.get('cap', math.inf)) for category in categories)
+
+        fields = []
+        items = []
+        weights = []
+        item_categories = []
+        item_exclusive = []
+        for category_id, category in enumerate(categories):
+            field = category['field']
+            if field not in fields:
+                fields.append(field)
+            for exclusive, options in ((True, category.get('exclusive', {})), (False, category.get('options', {}))):
+                for option, weight in options.items():
+                    items.append((field, option))
+                    weights.append(float(weight))
+                    item_categories.append(category_id)
+                    item_exclusive.append(exclusive)
+
+        self.fields = tuple(fields)
+        self.items = tuple(items)
+        self.item_index = {item: i for i, item in enumerate(items)}
+        self.weights = tuple(weights)
+        self.item_categories = tuple(item_categories)
+        self.item_exclusive = tuple(item_exclusive)
+
+        volunteer = definition['volunteer']
+        self.volunteer_group = group_index[volunteer['group']]
+        self.volunteer_min_hours = int(volunteer['min_hours'])
+        self.volunteer_base = float(volunteer['base'])
+        self.volunteer_step_hours = int(volunteer['step_hours'])
+        self.volunteer_step_score = float(volunteer['step_score'])
+        self.volunteer_max_extra = float(volunteer['max_extra'])
+
+        # 中间结果缓存：提交摘要 -> PartialScore（LRU），规则重新加载后随旧规则一起丢弃
+        self._partials = OrderedDict()
+        self._partial_lock = threading.Lock()
+
+        unknown = {f'{name}_score' for name in self.category_names + self.group_names} - set(SCORE_FIELDS)
+        if unknown:
+            raise ValueError(f'计分规则中存在无法保存的细分项: {sorted(unknown)}')
+
+    def volunteer_score(self, hours: int) -> float:
+        if hours < self.volunteer_min_hours:
+            return 0
+        # 超过起算时长后，每增加 step_hours 小时加 step_score 分，额外加分有上限
+        extra_steps = (hours - self.volunteer_min_hours) // self.volunteer_step_hours
+        return self.volunteer_base + min(extra_steps * self.volunteer_step_score, self.volunteer_max_extra)
+
+    def category_score(self, category_id: int, items: Mapping[int, int]) -> float:
+        """单个细分项的成绩：按列号顺序累加，同类不累计的选项只取最高，再按上限截断"""
+        total = 0
+        exclusive_best = 0
+        for i in sorted(items):
+            if self.item_exclusive[i]:
+                # 同年度同类荣誉不累计，只取最高
+                exclusive_best = max(exclusive_best, self.weights[i])
+            else:
+                total += self.weights[i] * items[i]
+        return min(total + exclusive_best, self.category_caps[category_id])
+
+    def partial(self, submission: Mapping) -> PartialScore:
+        category_items = [{} for _ in self.category_names]
+        item_index = self.item_index
+        item_categories = self.item_categories
+        for field in self.fields:
+            for option in submission.get(field) or ():
+                i = item_index.get((field, option))
+                if i is not None:
+                    items = category_items[item_categories[i]]
+                    items[i] = items.get(i, 0) + 1
+
+        category_scores = [
+            self.category_score(category_id, items) if items else 0
+            for category_id, items in enumerate(category_items)
+        ]
+        return PartialScore(category_items, category_scores,
+                            float(submission.get('academic_score') or 0),
+                            int(submission.get('volunteer_hours') or 0))
+
+    def apply(self, partial: PartialScore, add: Optional[Mapping] = None, remove: Optional[Mapping] = None,
+              volunteer_hours: Optional[int] = None, academic_score: Optional[float] = None) -> PartialScore:
+        """在中间结果上增删选项（或修改志愿时长、学业成绩），只重算受影响的细分项"""
+        category_items = list(partial.category_items)
+        category_scores = list(partial.category_scores)
+        changed = set()
+        for sign, delta in ((1, add), (-1, remove)):
+            for field, options in (delta or {}).items():
+                for option in options:
+                    i = self.item_index.get((field, option))
+                    if i is None:
+                        continue
+                    category_id = self.item_categories[i]
+                    if category_id not in changed:
+                        category_items[category_id] = dict(category_items[category_id])
+                        changed.add(category_id)
+                    items = category_items[category_id]
+                    items[i] = items.get(i, 0) + sign
+                    if items[i] <= 0:
+                        # 删除未选中的选项不产生影响
+                        del items[i]
+
+        for category_id in changed:
+            items = category_items[category_id]
+            category_scores[category_id] = self.category_score(category_id, items) if items else 0
+
+        return PartialScore(
+            category_items, category_scores,
+            partial.academic_score if academic_score is None else float(academic_score),
+            partial.volunteer_hours if volunteer_hours is None else int(volunteer_hours),
+        )
+
+    def finish(self, partial: PartialScore) -> Dict[str, float]:
+        """由中间结果汇总类别上限、志愿服务和学业成绩，得到成绩明细"""
+        breakdown = {}
+        group_totals = [0] * len(self.group_names)
+        for category_id, name in enumerate(self.category_names):
+            category_score = partial.category_scores[category_id]
+            breakdown[f'{name}_score'] = category_score
+            group_totals[self.category_groups[category_id]] += category_score
+
+        volunteer_hours = partial.volunteer_hours
+        volunteer_score = self.volunteer_score(volunteer_hours)
+        group_totals[self.volunteer_group] += volunteer_score
+
+        academic_weighted = partial.academic_score * self.academic_weight
+        final_score = academic_weighted
+        for group_id, name in enumerate(self.group_names):
+            group_score = min(group_totals[group_id], self.group_caps[group_id])
+            breakdown[f'{name}_score'] = group_score
+            final_score += group_score
+
+        breakdown['academic_score'] = academic_weighted
+        breakdown['final_score'] = final_score
+        breakdown['volunteer_score'] = volunteer_score
+
+        result = {field: round(breakdown.get(field, 0), ROUND_DIGITS) for field in SCORE_FIELDS}
+        result['volunteer_hours'] = volunteer_hours
+        return result
+
+    def score(self, submission: Mapping) -> Dict[str, float]:
+        """根据一次提交计算成绩明细，返回与 SCORE_FIELDS 同名的字典"""
+        return self.finish(self.partial(submission))
+
+    def cached_partial(self, submission: Mapping) -> Tuple[str, PartialScore]:
+        """按提交内容摘要缓存中间结果，返回 (摘要, 中间结果)"""
+        key = submission_hash(submission, self)
+        partial = self.lookup_partial(key)
+        if partial is None:
+            partial = self.partial(submission)
+            with self._partial_lock:
+                self._partials[key] = partial
+                if len(self._partials) > PARTIAL_CACHE_SIZE:
+                    self._partials.popitem(last=False)
+        return key, partial
+
+    def lookup_partial(self, key: str) -> Optional[PartialScore]:
+        with self._partial_lock:
+            partial = self._partials.get(key)
+            if partial is not None:
+                self._partials.move_to_end(key)
+            return partial
+
+
+def load_rules(path: Optional[str] = None) -> RuleSet:
+    with open(path or RULES_PATH, encoding='utf-8') as f:
+        return RuleSet(json.load(f))
+
+
+def _rules_stamp(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def reload_rules(path: Optional[str] = None) -> RuleSet:
+    """重新读取规则文件并替换默认规则（规则变更后批量重算时使用）"""
+    global DEFAULT_RULES, _loaded_stamp
+    with _reload_lock:
+        stamp = _rules_stamp(RULES_PATH) if path is None else None
+        DEFAULT_RULES = load_rules(path)
+        _loaded_stamp = stamp
+    return DEFAULT_RULES
+
+
+def current_rules() -> RuleSet:
+    """当前生效的默认规则
+
+    每个进程（gunicorn worker）各自持有编译后的规则，只在本进程中调用 reload_rules() 的话，
+    其他进程仍按旧规则计分。这里比较规则文件的修改时间和大小，文件变化后在本进程中重新读取；
+    内容摘要没有变化时保留原来的规则对象，不丢弃其中缓存的中间结果。
+    """
+    global DEFAULT_RULES, _loaded_stamp
+    stamp = _rules_stamp(RULES_PATH)
+    if stamp is None or stamp == _loaded_stamp:
+        return DEFAULT_RULES
+    with _reload_lock:
+        if stamp != _loaded_stamp:
+            try:
+                rules = load_rules()
+            except (OSError, KeyError, ValueError):
+                # 规则文件正在写入或内容有误：继续使用已加载的规则，下次调用时再尝试
+                return DEFAULT_RULES
+            if rules.revision != DEFAULT_RULES.revision:
+                DEFAULT_RULES = rules
+            _loaded_stamp = stamp
+    return DEFAULT_RULES
+
+
+def selections_from_form(form, rules: Optional[RuleSet] = None) -> Dict[str, list]:
+    """从提交的表单（MultiDict）中取出各类多选项"""
+    rules = rules or DEFAULT_RULES
+    return {field: form.getlist(field) for field in rules.fields}
+
+
+def _parse_academic_score(value) -> float:
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not 0 <= value <= 100:
+        raise ValueError('academic_score 应为 0-100 之间的数字')
+    return float(value)
+
+
+def _parse_volunteer_hours(value) -> int:
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+        raise ValueError('volunteer_hours 应为非负数')
+    return int(value)
+
+
+def _parse_options(field, options, rules: RuleSet) -> list:
+    if field not in rules.fields:
+        raise ValueError(f'未知的字段：{field}')
+    if not isinstance(options, list):
+        raise ValueError(f'{field} 应为选项列表')
+    unknown = [option for option in options if (field, option) not in rules.item_index]
+    if unknown:
+        raise ValueError(f'{field} 中存在未知选项：{", ".join(map(str, unknown))}')
+    return options
+
+
+def parse_submission(data, rules: Optional[RuleSet] = None) -> Dict:
+    """校验 JSON 格式的提交并转换为 score() 使用的字典，不合法时抛出 ValueError"""
+    rules = rules or DEFAULT_RULES
+    if not isinstance(data, Mapping):
+        raise ValueError('提交内容应为 JSON 对象')
+
+    submission = {
+        'academic_score': _parse_academic_score(data.get('academic_score', 0)),
+        'volunteer_hours': _parse_volunteer_hours(data.get('volunteer_hours', 0)),
+    }
+    for field, options in data.items():
+        if field in submission or field == 'id':
+            continue
+        submission[field] = _parse_options(field, options, rules)
+    return submission
+
+
+def parse_delta(data, rules: Optional[RuleSet] = None) -> Dict:
+    """校验 what-if 请求中的改动：add / remove 为 {字段: [选项]}，
+    academic_score、volunteer_hours 可选，不合法时抛出 ValueError"""
+    rules = rules or DEFAULT_RULES
+    delta = {}
+    for key in ('add', 'remove'):
+        changes = data.get(key) or {}
+        if not isinstance(changes, Mapping):
+            raise ValueError(f'{key} 应为 {{字段: [选项]}} 形式的对象')
+        delta[key] = {field: _parse_options(field, options, rules) for field, options in changes.items()}
+    if data.get('academic_score') is not None:
+        delta['academic_score'] = _parse_academic_score(data['academic_score'])
+    if data.get('volunteer_hours') is not None:
+        delta['volunteer_hours'] = _parse_volunteer_hours(data['volunteer_hours'])
+    return delta
+
+
+def normalize_submission(submission: Mapping, rules: Optional[RuleSet] = None) -> Dict:
+    """规范化一次提交：只保留规则中的字段，多选项排序，数值统一类型"""
+    rules = rules or DEFAULT_RULES
+    normalized = {
+        'academic_score': float(submission.get('academic_score') or 0),
+        'volunteer_hours': int(submission.get('volunteer_hours') or 0),
+    }
+    for field in rules.fields:
+        options = submission.get(field)
+        if options:
+            normalized[field] = sorted(options)
+    return normalized
+
+
+def submission_hash(submission: Mapping, rules: Optional[RuleSet] = None) -> str:
+    """提交内容摘要，选项顺序不同但内容相同的提交得到相同的摘要"""
+    normalized = normalize_submission(submission, rules)
+    return hashlib.sha256(json.dumps(normalized, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def score(submission: Mapping, rules: Optional[RuleSet] = None) -> Dict[str, float]:
+    return (rules or DEFAULT_RULES).score(submission)
+
+
+# 启动时编译一次默认规则，之后由 current_rules() 按规则文件的修改时间和大小判断是否需要重新读取
+_reload_lock = threading.Lock()
+_loaded_stamp = _rules_stamp(RULES_PATH)
+DEFAULT_RULES = load_rules()
@@ -0,0 +1,31 @@
+"""生产环境 WSGI 入口，默认使用 production 配置（见 settings.py）
+
+不命名为 wsgi.py：flask 命令在未指定 FLASK_APP 时会优先加载 wsgi.py，开发环境的 flask db upgrade 等
+命令应继续使用 app.py 中的 create_app()。
+
+Linux 上用 gunicorn 多进程运行，进程数、线程数等见 gunicorn.conf.py：
+
+    gunicorn -c gunicorn.conf.py serve:app
+
+不支持 fork 的平台（Windows）用 waitress 单进程多线程运行：
+
+    python serve.py
+"""
+import os
+
+from app import create_app
+
+app = create_app(os.environ.get('APP_ENV', 'production'))
+
+
+def serve():
+    from waitress import serve as waitress_serve
+
+    # 单进程内由线程并发处理请求；计分等 CPU 密集的部分受 GIL 限制，线程数不宜过多
+    threads = int(os.environ.get('WAITRESS_THREADS') or (os.cpu_count() or 1) * 2)
+    waitress_serve(app, host=os.environ.get('HOST', '0.0.0.0'), port=int(os.environ.get('PORT', '5001')),
+                   threads=threads)
+
+
+if __name__ == '__main__':
+    serve()
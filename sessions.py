@@ -0,0 +1,203 @@
+"""服务端会话
+
+Cookie 中只保存随机生成的会话 ID，会话内容保存在服务端（数据库表或本地文件）。
+每次请求不再序列化、签名并回传整个会话，会话大小也不再受 4 KB Cookie 上限的限制。
+服务端只保存会话 ID 的 SHA-256，过期会话定期清理。
+
+读取会话需要一次数据库查询（或读一个文件）。静态文件、/metrics 等不使用会话的路径
+通过 skip_paths 跳过读取，这些请求得到一个空会话，也不会写回或刷新 Cookie。
+"""
+import hashlib
+import os
+import secrets
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Iterable, Optional
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from sqlalchemy import Table, select
+from sqlalchemy.engine import Engine
+from werkzeug.datastructures import CallbackDict
+
+# 最多每隔多少秒清理一次过期会话
+SWEEP_INTERVAL = 3600
+
+serializer = TaggedJSONSerializer()
+
+
+def new_sid() -> str:
+    return secrets.token_urlsafe(32)
+
+
+def storage_key(sid: str) -> str:
+    """服务端保存会话时使用的键：即使会话数据泄露也得不到可用的会话 ID"""
+    return hashlib.sha256(sid.encode('utf-8')).hexdigest()
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid: Optional[str] = None, new: bool = False):
+        def on_update(self):
+            self.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid or new_sid()
+        self.new = new
+        self.modified = False
+        # 更换会话 ID 后需要删除的旧会话
+        self.previous_sid = None
+
+
+def regenerate(session):
+    """登录后更换会话 ID，防止会话固定攻击；使用 Cookie 会话时不需要处理"""
+    if isinstance(session, ServerSession):
+        if session.previous_sid is None and not session.new:
+            session.previous_sid = session.sid
+        session.sid = new_sid()
+        session.modified = True
+
+
+class FileSessionStore:
+    """每个会话一个文件，文件修改时间设为过期时间，清理时只需 stat"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def load(self, key: str, now: datetime) -> Optional[str]:
+        path = self._path(key)
+        try:
+            if os.stat(path).st_mtime <= now.timestamp():
+                return None
+            with open(path, encoding='utf-8') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def save(self, key: str, data: str, expires: datetime):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(data)
+            os.utime(tmp_path, (expires.timestamp(), expires.timestamp()))
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def delete(self, key: str):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def sweep(self, now: datetime) -> int:
+        removed = 0
+        for entry in os.scandir(self.directory):
+            try:
+                if entry.is_file() and entry.stat().st_mtime <= now.timestamp():
+                    os.remove(entry.path)
+                    removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
+
+
+class SqlSessionStore:
+    """会话保存在数据库表中（id、data、expires_at 三列）
+
+    读写使用独立的连接和事务，不会提交或回滚请求中 db.session 尚未处理的修改。
+    """
+
+    def __init__(self, get_engine: Callable[[], Engine], table: Table):
+        self.get_engine = get_engine
+        self.table = table
+
+    def load(self, key: str, now: datetime) -> Optional[str]:
+        table = self.table
+        with self.get_engine().connect() as conn:
+            return conn.execute(
+                select(table.c.data).where(table.c.id == key, table.c.expires_at > now)
+            ).scalar()
+
+    def save(self, key: str, data: str, expires: datetime):
+        table = self.table
+        with self.get_engine().begin() as conn:
+            result = conn.execute(table.update().where(table.c.id == key).values(data=data, expires_at=expires))
+            if result.rowcount == 0:
+                conn.execute(table.insert().values(id=key, data=data, expires_at=expires))
+
+    def delete(self, key: str):
+        with self.get_engine().begin() as conn:
+            conn.execute(self.table.delete().where(self.table.c.id == key))
+
+    def sweep(self, now: datetime) -> int:
+        with self.get_engine().begin() as conn:
+            return conn.execute(self.table.delete().where(self.table.c.expires_at <= now)).rowcount
+
+
+class ServerSessionInterface(SessionInterface):
+    """把会话保存到 store 中的 Flask 会话接口，Cookie 的各项设置沿用 Flask 配置"""
+
+    def __init__(self, store, sweep_interval: int = SWEEP_INTERVAL, skip_paths: Iterable[str] = ()):
+        self.store = store
+        self.sweep_interval = sweep_interval
+        # 以这些前缀开头的请求路径不读取会话
+        self.skip_paths = tuple(skip_paths)
+        self._last_sweep = time.monotonic()
+        self._lock = threading.Lock()
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid and not request.path.startswith(self.skip_paths):
+            data = self.store.load(storage_key(sid), datetime.now())
+            if data is not None:
+                return ServerSession(serializer.loads(data), sid=sid)
+        return ServerSession(new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        secure = self.get_cookie_secure(app)
+        samesite = self.get_cookie_samesite(app)
+        httponly = self.get_cookie_httponly(app)
+
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        if session.previous_sid is not None:
+            self.store.delete(storage_key(session.previous_sid))
+
+        if not session:
+            # 会话被清空：删除服务端数据和 Cookie
+            if session.modified and not session.new:
+                self.store.delete(storage_key(session.sid))
+                response.delete_cookie(name, domain=domain, path=path, secure=secure,
+                                       samesite=samesite, httponly=httponly)
+            return
+
+        if not self.should_set_cookie(app, session):
+            return
+
+        now = datetime.now()
+        self.store.save(storage_key(session.sid), serializer.dumps(dict(session)),
+                        now + app.permanent_session_lifetime)
+        response.set_cookie(name, session.sid, expires=self.get_expiration_time(app, session),
+                            httponly=httponly, domain=domain, path=path, secure=secure, samesite=samesite)
+        self._maybe_sweep(now)
+
+    def _maybe_sweep(self, now: datetime):
+        if time.monotonic() - self._last_sweep < self.sweep_interval:
+            return
+        with self._lock:
+            if time.monotonic() - self._last_sweep < self.sweep_interval:
+                return
+            self._last_sweep = time.monotonic()
+        self.store.sweep(now)
@@ -0,0 +1,134 @@
+"""应用配置
+
+create_app() 先按配置名选择配置类，再用环境变量覆盖其中的部分配置项：
+
+- development（默认）：开启调试模式，使用源码中的开发密钥和实例目录下的 SQLite 数据库 users.db
+- production：关闭调试模式，SECRET_KEY 和 DATABASE_URL 必须由环境变量提供，缺少时拒绝启动，
+  不会退回到开发密钥或 users.db
+
+配置名用环境变量 APP_ENV 指定，生产环境的入口 serve.py 默认使用 production。
+"""
+import os
+from typing import Dict, Mapping, Optional
+
+import database
+import page_cache
+
+DEFAULT_CONFIG = 'development'
+
+UPLOAD_FOLDER = 'static/uploads'
+
+
+class Config:
+    APP_ENV = None
+    DEBUG = False
+    SECRET_KEY = None
+    SQLALCHEMY_DATABASE_URI = None
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # 会话保存位置：database（数据库表，默认）、filesystem（实例目录下的文件）或 cookie（Flask 默认的签名 Cookie）
+    SESSION_BACKEND = 'database'
+
+    # 请求耗时统计（Server-Timing 响应头和 /metrics），默认关闭，见 instrumentation.py
+    INSTRUMENTATION = False
+    # 开启耗时统计时，处理时间超过该毫秒数的请求保存 cProfile 剖析结果；为 0 时不剖析
+    PROFILE_THRESHOLD_MS = 0
+
+    # 上传文件目录（相对于应用目录）
+    UPLOAD_FOLDER = UPLOAD_FOLDER
+    # 内容寻址的 blob 目录，与用户目录在同一文件系统上才能使用硬链接
+    UPLOAD_BLOB_FOLDER = os.path.join(UPLOAD_FOLDER, '.blobs')
+    # 证明材料预览图目录
+    UPLOAD_PREVIEW_FOLDER = os.path.join(UPLOAD_FOLDER, '.previews')
+    # 单次请求、单个文件以及每个用户上传总量的上限（字节）
+    MAX_CONTENT_LENGTH = 64 * 1024 * 1024
+    MAX_UPLOAD_FILE_SIZE = 20 * 1024 * 1024
+    USER_UPLOAD_QUOTA = 200 * 1024 * 1024
+
+    # 学生信息页、学生详情页的渲染结果缓存：默认进程内 LRU，设置 PAGE_CACHE_URL（redis://...）时多进程共用
+    PAGE_CACHE_URL = None
+    PAGE_CACHE_SIZE = page_cache.DEFAULT_MAX_ENTRIES
+
+    # 批量计分接口单次最多接受的提交数
+    SCORE_BATCH_LIMIT = 2000
+    # 网页导入名单的最大行数：每行都要计算密码哈希，行数过多会超过 gunicorn 的请求超时，
+    # 更大的名单用命令行 flask import-students 导入
+    WEB_IMPORT_MAX_ROWS = 200
+
+    # 以下目录为空时放在实例目录下：会话文件、cProfile 剖析结果、后台导出生成的文件
+    SESSION_FILE_DIR = None
+    PROFILE_DIR = None
+    EXPORT_FOLDER = None
+
+
+class DevelopmentConfig(Config):
+    APP_ENV = 'development'
+    DEBUG = True
+    # 仅供本地开发使用
+    SECRET_KEY = 'your-secret-key'
+    SQLALCHEMY_DATABASE_URI = database.DEFAULT_DATABASE_URI
+
+
+class ProductionConfig(Config):
+    # SECRET_KEY 和数据库地址只能由环境变量提供
+    APP_ENV = 'production'
+
+
+CONFIGS = {
+    'development': DevelopmentConfig,
+    'production': ProductionConfig,
+}
+
+
+def config_class(name: Optional[str] = None, environ: Optional[Mapping[str, str]] = None):
+    environ = os.environ if environ is None else environ
+    name = name or environ.get('APP_ENV') or DEFAULT_CONFIG
+    try:
+        return CONFIGS[name]
+    except KeyError:
+        raise RuntimeError(f'未知的配置名：{name}（可选 {"、".join(CONFIGS)}）') from None
+
+
+def _flag(value: str) -> bool:
+    return value.lower() in ('1', 'true', 'yes')
+
+
+def from_environ(environ: Optional[Mapping[str, str]] = None) -> Dict:
+    """环境变量中设置了的配置项"""
+    environ = os.environ if environ is None else environ
+    settings = {}
+    if environ.get('SECRET_KEY'):
+        settings['SECRET_KEY'] = environ['SECRET_KEY']
+    if environ.get('DATABASE_URL'):
+        settings['SQLALCHEMY_DATABASE_URI'] = database.database_uri(environ)
+    if environ.get('SESSION_BACKEND'):
+        settings['SESSION_BACKEND'] = environ['SESSION_BACKEND']
+    if environ.get('INSTRUMENTATION'):
+        settings['INSTRUMENTATION'] = _flag(environ['INSTRUMENTATION'])
+    if environ.get('PROFILE_THRESHOLD_MS'):
+        settings['PROFILE_THRESHOLD_MS'] = int(environ['PROFILE_THRESHOLD_MS'])
+    if environ.get('PAGE_CACHE_URL'):
+        settings['PAGE_CACHE_URL'] = environ['PAGE_CACHE_URL']
+    if environ.get('PAGE_CACHE_SIZE'):
+        settings['PAGE_CACHE_SIZE'] = int(environ['PAGE_CACHE_SIZE'])
+    if environ.get('WEB_IMPORT_MAX_ROWS'):
+        settings['WEB_IMPORT_MAX_ROWS'] = int(environ['WEB_IMPORT_MAX_ROWS'])
+    return settings
+
+
+def finalize(config, instance_path: str, environ: Optional[Mapping[str, str]] = None):
+    """检查生产环境的必需配置，并补全依赖实例目录和数据库地址的配置项"""
+    if config['APP_ENV'] == 'production':
+        missing = [name for name, key in (('SECRET_KEY', 'SECRET_KEY'), ('DATABASE_URL', 'SQLALCHEMY_DATABASE_URI'))
+                   if not config.get(key)]
+        if missing:
+            raise RuntimeError(f'生产环境必须设置环境变量 {"、".join(missing)}')
+        if config.get('DEBUG'):
+            raise RuntimeError('生产环境不能开启调试模式')
+
+    for key, directory in (('SESSION_FILE_DIR', 'sessions'), ('PROFILE_DIR', 'profiles'), ('EXPORT_FOLDER', 'exports')):
+        if not config.get(key):
+            config[key] = os.path.join(instance_path, directory)
+    # 连接池大小等参数，可以用环境变量设置，见 database.py
+    if 'SQLALCHEMY_ENGINE_OPTIONS' not in config:
+        config['SQLALCHEMY_ENGINE_OPTIONS'] = database.engine_options(config['SQLALCHEMY_DATABASE_URI'], environ)
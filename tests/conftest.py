@@ -0,0 +1,69 @@
+"""测试共用的应用和客户端：每个测试使用临时目录下独立的 SQLite 数据库、上传目录和导出目录
+
+设置环境变量 TEST_DATABASE_URL 时改用该数据库（例如 CI 中的 PostgreSQL），每个测试开始前清空其中的表。
+"""
+import os
+
+import pytest
+from flask_migrate import upgrade
+from sqlalchemy import create_engine, text
+
+import app as app_module
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEST_DATABASE_URL = os.environ.get('TEST_DATABASE_URL')
+
+
+def reset_database(uri):
+    """删除测试数据库中上一个测试留下的全部表，之后由迁移重新建表"""
+    engine = create_engine(uri)
+    try:
+        with engine.begin() as conn:
+            conn.execute(text('DROP SCHEMA public CASCADE'))
+            conn.execute(text('CREATE SCHEMA public'))
+    finally:
+        engine.dispose()
+
+
+@pytest.fixture
+def app_config():
+    """在 create_app() 默认配置之上覆盖的配置项，测试模块可以重新定义这个 fixture"""
+    return {}
+
+
+@pytest.fixture
+def app(tmp_path, app_config):
+    if TEST_DATABASE_URL:
+        reset_database(TEST_DATABASE_URL)
+    flask_app = app_module.create_app({
+        'SQLALCHEMY_DATABASE_URI': TEST_DATABASE_URL or 'sqlite:///' + str(tmp_path / 'test.db'),
+        'UPLOAD_FOLDER': str(tmp_path / 'uploads'),
+        'UPLOAD_BLOB_FOLDER': str(tmp_path / 'uploads' / '.blobs'),
+        'UPLOAD_PREVIEW_FOLDER': str(tmp_path / 'uploads' / '.previews'),
+        'EXPORT_FOLDER': str(tmp_path / 'exports'),
+        'SESSION_FILE_DIR': str(tmp_path / 'sessions'),
+        **app_config,
+    })
+    with flask_app.app_context():
+        upgrade(directory=os.path.join(REPO_ROOT, 'migrations'))
+    yield flask_app
+    flask_app.extensions['preview_worker'].shutdown()
+    flask_app.extensions['export_runner'].shutdown()
+    # 关闭连接池中的连接，下一个测试才能删除 PostgreSQL 中的表
+    with flask_app.app_context():
+        app_module.db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def login():
+    """注册并登录：login(client, 用户名, role='student')"""
+    def login(client, username, role='student', password='p'):
+        client.post('/register', data={'username': username, 'password': password, 'role': role,
+                                       'teacher_code': 'teacher123'})
+        return client.post('/login', data={'username': username, 'password': password})
+    return login
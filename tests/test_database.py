@@ -0,0 +1,63 @@
+"""数据库连接配置：连接池参数和环境变量覆盖、SQLite 连接建立时设置的 WAL 等参数"""
+import pytest
+from sqlalchemy import create_engine, text
+
+import database
+
+
+@pytest.mark.parametrize('uri, environ, options', [
+    pytest.param('sqlite://', {}, {}, id='sqlite-memory'),
+    pytest.param('sqlite:///:memory:', {'DB_POOL_SIZE': '20'}, {}, id='sqlite-memory-ignores-env'),
+    pytest.param('sqlite:///users.db', {}, {'pool_size': 5, 'max_overflow': 10}, id='sqlite-file'),
+    pytest.param('sqlite:///users.db', {'DB_POOL_SIZE': '2', 'DB_POOL_RECYCLE': '60'},
+                 {'pool_size': 2, 'max_overflow': 10}, id='sqlite-file-env'),
+    pytest.param('postgresql://scores@localhost/scores', {},
+                 {'pool_size': 5, 'max_overflow': 10, 'pool_pre_ping': True, 'pool_recycle': 1800},
+                 id='postgresql'),
+    pytest.param('postgresql://scores@localhost/scores',
+                 {'DB_POOL_SIZE': '20', 'DB_MAX_OVERFLOW': '0', 'DB_POOL_RECYCLE': '300'},
+                 {'pool_size': 20, 'max_overflow': 0, 'pool_pre_ping': True, 'pool_recycle': 300},
+                 id='postgresql-env'),
+    # 空值与未设置相同
+    pytest.param('postgresql://scores@localhost/scores', {'DB_POOL_SIZE': ''},
+                 {'pool_size': 5, 'max_overflow': 10, 'pool_pre_ping': True, 'pool_recycle': 1800},
+                 id='postgresql-empty-env'),
+])
+def test_engine_options(uri, environ, options):
+    assert database.engine_options(uri, environ) == options
+
+
+def test_database_uri():
+    assert database.database_uri({}) == database.DEFAULT_DATABASE_URI
+    assert database.database_uri({'DATABASE_URL': 'postgres://u@h/db'}) == 'postgresql://u@h/db'
+
+
+def connect_sqlite(path, environ):
+    engine = create_engine('sqlite:///' + str(path))
+    database.configure_engine(engine, environ)
+    return engine
+
+
+def test_sqlite_pragmas_set_on_every_connection(tmp_path):
+    engine = connect_sqlite(tmp_path / 'test.db', {'SQLITE_BUSY_TIMEOUT_MS': '1234'})
+    try:
+        for _ in range(2):
+            with engine.connect() as conn:
+                assert conn.execute(text('PRAGMA journal_mode')).scalar() == 'wal'
+                assert conn.execute(text('PRAGMA busy_timeout')).scalar() == 1234
+                # NORMAL 对应 1
+                assert conn.execute(text('PRAGMA synchronous')).scalar() == 1
+            # 新建的连接同样设置参数
+            engine.dispose()
+    finally:
+        engine.dispose()
+
+
+def test_sqlite_busy_timeout_default(tmp_path):
+    engine = connect_sqlite(tmp_path / 'test.db', {})
+    try:
+        with engine.connect() as conn:
+            assert conn.execute(text('PRAGMA busy_timeout')).scalar() == database.SQLITE_BUSY_TIMEOUT_MS
+    finally:
+        engine.dispose()
+
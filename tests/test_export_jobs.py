@@ -0,0 +1,70 @@
+"""后台导出任务：清理旧版本文件、判定中断的任务"""
+import os
+from datetime import datetime, timedelta
+
+import app as app_module
+import export_jobs
+from app import ExportJob, db
+
+
+def test_remove_stale_artifacts_keeps_newer_revisions(tmp_path):
+    names = ['ranking-3.xlsx', 'ranking-5.xlsx', 'ranking-7.xlsx', 'ranking-new.xlsx',
+             'by_major-3.xlsx', 'tmpabc.xlsx']
+    for name in names:
+        (tmp_path / name).write_bytes(b'')
+
+    export_jobs.remove_stale_artifacts(str(tmp_path), 'ranking', 5)
+
+    assert sorted(os.listdir(tmp_path)) == sorted(set(names) - {'ranking-3.xlsx'})
+
+
+def test_artifact_revision_round_trip(tmp_path):
+    path = export_jobs.artifact_path(str(tmp_path), 'by_major', 42)
+    assert export_jobs.artifact_revision(os.path.basename(path), 'by_major') == 42
+    assert export_jobs.artifact_revision(os.path.basename(path), 'ranking') is None
+
+
+def add_job(status, age):
+    job = ExportJob(id=f'{status}{age.seconds}', kind='ranking', revision=0, status=status,
+                    updated_at=datetime.now() - age)
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def test_queued_job_is_not_expired_while_waiting(app):
+    with app.app_context():
+        waiting = add_job(export_jobs.QUEUED, app_module.EXPORT_JOB_TIMEOUT + timedelta(minutes=1))
+        stalled = add_job(export_jobs.RUNNING, app_module.EXPORT_JOB_TIMEOUT + timedelta(minutes=1))
+        orphaned = add_job(export_jobs.QUEUED, app_module.EXPORT_QUEUE_TIMEOUT + timedelta(minutes=1))
+        for job in (waiting, stalled, orphaned):
+            app_module.expire_stale_export(job)
+
+        assert waiting.status == export_jobs.QUEUED
+        assert stalled.status == export_jobs.FAILED
+        assert orphaned.status == export_jobs.FAILED
+
+
+def test_expired_queued_job_is_not_run(app):
+    with app.app_context():
+        job_id = add_job(export_jobs.FAILED, timedelta(hours=2)).id
+    app_module.run_export_job(app, job_id, 'ranking')
+    with app.app_context():
+        job = db.session.get(ExportJob, job_id)
+        assert job.status == export_jobs.FAILED
+        assert not os.path.exists(app.config['EXPORT_FOLDER']) or not os.listdir(app.config['EXPORT_FOLDER'])
+
+
+def test_retention_cleanup_is_kept_when_job_is_reused(app):
+    with app.app_context():
+        old = ExportJob(id='old', kind='ranking', revision=0, status=export_jobs.DONE,
+                        created_at=datetime.now() - app_module.EXPORT_JOB_RETENTION - timedelta(days=1))
+        running = ExportJob(id='running', kind='ranking', revision=app_module.ranking_revision(),
+                            status=export_jobs.RUNNING)
+        db.session.add_all([old, running])
+        db.session.commit()
+
+        assert app_module.start_export('ranking', None).id == 'running'
+        db.session.rollback()
+
+        assert db.session.get(ExportJob, 'old') is None
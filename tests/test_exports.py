@@ -0,0 +1,36 @@
+"""流式返回导出文件：无论响应体是否读完，响应结束后都要删除临时文件"""
+from werkzeug.test import Client
+from werkzeug.wrappers import Response
+
+import exports
+
+
+def temp_file(tmp_path, size=3 * exports.CHUNK_SIZE):
+    path = tmp_path / 'export.parquet'
+    path.write_bytes(b'x' * size)
+    return path
+
+
+def test_file_stream_returns_whole_file_and_removes_it(tmp_path):
+    path = temp_file(tmp_path)
+    response = Client(Response(exports.FileStream(str(path)))).get('/')
+    assert len(response.get_data()) == 3 * exports.CHUNK_SIZE
+    response.close()
+    assert not path.exists()
+
+
+def test_file_stream_removed_on_head_request(tmp_path):
+    path = temp_file(tmp_path)
+    response = Client(Response(exports.FileStream(str(path)))).head('/')
+    assert response.get_data() == b''
+    response.close()
+    assert not path.exists()
+
+
+def test_file_stream_removed_when_client_disconnects(tmp_path):
+    path = temp_file(tmp_path)
+    stream = exports.FileStream(str(path))
+    chunks = iter(stream)
+    next(chunks)
+    stream.close()
+    assert not path.exists()
@@ -0,0 +1,50 @@
+"""批量导入学生名单：网页导入的行数上限、用 spawn 进程池计算密码哈希"""
+import io
+
+import pytest
+from werkzeug.security import check_password_hash
+
+import app as app_module
+import importer
+from app import User
+
+
+@pytest.fixture
+def app_config():
+    return {'WEB_IMPORT_MAX_ROWS': 3}
+
+
+@pytest.fixture
+def teacher(client, login):
+    login(client, 't1', role='teacher')
+    return client
+
+
+def roster(count):
+    lines = ['username,password,major'] + [f's{i},pw{i},cs' for i in range(count)]
+    return io.BytesIO('\n'.join(lines).encode('utf-8'))
+
+
+def student_count(app):
+    with app.app_context():
+        return User.query.filter_by(role='student').count()
+
+
+def test_web_import_within_limit(app, teacher):
+    teacher.post('/teacher/import', data={'roster': (roster(3), 'roster.csv')})
+    assert student_count(app) == 3
+
+
+def test_web_import_rejects_large_roster(app, teacher):
+    teacher.post('/teacher/import', data={'roster': (roster(4), 'roster.csv')})
+    assert student_count(app) == 0
+    assert 'flask import-students' in teacher.get('/teacher/dashboard').get_data(as_text=True)
+
+
+def test_import_hashes_passwords_in_spawned_pool(app, monkeypatch):
+    monkeypatch.setattr(importer, 'PROCESS_POOL_THRESHOLD', 2)
+    with app.app_context():
+        created, skipped, errors = app_module.import_students(importer.read_roster(roster(4), 'roster.csv'))
+        assert (created, skipped, errors) == (4, 0, [])
+        user = User.query.filter_by(username='s3').one()
+        assert check_password_hash(user.password_hash, 'pw3')
@@ -0,0 +1,49 @@
+"""请求耗时统计：Server-Timing 响应头，/metrics 输出当前应用的累计指标"""
+import pytest
+
+import app as app_module
+import instrumentation
+
+
+@pytest.fixture
+def app_config():
+    return {'INSTRUMENTATION': True}
+
+
+def test_metrics_are_kept_per_app(app, client, tmp_path):
+    response = client.get('/login')
+    assert response.headers['Server-Timing'].startswith('total;dur=')
+
+    other = app_module.create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+        'INSTRUMENTATION': True,
+        'UPLOAD_FOLDER': str(tmp_path / 'other'),
+        'UPLOAD_PREVIEW_FOLDER': str(tmp_path / 'other' / '.previews'),
+        'SESSION_BACKEND': 'cookie',
+    })
+    try:
+        assert other.extensions['metrics'] is not app.extensions['metrics']
+        assert other.extensions['metrics'].requests == {}
+        with other.app_context():
+            assert instrumentation.metrics.render() == other.extensions['metrics'].render()
+    finally:
+        other.extensions['preview_worker'].shutdown()
+        other.extensions['export_runner'].shutdown()
+
+    body = client.get('/metrics').get_data(as_text=True)
+    assert 'app_requests_total{endpoint="main.login",method="GET",status="200"} 1' in body
+
+
+def test_metrics_disabled_by_default(tmp_path):
+    disabled = app_module.create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+        'UPLOAD_FOLDER': str(tmp_path / 'uploads'),
+        'UPLOAD_PREVIEW_FOLDER': str(tmp_path / 'uploads' / '.previews'),
+        'SESSION_BACKEND': 'cookie',
+    })
+    try:
+        assert 'metrics' not in disabled.extensions
+        assert disabled.test_client().get('/metrics').status_code == 404
+    finally:
+        disabled.extensions['preview_worker'].shutdown()
+        disabled.extensions['export_runner'].shutdown()
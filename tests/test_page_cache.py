@@ -0,0 +1,94 @@
+"""学生页面的渲染结果缓存：命中时不重新渲染，ETag 相同时返回 304，学生成绩或个人信息提交后失效"""
+import pytest
+
+import app as app_module
+from app import User, db
+
+
+@pytest.fixture
+def renders(monkeypatch):
+    """记录实际渲染的模板"""
+    rendered = []
+    render_template = app_module.render_template
+
+    def counting_render_template(name, **context):
+        rendered.append(name)
+        return render_template(name, **context)
+    monkeypatch.setattr(app_module, 'render_template', counting_render_template)
+    return rendered
+
+
+@pytest.fixture
+def student(client, login):
+    login(client, 's1')
+    return client
+
+
+def submit(client, academic_score):
+    return client.post('/calculate_score', data={'academic_score': str(academic_score), 'volunteer_hours': '0'})
+
+
+def test_repeated_request_is_served_from_cache(student, renders):
+    first = student.get('/student_info')
+    second = student.get('/student_info')
+
+    assert first.status_code == second.status_code == 200
+    assert second.get_data() == first.get_data()
+    assert second.headers['ETag'] == first.headers['ETag']
+    assert renders == ['stu_info.html']
+
+
+def test_matching_etag_returns_not_modified(student, renders):
+    etag = student.get('/student_info').headers['ETag']
+
+    response = student.get('/student_info', headers={'If-None-Match': etag})
+
+    assert response.status_code == 304
+    assert response.get_data() == b''
+    assert response.headers['ETag'] == etag
+    assert renders == ['stu_info.html']
+    assert student.get('/student_info', headers={'If-None-Match': '"other"'}).status_code == 200
+
+
+def test_profile_change_invalidates_cached_page(student, renders):
+    etag = student.get('/student_info').headers['ETag']
+
+    student.post('/save_profile', data={'full_name': '张三', 'student_id': '2023001', 'major': 'cs'})
+
+    response = student.get('/student_info', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert '张三' in response.get_data(as_text=True)
+    assert renders == ['stu_info.html', 'stu_info.html']
+
+
+def test_score_change_invalidates_teacher_detail_page(app, client, login, student, renders):
+    teacher = app.test_client()
+    login(teacher, 't1', role='teacher')
+    with app.app_context():
+        student_id = User.query.filter_by(username='s1').one().id
+    path = f'/teacher/student/{student_id}'
+    etag = teacher.get(path).headers['ETag']
+    assert teacher.get(path, headers={'If-None-Match': etag}).status_code == 304
+
+    submit(student, 90)
+
+    response = teacher.get(path, headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert '<div class="score-value">72.0</div>' in response.get_data(as_text=True)
+    assert renders.count('student_detail.html') == 2
+
+
+def test_cache_invalidated_only_after_commit(app, student):
+    with app.app_context():
+        user = User.query.filter_by(username='s1').one()
+        key = app_module.rendered_pages.key('student_info', user.id)
+
+        user.full_name = '未提交'
+        db.session.flush()
+        db.session.rollback()
+        assert app_module.rendered_pages.key('student_info', user.id) == key
+
+        user.full_name = '已提交'
+        db.session.commit()
+        assert app_module.rendered_pages.key('student_info', user.id) != key
@@ -0,0 +1,151 @@
+"""排名表增量更新：与全量重算的结果一致；回滚后进程内排名索引不能带着已撤销的修改继续使用"""
+import random
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import event
+
+import app as app_module
+from app import Ranking, User, db
+
+MAJORS = ('cs', 'ee', '')
+
+
+def seed_students(count, rng):
+    for i in range(count):
+        db.session.add(User(username=f'student{i}', password_hash='x', role='student',
+                            major=rng.choice(MAJORS), final_score=rng.choice((60, 70, 70, 80, 90))))
+    db.session.commit()
+    app_module.rebuild_rankings()
+
+
+def ranking_rows():
+    return sorted(db.session.execute(db.select(
+        Ranking.user_id, Ranking.major, Ranking.final_score, Ranking.overall_rank,
+        Ranking.overall_dense_rank, Ranking.major_rank, Ranking.major_dense_rank)).all())
+
+
+@pytest.fixture(params=['index', 'count'])
+def rank_source(request, monkeypatch):
+    """index：索引过期后立即重新加载；count：不使用进程内索引，全部用 COUNT 查询（多进程部署的常见情况）"""
+    if request.param == 'index':
+        monkeypatch.setattr(app_module, 'RANK_INDEX_RELOAD_INTERVAL', timedelta(0))
+    else:
+        monkeypatch.setattr(app_module, 'current_rank_index', lambda revision=None: None)
+    return request.param
+
+
+def change_score(user_id, score, major=None):
+    user = db.session.get(User, user_id)
+    user.final_score = score
+    if major is not None:
+        user.major = major
+    app_module.update_ranking(user)
+
+
+def expected_rows():
+    """按 User 表用窗口函数计算的排名（与 rebuild_rankings() 相同，但不修改排名表）"""
+    score = db.func.coalesce(User.final_score, 0)
+    major = db.func.coalesce(User.major, '')
+    return sorted(db.session.execute(db.select(
+        User.id, major, score,
+        db.func.rank().over(order_by=score.desc()),
+        db.func.dense_rank().over(order_by=score.desc()),
+        db.func.rank().over(partition_by=major, order_by=score.desc()),
+        db.func.dense_rank().over(partition_by=major, order_by=score.desc()),
+    ).where(User.role == 'student')).all())
+
+
+def assert_matches_rebuild():
+    incremental = ranking_rows()
+    assert incremental == expected_rows()
+    app_module.rebuild_rankings()
+    assert incremental == ranking_rows()
+
+
+def test_rollback_after_update_ranking(app):
+    with app.app_context():
+        seed_students(10, random.Random(1))
+        change_score(1, 100)
+        db.session.rollback()
+        assert app_module.rank_index_cache.index is None
+
+        # 下一次提交使数据库修订号达到回滚前索引所标的值，排名仍必须按真实数据计算
+        change_score(2, 65)
+        db.session.commit()
+        assert_matches_rebuild()
+
+
+def test_random_updates_with_rollbacks(app, rank_source):
+    rng = random.Random(20240901)
+    with app.app_context():
+        seed_students(12, rng)
+        for _ in range(300):
+            major = rng.choice(MAJORS) if rng.random() < 0.2 else None
+            change_score(rng.randint(1, 12), rng.choice((55, 60, 70, 80, 90, 95)), major)
+            if rng.random() < 0.3:
+                db.session.rollback()
+            else:
+                db.session.commit()
+            assert ranking_rows() == expected_rows()
+            if rng.random() < 0.05:
+                app_module.rebuild_rankings()
+            index = app_module.current_rank_index()
+            if index is None:
+                continue
+            for user_id, score, major in db.session.execute(db.select(Ranking.user_id, Ranking.final_score,
+                                                                         Ranking.major)):
+                assert index.get(user_id) == (score, major)
+        assert_matches_rebuild()
+
+
+def test_rank_index_is_per_app(app, tmp_path):
+    other = app_module.create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + str(tmp_path / 'other.db'),
+        'UPLOAD_FOLDER': str(tmp_path / 'uploads'),
+        'EXPORT_FOLDER': str(tmp_path / 'exports'),
+    })
+    with app.app_context():
+        seed_students(5, random.Random(2))
+        index = app_module.current_rank_index()
+        assert index.total() == 5
+    with other.app_context():
+        assert other.extensions['rank_index_cache'].index is None
+    assert app.extensions['rank_index_cache'].index is index
+
+
+def test_score_change_only_updates_rows_between_scores(app, rank_source):
+    with app.app_context():
+        # 每个成绩两人、同一专业：成绩变化前后的分数都还有人，密集排名不会整体移动
+        for i, score in enumerate(score for score in range(10, 110, 10) for _ in range(2)):
+            db.session.add(User(username=f'student{i}', password_hash='x', role='student', major='cs',
+                                final_score=score))
+        db.session.commit()
+        app_module.rebuild_rankings()
+        mover = User.query.filter_by(final_score=20).first()
+
+        updated = []
+
+        def count_ranking_updates(conn, cursor, statement, parameters, context, executemany):
+            # 调整其他学生排名的 UPDATE（不含修订号和该学生自己的排名行）
+            if statement.startswith('UPDATE ranking SET') and 'user_id !=' in statement:
+                updated.append(cursor.rowcount)
+        event.listen(db.engine, 'after_cursor_execute', count_ranking_updates)
+        try:
+            change_score(mover.id, 50)
+            db.session.commit()
+        finally:
+            event.remove(db.engine, 'after_cursor_execute', count_ranking_updates)
+
+        # 全体和专业各一条 UPDATE，只涉及成绩在 [20, 50) 之间的其他 5 名学生
+        assert updated == [5, 5]
+        assert_matches_rebuild()
+
+
+def test_student_ranking_totals(app, rank_source):
+    with app.app_context():
+        seed_students(12, random.Random(3))
+        user = db.session.get(User, 1)
+        info = app_module.student_ranking(user)
+        assert info['overall_total'] == 12
+        assert info['major_total'] == User.query.filter_by(major=user.major or '').count()
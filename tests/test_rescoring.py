@@ -0,0 +1,84 @@
+"""批量重算：向量化计算与 scoring.score() 逐个计算一致；规则未变的学生不重算"""
+import json
+import random
+
+import pytest
+
+import app as app_module
+import rescoring
+import scoring
+from app import Submission, User, db
+
+
+def random_submission(rng, rules):
+    options = {}
+    for field, option in rules.item_index:
+        options.setdefault(field, []).append(option)
+    submission = {
+        'academic_score': round(rng.uniform(0, 100), 2),
+        'volunteer_hours': rng.choice((0, 150, 199, 200, 201, 230, 260, 400)),
+    }
+    for field, choices in options.items():
+        if rng.random() < 0.6:
+            submission[field] = rng.sample(choices, rng.randint(1, min(4, len(choices))))
+    return submission
+
+
+def test_score_cohort_matches_score():
+    rng = random.Random(20240902)
+    rules = scoring.DEFAULT_RULES
+    submissions = [random_submission(rng, rules) for _ in range(500)] + [{}]
+
+    breakdowns = rescoring.to_breakdowns(rescoring.score_cohort(submissions, rules))
+
+    assert breakdowns == [scoring.score(submission, rules) for submission in submissions]
+
+
+def changed_rules(weight):
+    with open(scoring.RULES_PATH, encoding='utf-8') as f:
+        definition = json.load(f)
+    definition['academic']['weight'] = weight
+    return scoring.RuleSet(definition)
+
+
+@pytest.fixture
+def students(app):
+    rng = random.Random(7)
+    rules = scoring.DEFAULT_RULES
+    with app.app_context():
+        for i in range(20):
+            user = User(username=f'student{i}', password_hash='x', role='student')
+            db.session.add(user)
+            db.session.flush()
+            submission = random_submission(rng, rules)
+            for field, value in scoring.score(submission, rules).items():
+                setattr(user, field, value)
+            app_module.save_submission(user, submission, rules)
+        db.session.commit()
+        app_module.rebuild_rankings()
+    return 20
+
+
+def final_scores():
+    return dict(db.session.execute(db.select(User.id, User.final_score)).all())
+
+
+def test_rescore_skips_students_scored_with_current_rules(app, students):
+    with app.app_context():
+        before = final_scores()
+        assert app_module.rescore_students(scoring.DEFAULT_RULES) == (0, students)
+        assert app_module.rescore_students(scoring.DEFAULT_RULES, force=True) == (students, 0)
+        assert final_scores() == before
+
+
+def test_rescore_after_rule_change(app, students):
+    rules = changed_rules(0.5)
+    with app.app_context():
+        assert app_module.rescore_students(rules) == (students, 0)
+        # 已按新规则重算过的学生不再重算
+        assert app_module.rescore_students(rules) == (0, students)
+
+        for submission in Submission.query:
+            assert submission.rule_version == rules.revision
+            user = db.session.get(User, submission.user_id)
+            assert user.final_score == scoring.score(submission.as_submission(), rules)['final_score']
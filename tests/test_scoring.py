@@ -0,0 +1,146 @@
+"""计分引擎：按 scoring_rules.json 计分的结果与原来逐项 if/elif 计算的结果一致；规则文件修改后各进程改用新规则"""
+import json
+import os
+import shutil
+
+import pytest
+
+import scoring
+
+ZERO = {field: 0 for field in scoring.SCORE_FIELDS}
+
+
+def expected(**scores):
+    return {**ZERO, **scores}
+
+
+# (提交, 原 if/elif 实现的计算结果中非零的项)
+SCORE_CASES = [
+    pytest.param({}, expected(), id='empty'),
+    pytest.param({'academic_score': 90}, expected(academic_score=72, final_score=72), id='academic-only'),
+    pytest.param(
+        {'academic_score': 80, 'academic_paper': ['nature_science_first', 'ccf_a_first']},
+        expected(academic_score=64, paper_score=13.5, academic_talent_score=12, final_score=76),
+        id='academic-talent-cap'),
+    pytest.param(
+        {'academic_score': 85, 'academic_paper': ['ccf_a_first', 'ccf_c_second'],
+         'competition_national': ['a_first_team', 'a_third_individual'],
+         'competition_provincial': ['a_second_team']},
+        expected(academic_score=68, paper_score=1.625, competition_national_score=4.725,
+                 competition_provincial_score=0.6, academic_talent_score=6.95, final_score=74.95),
+        id='paper-and-competitions'),
+    pytest.param(
+        {'patent': ['patent_first_2', 'patent_fourth'], 'ccf_csp': ['csp_400'],
+         'innovation_project': ['national_leader', 'school_member']},
+        expected(patent_score=2.1, csp_score=4, innovation_project_score=1.05, academic_talent_score=7.15,
+                 final_score=7.15),
+        id='patent-csp-innovation'),
+    pytest.param({'honor': ['good_student', 'excellent_cadre']},
+                 expected(honor_score=0.2, comprehensive_score=0.2, final_score=0.2), id='honor-exclusive'),
+    # 个人荣誉同年度不累计，取最高的一项；集体荣誉另外累加
+    pytest.param({'honor': ['good_student', 'excellent_league_member', 'red_flag_branch']},
+                 expected(honor_score=0.3, comprehensive_score=0.3, final_score=0.3),
+                 id='honor-exclusive-plus-collective'),
+    pytest.param({'social_work': ['student_union_chair', 'class_monitor']},
+                 expected(social_work_score=2, comprehensive_score=2, final_score=2), id='social-work-cap'),
+    pytest.param({'volunteer_hours': 199}, expected(volunteer_hours=199), id='volunteer-below-minimum'),
+    pytest.param({'volunteer_hours': 200},
+                 expected(volunteer_hours=200, volunteer_score=1, comprehensive_score=1, final_score=1),
+                 id='volunteer-minimum'),
+    pytest.param({'volunteer_hours': 201},
+                 expected(volunteer_hours=201, volunteer_score=1, comprehensive_score=1, final_score=1),
+                 id='volunteer-partial-step'),
+    pytest.param({'volunteer_hours': 230},
+                 expected(volunteer_hours=230, volunteer_score=1.75, comprehensive_score=1.75, final_score=1.75),
+                 id='volunteer-steps'),
+    pytest.param({'volunteer_hours': 500},
+                 expected(volunteer_hours=500, volunteer_score=2, comprehensive_score=2, final_score=2),
+                 id='volunteer-extra-cap'),
+    pytest.param(
+        {'academic_score': 95.5, 'volunteer_hours': 260, 'honor': ['excellent_student', 'red_flag_branch'],
+         'social_work': ['club_president', 'study_committee'], 'academic_paper': ['ccf_a_second']},
+        expected(academic_score=76.4, paper_score=0.75, academic_talent_score=0.75, honor_score=0.3,
+                 social_work_score=1.235, volunteer_hours=260, volunteer_score=2, comprehensive_score=3.535,
+                 final_score=80.685),
+        id='combined'),
+]
+
+
+@pytest.mark.parametrize('submission, scores', SCORE_CASES)
+def test_score_matches_previous_results(submission, scores):
+    breakdown = scoring.score(submission)
+    assert breakdown.keys() == scores.keys()
+    for field, value in scores.items():
+        assert breakdown[field] == pytest.approx(value), field
+
+
+@pytest.mark.parametrize('data', [
+    pytest.param(None, id='not-object'),
+    pytest.param([], id='list'),
+    pytest.param({'academic_score': 101}, id='academic-above-100'),
+    pytest.param({'academic_score': '90'}, id='academic-string'),
+    pytest.param({'academic_score': True}, id='academic-bool'),
+    pytest.param({'volunteer_hours': -1}, id='negative-hours'),
+    pytest.param({'unknown_field': []}, id='unknown-field'),
+    pytest.param({'honor': 'good_student'}, id='options-not-list'),
+    pytest.param({'academic_paper': ['ccf_b_first']}, id='unknown-option'),
+    pytest.param({'honor': ['red_flag_branch', 'nope']}, id='one-unknown-option'),
+])
+def test_parse_submission_rejects_invalid_input(data):
+    with pytest.raises(ValueError):
+        scoring.parse_submission(data)
+
+
+def test_parse_submission_defaults():
+    assert scoring.score(scoring.parse_submission({})) == scoring.score({})
+
+
+@pytest.fixture
+def rules_path(tmp_path, monkeypatch):
+    path = str(tmp_path / 'scoring_rules.json')
+    shutil.copyfile(scoring.RULES_PATH, path)
+    monkeypatch.setattr(scoring, 'RULES_PATH', path)
+    # 测试结束后恢复模块中原来的规则
+    monkeypatch.setattr(scoring, 'DEFAULT_RULES', scoring.DEFAULT_RULES)
+    monkeypatch.setattr(scoring, '_loaded_stamp', scoring._loaded_stamp)
+    scoring.reload_rules()
+    return path
+
+
+def rewrite_rules(path, change):
+    with open(path, encoding='utf-8') as f:
+        definition = json.load(f)
+    change(definition)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(definition, f, ensure_ascii=False)
+    # 保证修改时间一定变化，不受文件系统时间精度影响
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_current_rules_follows_rules_file(rules_path):
+    before = scoring.current_rules()
+    assert scoring.current_rules() is before
+    submission = {'academic_score': 90, 'volunteer_hours': 0}
+
+    # 相当于另一个进程修改规则文件后调用 reload_rules()：本进程没有收到任何通知
+    rewrite_rules(rules_path, lambda definition: definition['academic'].update(weight=0.5))
+
+    after = scoring.current_rules()
+    assert after is not before
+    assert after.revision != before.revision
+    assert scoring.score(submission, after)['academic_score'] == 45
+    assert scoring.current_rules() is after
+
+
+def test_current_rules_keeps_rules_when_content_unchanged(rules_path):
+    before = scoring.current_rules()
+    rewrite_rules(rules_path, lambda definition: None)
+    assert scoring.current_rules() is before
+
+
+def test_current_rules_ignores_broken_rules_file(rules_path):
+    before = scoring.current_rules()
+    with open(rules_path, 'w', encoding='utf-8') as f:
+        f.write('{"version": ')
+    assert scoring.current_rules() is before
@@ -0,0 +1,103 @@
+"""服务端会话：会话内容保存在数据库表或文件中，登录后更换会话 ID，退出后删除，过期会话由 sweep-sessions 清理"""
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+import sessions
+
+
+@pytest.fixture(params=['database', 'filesystem'])
+def app_config(request):
+    # 开启 INSTRUMENTATION 才会注册 /metrics
+    return {'SESSION_BACKEND': request.param, 'INSTRUMENTATION': True}
+
+
+@pytest.fixture
+def store(app):
+    return app.session_interface.store
+
+
+def session_id(client):
+    cookie = client.get_cookie('session')
+    return cookie.value if cookie is not None else None
+
+
+def stored(app, store, sid):
+    """服务端保存的会话内容，没有或已过期时返回 None"""
+    with app.app_context():
+        data = store.load(sessions.storage_key(sid), datetime.now())
+    return None if data is None else sessions.serializer.loads(data)
+
+
+def test_session_round_trip(app, client, login, store):
+    login(client, 's1')
+    sid = session_id(client)
+
+    assert client.get('/transition').status_code == 200
+    # Cookie 中只有会话 ID，会话内容保存在服务端，以会话 ID 的哈希为键
+    assert session_id(client) == sid
+    assert 'user_id' in stored(app, store, sid)
+    with client.session_transaction() as session:
+        assert session['user_id'] == stored(app, store, sid)['user_id']
+
+
+def test_login_rotates_session_id(app, client, login, store):
+    with client.session_transaction() as session:
+        session['visited'] = True
+    anonymous_sid = session_id(client)
+    assert stored(app, store, anonymous_sid) == {'visited': True}
+
+    login(client, 's1')
+
+    sid = session_id(client)
+    assert sid != anonymous_sid
+    # 登录前的会话 ID 失效，会话内容保留在新的会话中
+    assert stored(app, store, anonymous_sid) is None
+    assert stored(app, store, sid)['visited'] is True
+
+
+def test_logout_deletes_stored_session(app, client, login, store):
+    login(client, 's1')
+    sid = session_id(client)
+
+    client.get('/logout')
+
+    assert session_id(client) is None
+    assert stored(app, store, sid) is None
+    if app.config['SESSION_BACKEND'] == 'filesystem':
+        assert os.listdir(app.config['SESSION_FILE_DIR']) == []
+    # 旧的会话 ID 不能再访问需要登录的页面
+    client.set_cookie('session', sid)
+    assert client.get('/transition').status_code == 302
+
+
+def test_sweep_sessions_removes_expired(app, store):
+    now = datetime.now()
+    with app.app_context():
+        store.save(sessions.storage_key('expired'), '{}', now - timedelta(minutes=1))
+        store.save(sessions.storage_key('live'), '{}', now + timedelta(hours=1))
+
+    result = app.test_cli_runner().invoke(args=['sweep-sessions'])
+
+    assert result.exit_code == 0
+    assert '已删除 1 个过期会话' in result.output
+    with app.app_context():
+        assert store.load(sessions.storage_key('live'), now) == '{}'
+        assert store.sweep(now) == 0
+
+
+@pytest.mark.parametrize('path', ['/static/styles/login.css', '/metrics'])
+def test_sessionless_paths_skip_loading(app, client, login, store, monkeypatch, path):
+    login(client, 's1')
+    sid = session_id(client)
+    loads = []
+    load = store.load
+    monkeypatch.setattr(store, 'load', lambda key, now: loads.append(key) or load(key, now))
+
+    assert client.get(path).status_code == 200
+    assert loads == []
+    # 跳过读取的请求不会改动会话
+    assert session_id(client) == sid
+    assert client.get('/transition').status_code == 200
+    assert len(loads) == 1
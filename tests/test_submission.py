@@ -0,0 +1,90 @@
+"""成绩提交的乐观锁和幂等键：并发提交只有一次生效，重复提交不重复计分、不重复保存文件"""
+import io
+
+import pytest
+from sqlalchemy.orm.exc import StaleDataError
+
+import app as app_module
+import rescoring
+from app import Submission, Upload, User, db
+
+
+@pytest.fixture
+def student(client, login):
+    login(client, 's1')
+    return client
+
+
+def bump_version(username):
+    """在另一个连接中修改学生记录，相当于另一个进程的提交先保存了"""
+    with db.engine.begin() as conn:
+        conn.execute(db.update(User).where(User.username == username).values(version=User.version + 1))
+
+
+def submit(client, academic_score, key=None, proof=None):
+    data = {'academic_score': str(academic_score), 'volunteer_hours': '0', 'academic_paper': ['ccf_a_first']}
+    if proof is not None:
+        data['proof_files'] = (io.BytesIO(proof), 'proof.pdf')
+    headers = {'Idempotency-Key': key} if key else {}
+    return client.post('/calculate_score', data=data, headers=headers, content_type='multipart/form-data')
+
+
+def saved_state(app, username='s1'):
+    with app.app_context():
+        user = User.query.filter_by(username=username).one()
+        return (user.version, user.final_score,
+                Submission.query.filter_by(user_id=user.id).count(),
+                Upload.query.filter_by(user_id=user.id).count())
+
+
+def test_submission_with_stale_version_is_rejected(app, student, monkeypatch):
+    before = saved_state(app)
+    # 请求已读取学生记录、还没有保存时，另一个进程先保存了同一学生的成绩
+    read_key = app_module.request_idempotency_key
+
+    def concurrent_update():
+        bump_version('s1')
+        return read_key()
+    monkeypatch.setattr(app_module, 'request_idempotency_key', concurrent_update)
+
+    response = submit(student, 90, proof=b'%PDF-1.4 rejected')
+
+    assert response.status_code == 302
+    assert response.location.endswith('/student')
+    version, final_score, submissions, uploads = saved_state(app)
+    assert (version, final_score, submissions, uploads) == (before[0] + 1, before[1], 0, 0)
+    # 被拒绝的提交不能把未保存的成绩写入会话
+    with student.session_transaction() as session:
+        assert 'paper_score' not in session
+
+
+def test_retry_with_same_idempotency_key_returns_saved_scores(app, student):
+    first = submit(student, 90, key='retry-1', proof=b'%PDF-1.4 first')
+    assert first.status_code == 200
+    after_first = saved_state(app)
+    assert after_first[2:] == (1, 1)
+
+    # 重试时表单内容不同也返回第一次保存的成绩，不重新计分、不保存文件
+    retry = submit(student, 50, key='retry-1', proof=b'%PDF-1.4 second')
+
+    assert retry.status_code == 200
+    assert saved_state(app) == after_first
+    assert f'<strong>{after_first[1]}</strong>' in retry.get_data(as_text=True)
+    with student.session_transaction() as session:
+        assert session['paper_score'] == 1.5
+
+
+def test_rescore_conflicts_with_concurrent_submission(app, student, monkeypatch):
+    submit(student, 90)
+    score_cohort = rescoring.score_cohort
+
+    def concurrent_score_cohort(submissions, rules=None):
+        # 重算读取提交之后、批量写回之前，学生重新提交了成绩
+        bump_version('s1')
+        return score_cohort(submissions, rules)
+    monkeypatch.setattr(rescoring, 'score_cohort', concurrent_score_cohort)
+
+    with app.app_context():
+        with pytest.raises(StaleDataError):
+            app_module.rescore_students(force=True)
+        db.session.rollback()
@@ -0,0 +1,68 @@
+"""证明材料按配置的上传目录（UPLOAD_FOLDER）保存和提供下载，预览图也从该目录生成"""
+import io
+import os
+
+import pytest
+from PIL import Image
+
+from app import Upload
+
+
+@pytest.fixture
+def student(client, login):
+    login(client, 's1')
+    return client
+
+
+def png_bytes():
+    buffer = io.BytesIO()
+    Image.new('RGB', (8, 8), 'red').save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def upload_proof(client, content, filename):
+    return client.post('/calculate_score', data={'academic_score': '90', 'volunteer_hours': '0',
+                                                 'proof_files': (io.BytesIO(content), filename)},
+                       content_type='multipart/form-data')
+
+
+def test_uploaded_file_is_served_from_upload_folder(app, student):
+    upload_proof(student, b'%PDF-1.4 proof', 'proof.pdf')
+
+    with app.app_context():
+        upload = Upload.query.one()
+        assert upload.path == 's1/proof.pdf'
+    # 测试中的上传目录在临时目录下，不在 static 目录中
+    assert os.path.isfile(os.path.join(app.config['UPLOAD_FOLDER'], 's1', 'proof.pdf'))
+    assert '/uploads/files/s1/proof.pdf' in student.get('/student_info').get_data(as_text=True)
+
+    response = student.get('/uploads/files/s1/proof.pdf')
+    assert response.status_code == 200
+    assert response.get_data() == b'%PDF-1.4 proof'
+
+
+def test_upload_storage_is_not_served(app, student):
+    upload_proof(student, b'%PDF-1.4 proof', 'proof.pdf')
+    assert os.listdir(app.config['UPLOAD_BLOB_FOLDER'])
+
+    assert student.get('/uploads/files/.blobs/').status_code == 404
+    for name in os.listdir(app.config['UPLOAD_BLOB_FOLDER']):
+        assert student.get(f'/uploads/files/.blobs/{name}').status_code == 404
+
+
+def test_uploaded_file_requires_login(app, student):
+    upload_proof(student, b'%PDF-1.4 proof', 'proof.pdf')
+    anonymous = app.test_client()
+    assert anonymous.get('/uploads/files/s1/proof.pdf').status_code == 302
+
+
+def test_generate_previews_reads_upload_folder(app, student, monkeypatch):
+    # 不在后台线程中生成，留给命令生成
+    monkeypatch.setattr(app.extensions['preview_worker'], 'submit', lambda *args: None)
+    upload_proof(student, png_bytes(), 'proof.png')
+
+    result = app.test_cli_runner().invoke(args=['generate-previews'])
+
+    assert result.exit_code == 0
+    assert '已生成 1 张预览图' in result.output
+    assert len(os.listdir(app.config['UPLOAD_PREVIEW_FOLDER'])) == 1
@@ -0,0 +1,133 @@
+"""证明材料上传
+
+上传文件按固定大小分块写入磁盘，同时计算 SHA-256，以内容寻址的方式保存为
+blob（同一团队上传的相同证书只保存一份），再以硬链接放到用户目录下，
+文件仍可按原文件名作为静态文件访问。
+
+每个上传文件的大小、修改时间和 SHA-256 写入 Upload 表（上传清单）。
+页面显示文件列表时只 stat 一次用户目录：目录修改时间没变就直接使用缓存的清单，
+变了再从数据库重新读取，不再对目录中的每个文件做 listdir / isfile。
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from typing import Callable, Container, Dict, Hashable, List, Optional, Tuple
+
+# 上传文件每次读写的字节数
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+
+class UploadTooLarge(ValueError):
+    """上传文件超过大小限制（单个文件大小或用户剩余配额）"""
+
+
+def blob_path(blob_root: str, sha256: str, extension: str) -> str:
+    """内容寻址路径：按摘要前两位分目录，保留扩展名以便按类型提供静态文件"""
+    return os.path.join(blob_root, sha256[:2], sha256 + extension)
+
+
+def store_blob(stream, blob_root: str, extension: str, max_size: int,
+               chunk_size: int = UPLOAD_CHUNK_SIZE) -> Tuple[str, int, str]:
+    """分块保存上传内容并计算摘要，返回 (SHA-256, 字节数, blob 路径)
+
+    内容超过 max_size 时抛出 UploadTooLarge，已写入的临时文件会被删除；
+    相同内容的 blob 已经存在时不再重复保存。
+    """
+    os.makedirs(blob_root, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=blob_root, suffix='.part')
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_size:
+                    raise UploadTooLarge(size)
+                digest.update(chunk)
+                out.write(chunk)
+
+        sha256 = digest.hexdigest()
+        path = blob_path(blob_root, sha256, extension)
+        if os.path.exists(path):
+            os.remove(tmp_path)
+        else:
+            # mkstemp 创建的文件只有属主可读，改为与 file.save() 保存的文件相同的权限
+            os.chmod(tmp_path, 0o644)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return sha256, size, path
+
+
+def link_blob(blob: str, target: str):
+    """把 blob 硬链接到用户目录；文件系统不支持硬链接时退回复制"""
+    try:
+        os.link(blob, target)
+    except OSError:
+        shutil.copyfile(blob, target)
+
+
+def unique_filename(filename: str, taken: Container[str]) -> str:
+    """同名文件不再互相覆盖：依次尝试 name_1.ext、name_2.ext ……"""
+    if filename not in taken:
+        return filename
+    name, extension = os.path.splitext(filename)
+    i = 1
+    while f'{name}_{i}{extension}' in taken:
+        i += 1
+    return f'{name}_{i}{extension}'
+
+
+def directory_mtime(path: str) -> Optional[int]:
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def touch_directory(path: str):
+    """更新目录修改时间，使所有进程中的清单缓存失效
+
+    清单在文件写入后才提交到数据库，提交前其他请求可能已经按新的目录修改时间
+    缓存了旧清单，所以提交后要再更新一次目录修改时间。
+    """
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        pass
+
+
+class ManifestCache:
+    """按目录修改时间失效的上传清单缓存（读穿透）
+
+    loader(key) 从数据库读取清单；目录不存在时视为没有上传文件。
+    """
+
+    def __init__(self, loader: Callable[[Hashable], List]):
+        self._loader = loader
+        self._entries: Dict[Hashable, Tuple[int, List]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, directory: str) -> List:
+        mtime = directory_mtime(directory)
+        if mtime is None:
+            return []
+        cached = self._entries.get(key)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        files = self._loader(key)
+        with self._lock:
+            self._entries[key] = (mtime, files)
+        return files
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)